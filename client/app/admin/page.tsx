@@ -59,14 +59,11 @@ export default function AdminPage() {
 
   const fetchStats = async () => {
     try {
-      const [booksRes, loansRes] = await Promise.all([
-        bookService.getBooks({ page_size: 1 }),
-        loanService.getAllLoans(),
-      ]);
+      const { books, loans } = await loanService.getAdminStats();
       setStats({
-        totalBooks: booksRes.count,
-        totalLoans: loansRes.count,
-        activeLoans: loansRes.results.filter(l => l.status === 'borrowed').length,
+        totalBooks: books.total,
+        totalLoans: loans.active + loans.overdue + loans.returned,
+        activeLoans: loans.active + loans.overdue,
       });
     } catch (error) {
       console.error('Failed to fetch stats');
@@ -1,5 +1,5 @@
 import api from './api';
-import { Book, PaginatedResponse, BookFilters } from './types';
+import { Book, PaginatedResponse, BookFilters, TrendingBook } from './types';
 
 export const bookService = {
   async getBooks(filters?: BookFilters): Promise<PaginatedResponse<Book>> {
@@ -9,6 +9,7 @@ export const bookService = {
     if (filters?.category) params.append('category', filters.category);
     if (filters?.author) params.append('author', filters.author);
     if (filters?.available !== undefined) params.append('available', String(filters.available));
+    if (filters?.ordering) params.append('ordering', filters.ordering);
     if (filters?.page) params.append('page', String(filters.page));
     if (filters?.page_size) params.append('page_size', String(filters.page_size));
 
@@ -35,6 +36,11 @@ export const bookService = {
     await api.delete(`/books/${id}/`);
   },
 
+  async getTrending(limit = 20): Promise<TrendingBook[]> {
+    const response = await api.get<{ results: TrendingBook[] }>(`/books/trending/?limit=${limit}`);
+    return response.data.results;
+  },
+
   async getCategories(): Promise<string[]> {
     const response = await api.get<string[]>('/books/categories/');
     return response.data;
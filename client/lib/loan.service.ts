@@ -1,5 +1,5 @@
 import api from './api';
-import { Loan, PaginatedResponse } from './types';
+import { AdminStats, Loan, PaginatedResponse } from './types';
 
 export const loanService = {
   async borrowBook(bookId: number): Promise<Loan> {
@@ -28,4 +28,9 @@ export const loanService = {
     const response = await api.get<Loan>(`/loans/${id}/`);
     return response.data;
   },
+
+  async getAdminStats(): Promise<AdminStats> {
+    const response = await api.get<AdminStats>('/admin/stats/');
+    return response.data;
+  },
 };
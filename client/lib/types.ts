@@ -29,6 +29,10 @@ export interface Book {
   updated_at: string;
 }
 
+export interface TrendingBook extends Book {
+  popularity: number;
+}
+
 export interface Loan {
   id: number;
   user: User;
@@ -42,6 +46,25 @@ export interface Loan {
   fine_amount: string;
 }
 
+export interface AdminStats {
+  books: {
+    total: number;
+    available: number;
+    total_copies: number;
+    available_copies: number;
+  };
+  loans: {
+    active: number;
+    overdue: number;
+    returned: number;
+  };
+  users: {
+    total: number;
+    borrowing: number;
+  };
+  computed_at: string;
+}
+
 export interface PaginatedResponse<T> {
   count: number;
   next: string | null;
@@ -75,6 +98,7 @@ export interface BookFilters {
   category?: string;
   author?: string;
   available?: boolean;
+  ordering?: '-created_at' | '-popularity';
   page?: number;
   page_size?: number;
 }
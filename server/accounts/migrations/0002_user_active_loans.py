@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:13
+
+import accounts.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', accounts.models.LibraryUserManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='active_loans',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,5 +1,25 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+
+class LibraryUserManager(UserManager):
+    """User manager with the active loan counter updates."""
+    
+    def reserve_loan(self, pk, quota):
+        """
+        Count one more active loan for user ``pk`` with a single conditional
+        UPDATE, unless the user already has ``quota`` of them. Returns
+        whether the loan was counted.
+        """
+        return bool(
+            self.filter(pk=pk, active_loans__lt=quota).update(active_loans=F('active_loans') + 1)
+        )
+    
+    def release_loans(self, pk, count=1):
+        """Count ``count`` fewer active loans for user ``pk``."""
+        self.filter(pk=pk).update(active_loans=Greatest(F('active_loans') - count, 0))
 
 
 class User(AbstractUser):
@@ -18,6 +38,11 @@ class User(AbstractUser):
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='user')
     date_joined = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
+    # Loans not yet returned, kept in step with the loans so the borrowing
+    # quota is checked without counting them
+    active_loans = models.PositiveIntegerField(default=0, editable=False)
+    
+    objects = LibraryUserManager()
     
     class Meta:
         ordering = ['-date_joined']
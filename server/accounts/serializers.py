@@ -1,11 +1,12 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
+from library_project.fieldsets import SparseFieldsMixin
 
 User = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for User model."""
     
     class Meta:
@@ -56,7 +57,7 @@ class ChangePasswordSerializer(serializers.Serializer):
         return attrs
 
 
-class AdminUserManagementSerializer(serializers.ModelSerializer):
+class AdminUserManagementSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for admin user management."""
     
     class Meta:
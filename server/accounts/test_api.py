@@ -127,6 +127,16 @@ class TestAuthenticationAPI:
         assert response.status_code == status.HTTP_200_OK
         assert len(response.data['results']) == 6  # 5 + admin
     
+    def test_admin_list_users_sparse_fields(self):
+        """Test ?fields= on the admin user list."""
+        admin = AdminUserFactory()
+        
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/api/auth/users/?fields=id,username')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['results'] == [{'id': admin.id, 'username': admin.username}]
+    
     def test_regular_user_cannot_list_users(self):
         """Test regular user cannot access user list."""
         user = UserFactory()
@@ -9,6 +9,8 @@ from .serializers import (
     AdminUserManagementSerializer
 )
 from .permissions import IsAdmin
+from library_project.fieldsets import SparseQuerysetMixin
+from library_project.pagination import CachedCountPagination
 
 User = get_user_model()
 
@@ -73,16 +75,17 @@ class ChangePasswordView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class UserListView(generics.ListAPIView):
+class UserListView(SparseQuerysetMixin, generics.ListAPIView):
     """
     API endpoint for listing all users (admin only).
     """
     queryset = User.objects.all()
     serializer_class = AdminUserManagementSerializer
     permission_classes = (permissions.IsAuthenticated, IsAdmin)
+    pagination_class = CachedCountPagination
 
 
-class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
+class UserDetailView(SparseQuerysetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     API endpoint for managing individual users (admin only).
     """
@@ -0,0 +1,101 @@
+"""
+Time hot-path loan queries before and after archiving old returned loans.
+
+    python -m benchmarks.archive_benchmark --loans 1000000 --years 5
+
+Spreads ``--loans`` loans over ``--years`` (all returned except those of
+the last two weeks), times the borrow path's open-loan check, a user's
+open loans, the overdue sweep's scan and a user's full history and
+measures the loan table, archives loans returned more than a year ago,
+and does it again.
+"""
+import argparse
+import datetime
+import random
+import time
+
+from benchmarks.common import setup_django, populate_books, print_table, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--loans', type=int, default=1000000)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--users', type=int, default=20000)
+    args = parser.parse_args()
+
+    setup_django()
+    populate_books(5000)
+
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.utils import timezone
+    from books.archive import archive_loans
+    from books.models import ArchivedLoan, Book, Loan, LoanHistory
+
+    User = get_user_model()
+    rng = random.Random(42)
+    now = timezone.now()
+    book_ids = list(Book.objects.values_list('id', flat=True))
+    users = User.objects.bulk_create([
+        User(username=f'reader{n}', email=f'reader{n}@example.com') for n in range(args.users)
+    ])
+    # auto_now_add would overwrite the spread-out borrow dates
+    Loan._meta.get_field('borrowed_date').auto_now_add = False
+    days = args.years * 365
+    # Oldest first, like real ids
+    ages = sorted((rng.uniform(0, days) for _ in range(args.loans)), reverse=True)
+    for start in range(0, args.loans, 5000):
+        loans = []
+        for age in ages[start:start + 5000]:
+            borrowed = now - datetime.timedelta(days=age)
+            returned = age > 14
+            loans.append(Loan(
+                user=rng.choice(users), book_id=rng.choice(book_ids), borrowed_date=borrowed,
+                due_date=borrowed + datetime.timedelta(days=14),
+                status='returned' if returned else 'active',
+                return_date=borrowed + datetime.timedelta(days=rng.randint(1, 14)) if returned else None,
+            ))
+        Loan.objects.bulk_create(loans, ignore_conflicts=True)
+    user = users[0]
+    book = book_ids[0]
+
+    queries = (
+        ('open-loan check (borrow path)', lambda: Loan.objects.filter(
+            user=user, book_id=book).exclude(status='returned').exists()),
+        ("a user's open loans", lambda: list(Loan.objects.filter(
+            user=user, status__in=('active', 'overdue')).values_list('id', flat=True))),
+        ('overdue sweep scan', lambda: list(Loan.objects.filter(
+            status='active', due_date__lt=now).values_list('id', flat=True))),
+        ("a user's history (view)", lambda: list(LoanHistory.objects.filter(
+            user=user).order_by('-borrowed_date').values_list('id', flat=True)[:50])),
+    )
+
+    def loan_table_mb():
+        # Pages of the loan table and its indexes (SQLite's dbstat)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+                "(SELECT name FROM sqlite_master WHERE tbl_name = 'books_loan')"
+            )
+            return cursor.fetchone()[0] / 2 ** 20
+
+    before = [timed(query, repeat=20) for _, query in queries] + [loan_table_mb()]
+    started = time.perf_counter()
+    moved = sum(archive_loans())
+    archived = time.perf_counter() - started
+    with connection.cursor() as cursor:
+        cursor.execute('VACUUM')
+    after = [timed(query, repeat=20) for _, query in queries] + [loan_table_mb()]
+
+    print(f'{args.loans:,} loans over {args.years} years; archived {moved:,} in {archived:.1f}s '
+          f'({moved / archived:,.0f}/s), {Loan.objects.count():,} left, '
+          f'{ArchivedLoan.objects.count():,} in the archive')
+    labels = [f'{label}, ms' for label, _ in queries] + ['loan table and indexes, MB']
+    print_table(('', 'before', 'after'), [
+        (label, f'{b:,.3f}', f'{a:,.3f}') for label, b, a in zip(labels, before, after)
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Compare per-item and batch checkout/check-in of a circulation desk bin.
+
+    python -m benchmarks.circulation_benchmark --items 2000
+
+The per-item columns run what one ``POST /api/loans/`` or
+``/api/loans/{id}/return/`` does for each item, each in its own
+transaction like a request (without HTTP and authentication overhead); the
+batch columns run ``borrow_books`` and ``return_loans`` once for the bin.
+"""
+import argparse
+import datetime
+import time
+
+from benchmarks.common import setup_django, populate_books, print_table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    populate_books(args.items * 2)
+
+    from django.contrib.auth import get_user_model
+    from django.db import transaction
+    from django.utils import timezone
+    from books.circulation import borrow_books, return_loans
+    from books.models import Book, Loan
+
+    User = get_user_model()
+    Book.objects.update(total_copies=3, available_copies=3)
+    book_ids = list(Book.objects.order_by('id').values_list('id', flat=True))
+
+    def patron(name):
+        return User.objects.create(username=name, email=f'{name}@example.com')
+
+    def borrow_each(user, ids):
+        loan_ids = []
+        for book_id in ids:
+            with transaction.atomic():
+                User.objects.reserve_loan(user.pk, args.items)
+                book = Book.objects.take_copy(book_id)
+                loan = Loan.objects.create(user=user, book=book, due_date=timezone.now() + datetime.timedelta(days=14))
+            loan_ids.append(loan.id)
+        return loan_ids
+
+    def return_each(loan_ids):
+        for loan_id in loan_ids:
+            with transaction.atomic():
+                loan = Loan.objects.get(pk=loan_id)
+                Loan.objects.filter(pk=loan_id).exclude(status='returned').update(
+                    status='returned', return_date=timezone.now()
+                )
+                User.objects.release_loans(loan.user_id)
+                Book.objects.return_copy(loan.book_id)
+
+    def timed_once(func, *func_args):
+        started = time.perf_counter()
+        value = func(*func_args)
+        return value, (time.perf_counter() - started) * 1000
+
+    single_ids, batch_ids = book_ids[:args.items], book_ids[args.items:]
+    loan_ids, borrow_single = timed_once(borrow_each, patron('single'), single_ids)
+    _, return_single = timed_once(return_each, loan_ids)
+    results, borrow_batch = timed_once(lambda: borrow_books(patron('batch'), batch_ids, quota=args.items))
+    loans = [result['loan_id'] for result in results]
+    assert len(loans) == args.items
+    _, return_batch = timed_once(return_loans, loans)
+
+    print(f'{args.items} items')
+    print_table(('', 'per-item ms', 'batch ms', 'speedup'), [
+        ('borrow', f'{borrow_single:,.0f}', f'{borrow_batch:,.0f}', f'{borrow_single / borrow_batch:.1f}x'),
+        ('return', f'{return_single:,.0f}', f'{return_batch:,.0f}', f'{return_single / return_batch:.1f}x'),
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks run against a throwaway SQLite database so they never touch the
+configured one. Run them from the ``server`` directory, e.g.::
+
+    python -m benchmarks.search_benchmark --books 100000
+"""
+import os
+import random
+import tempfile
+import time
+
+WORDS = (
+    'adventure', 'algorithm', 'ancient', 'art', 'autumn', 'biology', 'blue',
+    'castle', 'chemistry', 'city', 'code', 'cooking', 'dark', 'data', 'desert',
+    'dragon', 'dream', 'economy', 'empire', 'engine', 'forest', 'garden',
+    'ghost', 'history', 'house', 'island', 'journey', 'kingdom', 'language',
+    'light', 'machine', 'mountain', 'music', 'night', 'ocean', 'philosophy',
+    'python', 'queen', 'river', 'science', 'secret', 'shadow', 'silent',
+    'song', 'star', 'storm', 'summer', 'theory', 'time', 'travel', 'war',
+    'water', 'winter', 'world',
+)
+NAMES = (
+    'Adams', 'Baker', 'Clark', 'Davis', 'Evans', 'Garcia', 'Hughes', 'Ivanova',
+    'Johnson', 'King', 'Lopez', 'Miller', 'Nguyen', 'Okafor', 'Patel', 'Quinn',
+    'Rossi', 'Smith', 'Tanaka', 'Weber',
+)
+CATEGORIES = ('Fiction', 'Science', 'History', 'Technology', 'Poetry', 'Travel')
+
+
+def setup_django():
+    """Configure Django against a temporary SQLite database and migrate it."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library_project.settings')
+    from django.conf import settings
+    path = os.path.join(tempfile.mkdtemp(prefix='library-bench-'), 'bench.sqlite3')
+    settings.DATABASES['default'].update({
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'OPTIONS': {},
+    })
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return path
+
+
+def populate_books(count, batch_size=5000, seed=42):
+    """Bulk-insert ``count`` synthetic books."""
+    from books.models import Book
+    rng = random.Random(seed)
+    for start in range(0, count, batch_size):
+        Book.objects.bulk_create([
+            Book(
+                title=' '.join(rng.sample(WORDS, 3)).title(),
+                author=f'{rng.choice(NAMES)} {rng.choice(NAMES)}',
+                isbn=f'978{n:010d}',
+                page_count=rng.randint(50, 900),
+                category=rng.choice(CATEGORIES),
+                description=' '.join(rng.choices(WORDS, k=40)),
+                total_copies=3,
+                available_copies=rng.randint(0, 3),
+            )
+            for n in range(start, min(start + batch_size, count))
+        ])
+
+
+def timed(func, repeat=5):
+    """Return the best wall-clock time of ``repeat`` calls, in milliseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+    for line in [headers] + rows:
+        print('  '.join(str(cell).ljust(width) for cell, width in zip(line, widths)))
@@ -0,0 +1,73 @@
+"""
+Compare a full-library fines run in Python and in SQL.
+
+    python -m benchmarks.fines_benchmark --loans 200000
+
+The per-instance column loads every late loan and sums
+``Loan.days_overdue``-style fines per user in Python; the SQL columns time
+``balances()`` (per-user totals) and ``aging_report()``.
+"""
+import argparse
+import datetime
+import random
+import time
+from collections import Counter
+
+from benchmarks.common import setup_django, populate_books, print_table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--loans', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=20000)
+    args = parser.parse_args()
+
+    setup_django()
+    per_user = -(-args.loans // args.users)
+    populate_books(per_user)
+
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.utils import timezone
+    from books.fines import aging_report, balances, cents
+    from books.models import Book, Loan
+
+    User = get_user_model()
+    book_ids = list(Book.objects.values_list('id', flat=True)[:per_user])
+    users = User.objects.bulk_create([
+        User(username=f'reader{n}', email=f'reader{n}@example.com') for n in range(args.users)
+    ])
+    now = timezone.now()
+    rng = random.Random(42)
+    loans = (
+        Loan(user=user, book_id=book_id, due_date=now + datetime.timedelta(days=rng.randint(-60, 14)))
+        for user in users for book_id in book_ids
+    )
+    Loan.objects.bulk_create(list(loans)[:args.loans], batch_size=5000)
+
+    def per_instance():
+        rate, cap = cents(settings.FINE_DAILY_RATE), cents(settings.FINE_MAX)
+        totals = Counter()
+        for loan in Loan.objects.exclude(status='returned'):
+            days = max(loan.days_overdue - settings.FINE_GRACE_DAYS, 0)
+            if days:
+                totals[loan.user_id] += min(days * rate, cap)
+        return totals
+
+    def timed(func):
+        started = time.perf_counter()
+        value = func()
+        return value, (time.perf_counter() - started) * 1000
+
+    python_totals, python_ms = timed(per_instance)
+    sql_rows, sql_ms = timed(lambda: list(balances(now)))
+    _, aging_ms = timed(lambda: aging_report(now))
+    assert len(sql_rows) == len(python_totals)
+
+    print_table(('loans', 'per-instance ms', 'balances ms', 'aging ms'), [
+        (f'{args.loans:,}', f'{python_ms:,.0f}', f'{sql_ms:,.0f}', f'{aging_ms:,.0f}'),
+    ])
+
+
+if __name__ == '__main__':
+    main()
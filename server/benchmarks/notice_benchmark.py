@@ -0,0 +1,58 @@
+"""
+Time a notice run over many overdue loans.
+
+    python -m benchmarks.notice_benchmark --loans 100000 --users 20000
+
+Adds ``--loans`` overdue loans spread over ``--users`` patrons and times
+``send_notices('overdue')`` with the in-memory email backend, so the
+figures cover the queries, grouping, rendering and sent log but not an SMTP
+server's round trips (one per digest, over one connection).
+"""
+import argparse
+import datetime
+import time
+
+from benchmarks.common import setup_django, populate_books, print_table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--loans', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=20000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    settings.EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+    per_user = -(-args.loans // args.users)
+    populate_books(per_user)
+
+    from django.contrib.auth import get_user_model
+    from django.core import mail
+    from django.utils import timezone
+    from books.models import Book, Loan
+    from books.notices import send_notices
+
+    User = get_user_model()
+    book_ids = list(Book.objects.values_list('id', flat=True)[:per_user])
+    users = User.objects.bulk_create([
+        User(username=f'reader{n}', email=f'reader{n}@example.com') for n in range(args.users)
+    ])
+    due = timezone.now() - datetime.timedelta(days=1)
+    loans = (Loan(user=user, book_id=book_id, due_date=due) for user in users for book_id in book_ids)
+    Loan.objects.bulk_create(list(loans)[:args.loans], batch_size=5000)
+
+    mail.outbox = []
+    started = time.perf_counter()
+    report = send_notices('overdue')
+    elapsed = time.perf_counter() - started
+    assert report == {'loans': args.loans, 'emails': min(args.users, args.loans)}
+    assert len(mail.outbox) == report['emails']
+
+    print_table(('loans', 'emails', 'seconds', 'loans/s'), [
+        (f"{report['loans']:,}", f"{report['emails']:,}", f'{elapsed:.1f}', f"{report['loans'] / elapsed:,.0f}"),
+    ])
+
+
+if __name__ == '__main__':
+    main()
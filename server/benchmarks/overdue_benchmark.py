@@ -0,0 +1,68 @@
+"""
+Time the overdue sweep as the number of active loans grows.
+
+    python -m benchmarks.overdue_benchmark --overdue 1000
+
+Each run adds active loans that are not yet due, plus ``--overdue`` loans
+past their due date, and times ``mark_overdue``. The sweep walks the
+``(status, due_date)`` index, so its time should follow the overdue loans
+and stay flat as the active ones grow.
+"""
+import argparse
+import datetime
+import time
+
+from benchmarks.common import setup_django, populate_books, print_table
+
+ACTIVE_LOANS = (10000, 50000, 200000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--overdue', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    populate_books(1000)
+
+    from django.contrib.auth import get_user_model
+    from django.utils import timezone
+    from books.circulation import mark_overdue
+    from books.models import Book, Loan
+
+    User = get_user_model()
+    book_ids = list(Book.objects.values_list('id', flat=True))
+    now = timezone.now()
+
+    def add_loans(count, due_date, prefix):
+        # One open loan per (user, book): a new user per len(book_ids) loans
+        users = User.objects.bulk_create([
+            User(username=f'{prefix}{n}', email=f'{prefix}{n}@example.com')
+            for n in range(-(-count // len(book_ids)))
+        ])
+        loans = (
+            Loan(user=user, book_id=book_id, due_date=due_date)
+            for user in users for book_id in book_ids
+        )
+        Loan.objects.bulk_create(list(loans)[:count], batch_size=5000)
+
+    results, active = [], 0
+    for run, total in enumerate(ACTIVE_LOANS):
+        add_loans(total - active, now + datetime.timedelta(days=7), f'reader{run}-')
+        active = total
+
+        add_loans(args.overdue, now - datetime.timedelta(days=1), f'late{run}-')
+        best = float('inf')
+        for _ in range(3):
+            Loan.objects.filter(status='overdue').update(status='active')
+            started = time.perf_counter()
+            assert mark_overdue(now=now) == args.overdue
+            best = min(best, time.perf_counter() - started)
+        results.append((f'{total:,}', f'{args.overdue:,}', f'{best * 1000:.1f}'))
+        Loan.objects.filter(due_date__lt=now).delete()
+
+    print_table(('active loans', 'overdue', 'sweep ms'), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Time building and serving "patrons who borrowed this also borrowed".
+
+    python -m benchmarks.related_benchmark --loans 500000 --books 20000
+
+Borrows ``--loans`` books among ``--users`` patrons, each with a few
+favourite categories, then times a full build of the related books, an
+incremental run after ``--new-loans`` more loans, a pairwise
+co-borrowing count query for one book on the Loan table and the
+``RelatedBook`` lookup behind ``/api/books/{id}/related/``.
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import setup_django, populate_books, print_table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--loans', type=int, default=500000)
+    parser.add_argument('--books', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--new-loans', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    populate_books(args.books)
+
+    from django.contrib.auth import get_user_model
+    from django.db.models import Count
+    from django.utils import timezone
+    from books.models import Book, Loan, RelatedBook
+    from books.related import update_related_books
+
+    User = get_user_model()
+    rng = random.Random(42)
+    now = timezone.now()
+    by_category = {}
+    for book_id, category in Book.objects.values_list('id', 'category'):
+        by_category.setdefault(category, []).append(book_id)
+    categories = sorted(by_category)
+    users = User.objects.bulk_create([
+        User(username=f'reader{n}', email=f'reader{n}@example.com') for n in range(args.users)
+    ])
+    tastes = {user.id: rng.sample(categories, min(3, len(categories))) for user in users}
+
+    def loans(count):
+        for _ in range(count):
+            user = rng.choice(users)
+            book_id = rng.choice(by_category[rng.choice(tastes[user.id])])
+            yield Loan(user=user, book_id=book_id, status='returned', due_date=now, return_date=now)
+
+    Loan.objects.bulk_create(loans(args.loans), batch_size=5000)
+
+    started = time.perf_counter()
+    update_related_books(full=True)
+    full = time.perf_counter() - started
+    Loan.objects.bulk_create(loans(args.new_loans), batch_size=5000)
+    started = time.perf_counter()
+    run = update_related_books()
+    incremental = time.perf_counter() - started
+
+    book_id = RelatedBook.objects.values_list('book_id', flat=True).first()
+    patrons = Loan.objects.filter(book_id=book_id).values('user_id')
+
+    def timed(func):
+        best = float('inf')
+        for _ in range(5):
+            started = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - started)
+        return best * 1000
+
+    query_ms = timed(lambda: list(
+        Loan.objects.filter(user_id__in=patrons).exclude(book_id=book_id).order_by()
+        .values('book_id').annotate(n=Count('user_id', distinct=True)).order_by('-n')[:10]
+    ))
+    # The endpoint's lookup, as run on a response cache miss
+    lookup_ms = timed(lambda: list(
+        Book.objects.filter(related_to__book_id=book_id).order_by('related_to__rank')
+    ))
+
+    print(f'{args.loans:,} loans of {args.books:,} books by {args.users:,} patrons; '
+          f'{RelatedBook.objects.count():,} related rows')
+    print_table(('step', 'books', 'time'), [
+        ('full build', f'{Book.objects.count():,}', f'{full:.1f} s'),
+        (f'incremental, +{args.new_loans:,} loans', f'{run.books_updated:,}', f'{incremental:.1f} s'),
+        ('co-borrowing query, one book', '1', f'{query_ms:,.1f} ms'),
+        ('related books lookup, one book', '1', f'{lookup_ms:,.1f} ms'),
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Compare the original ``icontains`` scan with the full-text index.
+
+    python -m benchmarks.search_benchmark --books 100000
+
+The scan column reproduces the old endpoint: every match is loaded and
+serialized. The full-text column is what ``search_books`` now does per
+request: one ranked page plus the total count.
+"""
+import argparse
+
+from benchmarks.common import setup_django, populate_books, timed, print_table
+
+QUERIES = ('the', 'dragon', 'python history', 'Smith', '9780000001234')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--books', type=int, default=50000)
+    parser.add_argument('--page-size', type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    populate_books(args.books)
+
+    from books.search import FullTextResults, scan_search
+    from books.serializers import BookListSerializer
+
+    def scan(query):
+        return BookListSerializer(scan_search(query), many=True).data
+
+    def fulltext(query):
+        results = FullTextResults(query)
+        results.count()
+        return BookListSerializer(results[0:args.page_size], many=True).data
+
+    rows = []
+    for query in QUERIES:
+        matches = scan_search(query).count()
+        scan_ms = timed(lambda: scan(query), repeat=3)
+        fts_ms = timed(lambda: fulltext(query))
+        rows.append((query, matches, f'{scan_ms:.1f}', f'{fts_ms:.1f}', f'{scan_ms / fts_ms:.1f}x'))
+
+    print(f'{args.books} books, page size {args.page_size}')
+    print_table(('query', 'scan matches', 'scan ms', 'full-text ms', 'speedup'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Compare DRF serialization of the book list with the values_list() row path.
+
+    python -m benchmarks.serialization_benchmark --books 5000
+
+For each page size the DRF column loads model instances, runs
+``BookListSerializer`` and renders with ``JSONRenderer``; the row column
+reads ``values_list()`` tuples through the compiled ``RowPlan`` and renders
+with ``FastJSONRenderer``. Both produce the same bytes.
+"""
+import argparse
+
+from benchmarks.common import setup_django, populate_books, timed, print_table
+
+PAGE_SIZES = (10, 100, 500, 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--books', type=int, default=5000)
+    args = parser.parse_args()
+
+    setup_django()
+    populate_books(args.books)
+
+    from rest_framework.renderers import JSONRenderer
+    from books.models import Book
+    from books.serializers import BookListSerializer
+    from library_project.renderers import FastJSONRenderer
+    from library_project.rows import compile_rows
+
+    queryset = Book.objects.order_by('-created_at', '-id')
+    plan = compile_rows(BookListSerializer())
+
+    def drf(size):
+        return JSONRenderer().render(BookListSerializer(queryset[:size], many=True).data)
+
+    def rows(size):
+        return FastJSONRenderer().render(plan.serialize(plan.queryset(queryset)[:size]))
+
+    results = []
+    for size in PAGE_SIZES:
+        assert drf(size) == rows(size)
+        drf_ms = timed(lambda: drf(size))
+        rows_ms = timed(lambda: rows(size))
+        results.append((
+            size, f'{drf_ms:.2f}', f'{rows_ms:.2f}',
+            f'{size / drf_ms * 1000:,.0f}', f'{size / rows_ms * 1000:,.0f}',
+            f'{drf_ms / rows_ms:.1f}x',
+        ))
+
+    print(f'{args.books} books')
+    print_table(('page size', 'DRF ms', 'rows ms', 'DRF rows/s', 'rows rows/s', 'speedup'), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Time building and reading the content-based similar books index.
+
+    python -m benchmarks.similar_benchmark --books 200000 --threads 4
+
+Inserts ``--books`` books whose titles and descriptions draw words from a
+Zipf-distributed vocabulary (a few common words, a long tail of rare ones,
+like real text), builds the index, edits ``--changed`` books and times the
+incremental build, then times single lookups.
+"""
+import argparse
+import os
+import random
+import time
+
+import numpy as np
+
+from benchmarks.common import setup_django, print_table, timed, CATEGORIES, NAMES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--books', type=int, default=200000)
+    parser.add_argument('--changed', type=int, default=1000)
+    parser.add_argument('--vocabulary', type=int, default=50000)
+    parser.add_argument('--threads', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    setup_django()
+    from books.models import Book
+    from books.similar import build_similar_books, similar_book_ids
+
+    rng = random.Random(42)
+    words = [
+        ''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=rng.randint(4, 10)))
+        for _ in range(args.vocabulary)
+    ]
+    draws = np.random.default_rng(42).zipf(1.3, size=(args.books + args.changed) * 43)
+    draws = iter(np.minimum(draws, args.vocabulary) - 1)
+
+    def text(n):
+        return ' '.join(words[next(draws)] for _ in range(n))
+
+    for start in range(0, args.books, 5000):
+        Book.objects.bulk_create([
+            Book(
+                title=text(3).title(), author=f'{rng.choice(NAMES)} {rng.choice(NAMES)}',
+                isbn=f'978{n:010d}', page_count=100, category=rng.choice(CATEGORIES),
+                description=text(40),
+            )
+            for n in range(start, min(start + 5000, args.books))
+        ])
+
+    started = time.perf_counter()
+    build_similar_books(full=True, threads=args.threads)
+    full = time.perf_counter() - started
+    for book in Book.objects.order_by('?')[:args.changed]:
+        book.description = text(40)
+        book.save()
+    started = time.perf_counter()
+    result = build_similar_books(threads=args.threads)
+    incremental = time.perf_counter() - started
+
+    book_ids = list(Book.objects.values_list('id', flat=True)[:1000])
+    similar_book_ids(book_ids[0])
+    # ms per 1,000 lookups = us per lookup
+    lookup_us = timed(lambda: [similar_book_ids(book_id) for book_id in book_ids], repeat=3)
+
+    print(f'{args.books:,} books, {args.threads} threads')
+    print_table(('step', 'books', 'time'), [
+        ('full build', f'{args.books:,}', f'{full:.1f} s'),
+        ('incremental build', f"{result['books_updated']:,}", f'{incremental:.1f} s'),
+        ('index lookup', '1', f'{lookup_us:.1f} us'),
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Compare "trending now" from the loan history and from the popularity index.
+
+    python -m benchmarks.trending_benchmark --books 50000 --loans 500000
+
+Spreads ``--loans`` loans over the last year, rebuilds the popularity
+scores, then times the top 20 books by borrows in the last 30 days (a
+GROUP BY over the loans) against the top 20 by ``-popularity`` (an index
+scan), and the extra cost of a borrow updating its book's score.
+"""
+import argparse
+import datetime
+import random
+import time
+
+from benchmarks.common import setup_django, populate_books, print_table, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--books', type=int, default=50000)
+    parser.add_argument('--loans', type=int, default=500000)
+    parser.add_argument('--users', type=int, default=10000)
+    args = parser.parse_args()
+
+    setup_django()
+    populate_books(args.books)
+
+    from django.contrib.auth import get_user_model
+    from django.db.models import Count, F
+    from django.utils import timezone
+    from books.models import Book, Loan
+    from books.popularity import popularity_increment, rebuild_popularity, trending
+
+    User = get_user_model()
+    rng = random.Random(42)
+    now = timezone.now()
+    book_ids = list(Book.objects.values_list('id', flat=True))
+    users = User.objects.bulk_create([
+        User(username=f'reader{n}', email=f'reader{n}@example.com') for n in range(args.users)
+    ])
+    # auto_now_add would overwrite the spread-out borrow dates
+    Loan._meta.get_field('borrowed_date').auto_now_add = False
+    for start in range(0, args.loans, 5000):
+        Loan.objects.bulk_create([
+            Loan(
+                user=rng.choice(users), status='returned', due_date=now,
+                # A few books account for most borrows
+                book_id=book_ids[min(int(rng.paretovariate(1.2)) - 1, len(book_ids) - 1)],
+                borrowed_date=now - datetime.timedelta(days=rng.uniform(0, 365)),
+            )
+            for _ in range(start, min(start + 5000, args.loans))
+        ])
+    started = time.perf_counter()
+    rebuild_popularity()
+    rebuild = time.perf_counter() - started
+
+    since = now - datetime.timedelta(days=30)
+    history_ms = timed(lambda: list(
+        Loan.objects.filter(borrowed_date__gte=since).values('book_id')
+        .annotate(n=Count('id')).order_by('-n')[:20]
+    ))
+    index_ms = timed(lambda: list(trending(20).values_list('id', 'popularity')))
+    book = book_ids[len(book_ids) // 2]
+    plain_ms = timed(lambda: Book.objects.filter(pk=book).update(available_copies=F('available_copies')))
+    scored_ms = timed(lambda: Book.objects.filter(pk=book).update(
+        available_copies=F('available_copies'), popularity=popularity_increment()
+    ))
+
+    print(f'{args.loans:,} loans of {args.books:,} books; popularity rebuilt in {rebuild:.1f}s')
+    print_table(('query', 'ms'), [
+        ('top 20, loans of the last 30 days', f'{history_ms:,.2f}'),
+        ('top 20, -popularity index', f'{index_ms:,.2f}'),
+        ('borrow UPDATE', f'{plain_ms:,.2f}'),
+        ('borrow UPDATE + popularity', f'{scored_ms:,.2f}'),
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Compare borrowing trend queries on the Loan table and on the rollups.
+
+    python -m benchmarks.trends_benchmark --loans 300000 --years 5
+
+Spreads ``--loans`` returned loans over ``--years`` of history, backfills
+the daily rollups, then times a monthly and a daily series for all loans
+and for one category, grouped from the Loan table and summed from the
+rollup rows.
+"""
+import argparse
+import datetime
+import random
+import time
+
+from benchmarks.common import setup_django, populate_books, print_table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--loans', type=int, default=300000)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--users', type=int, default=5000)
+    args = parser.parse_args()
+
+    setup_django()
+    populate_books(2000)
+
+    from django.contrib.auth import get_user_model
+    from django.db.models import Count
+    from django.db.models.functions import TruncDate, TruncMonth
+    from django.utils import timezone
+    from books.models import Book, CirculationDay, Loan
+    from books.rollups import backfill_rollups, trend_series
+
+    User = get_user_model()
+    rng = random.Random(42)
+    now = timezone.now()
+    days = args.years * 365
+    books = list(Book.objects.values_list('id', 'category'))
+    users = User.objects.bulk_create([
+        User(username=f'reader{n}', email=f'reader{n}@example.com',
+             date_joined=now - datetime.timedelta(days=rng.randint(days, days + 365)))
+        for n in range(args.users)
+    ])
+    loans = []
+    for n in range(args.loans):
+        borrowed = now - datetime.timedelta(days=rng.uniform(1, days))
+        loans.append(Loan(
+            user=rng.choice(users), book_id=rng.choice(books)[0], status='returned',
+            borrowed_date=borrowed, due_date=borrowed + datetime.timedelta(days=14),
+            return_date=borrowed + datetime.timedelta(days=rng.randint(1, 20)),
+        ))
+    # auto_now_add would overwrite the spread-out borrow dates
+    Loan._meta.get_field('borrowed_date').auto_now_add = False
+    Loan.objects.bulk_create(loans, batch_size=5000)
+
+    started = time.perf_counter()
+    list(backfill_rollups())
+    backfill = time.perf_counter() - started
+    category = books[0][1]
+
+    def timed(func):
+        best = float('inf')
+        for _ in range(3):
+            started = time.perf_counter()
+            rows = len(func())
+            best = min(best, time.perf_counter() - started)
+        return rows, best * 1000
+
+    def from_loans(trunc, **filters):
+        return lambda: list(
+            Loan.objects.filter(**filters).annotate(period=trunc('borrowed_date')).order_by()
+            .values('period').annotate(borrows=Count('id'), borrowers=Count('user', distinct=True))
+        )
+
+    results = []
+    for label, trunc, resolution, filters, slice_ in (
+        ('monthly, all', TruncMonth, 'month', {}, {}),
+        ('daily, all', TruncDate, 'day', {}, {}),
+        (f'monthly, {category}', TruncMonth, 'month', {'book__category': category},
+         {'dimension': 'category', 'key': category}),
+    ):
+        points, loan_ms = timed(from_loans(trunc, **filters))
+        _, rollup_ms = timed(lambda: trend_series(resolution, **slice_))
+        results.append((label, f'{points:,}', f'{loan_ms:,.0f}', f'{rollup_ms:,.1f}'))
+
+    print(f'{args.loans:,} loans over {args.years} years; backfill {backfill:.1f}s, '
+          f'{CirculationDay.objects.count():,} rollup rows')
+    print_table(('series', 'points', 'Loan table ms', 'rollups ms'), results)
+
+
+if __name__ == '__main__':
+    main()
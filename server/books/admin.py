@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Book, Loan
+from django.db.models import F
+from .models import ArchivedLoan, Book, Loan, Notice
 
 
 @admin.register(Book)
@@ -49,3 +50,38 @@ class LoanAdmin(admin.ModelAdmin):
         if obj:  # Editing existing object
             return self.readonly_fields + ('user', 'book')
         return self.readonly_fields
+    
+    def save_model(self, request, obj, form, change):
+        """Keep the user's active loan count in step with the loan's status."""
+        from accounts.models import User
+        was_open = change and form.initial.get('status') != 'returned'
+        super().save_model(request, obj, form, change)
+        is_open = obj.status != 'returned'
+        if is_open and not was_open:
+            User.objects.filter(pk=obj.user_id).update(active_loans=F('active_loans') + 1)
+        elif was_open and not is_open:
+            User.objects.release_loans(obj.user_id)
+
+
+@admin.register(Notice)
+class NoticeAdmin(admin.ModelAdmin):
+    list_display = ('loan', 'kind', 'sent_at')
+    list_filter = ('kind', 'sent_at')
+    search_fields = ('loan__user__username', 'loan__user__email', 'loan__book__title')
+    raw_id_fields = ('loan',)
+    ordering = ('-sent_at',)
+
+
+@admin.register(ArchivedLoan)
+class ArchivedLoanAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'book', 'borrowed_date', 'return_date')
+    list_filter = ('borrowed_date',)
+    search_fields = ('user__username', 'user__email', 'book__title', 'book__isbn')
+    raw_id_fields = ('user', 'book')
+    ordering = ('-borrowed_date',)
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
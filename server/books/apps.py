@@ -1,6 +1,40 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def ensure_search_triggers(sender, using, **kwargs):
+    from django.db import connections
+    from .search import install_sqlite_triggers
+    install_sqlite_triggers(connections[using])
+
+
+def ensure_prefix_indexes(sender, using, **kwargs):
+    from django.db import connections
+    from django.db.migrations.recorder import MigrationRecorder
+    from .query import install_prefix_indexes
+    conn = connections[using]
+    # SQLite table rebuilds drop them; only once their migration is applied
+    if conn.vendor == 'sqlite' and ('books', '0016_book_prefix_indexes') in MigrationRecorder(conn).applied_migrations():
+        install_prefix_indexes(conn)
 
 
 class BooksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'books'
+
+    def ready(self):
+        from library_project.counts import estimate_from, scope_counts, share_generation, watch
+        from . import signals  # noqa: F401
+        from .popularity import check_half_life
+        check_half_life()
+        post_migrate.connect(ensure_search_triggers, sender=self)
+        post_migrate.connect(ensure_prefix_indexes, sender=self)
+        watch(self.get_model('Book'))
+        watch(self.get_model('Loan'))
+        # The loan history view changes with either of its tables
+        share_generation(self.get_model('LoanHistory'), self.get_model('Loan'))
+        share_generation(self.get_model('ArchivedLoan'), self.get_model('Loan'))
+        watch(self.get_model('ArchivedLoan'))
+        # Every borrow changes the loans; a user's loan counts only change with theirs
+        scope_counts(self.get_model('Loan'), 'user')
+        estimate_from(self.get_model('LoanHistory'), self.get_model('Loan'), self.get_model('ArchivedLoan'))
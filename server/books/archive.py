@@ -0,0 +1,72 @@
+"""
+Archival of old returned loans.
+
+After a few years nearly every ``Loan`` row is returned and only bloats the
+``(user, status)``, ``(book, status)`` and keyset indexes that the borrow
+path, the overdue sweep and loan listings use. ``archive_loans`` moves
+loans returned more than ``LOAN_ARCHIVE_AFTER_DAYS`` ago into
+``ArchivedLoan`` (same columns and ids), ``LOAN_ARCHIVE_CHUNK_SIZE`` at a
+time: each chunk is one transaction of an ``INSERT ... SELECT`` and a
+``DELETE`` over the same id range, so the table is never locked for long
+and an interrupted run loses nothing.
+
+Reads of the whole history (a user's past loans, exports, statistics,
+fines, related books, rollup backfills) go through ``LoanHistory``, a
+``UNION ALL`` view of both tables, and see no difference. The archive is a
+plain table on every backend rather than a native PostgreSQL partition, so
+the same code runs on SQLite and MySQL.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from library_project.counts import invalidate_counts
+from .models import ArchivedLoan, Loan, Notice
+
+COLUMNS = ('id', 'user_id', 'book_id', 'borrowed_date', 'due_date', 'return_date', 'status', 'notes')
+
+
+def archivable(cutoff):
+    """Loans returned before ``cutoff``."""
+    return Loan.objects.filter(status='returned', return_date__lt=cutoff)
+
+
+def archive_loans(days=None, chunk_size=None, now=None):
+    """
+    Move loans returned more than ``days`` ago into the archive, oldest ids
+    first; yields the number of loans moved by each chunk.
+    """
+    days = settings.LOAN_ARCHIVE_AFTER_DAYS if days is None else days
+    chunk_size = chunk_size or settings.LOAN_ARCHIVE_CHUNK_SIZE
+    cutoff = (now or timezone.now()) - datetime.timedelta(days=days)
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(column) for column in COLUMNS)
+    loans, archive = quote(Loan._meta.db_table), quote(ArchivedLoan._meta.db_table)
+    condition = (
+        f'{quote("id")} > %s AND {quote("id")} <= %s '
+        f'AND {quote("status")} = %s AND {quote("return_date")} < %s'
+    )
+    after = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                archivable(cutoff).filter(id__gt=after).select_for_update()
+                .order_by('id').values_list('id', flat=True)[:chunk_size]
+            )
+            if not ids:
+                return
+            params = [after, ids[-1], 'returned', connection.ops.adapt_datetimefield_value(cutoff)]
+            # The notice log of archived loans goes with them
+            Notice.objects.filter(loan__in=archivable(cutoff).filter(id__gt=after, id__lte=ids[-1])).delete()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {archive} ({columns}) SELECT {columns} FROM {loans} WHERE {condition}',
+                    params,
+                )
+                cursor.execute(f'DELETE FROM {loans} WHERE {condition}', params)
+                moved = cursor.rowcount
+        invalidate_counts(Loan)
+        after = ids[-1]
+        yield moved
@@ -0,0 +1,214 @@
+"""
+Prefix autocomplete for the catalog search box.
+
+``PrefixIndex`` keeps every distinct title and author (authors also under
+their surname) in one sorted array, so a prefix lookup is two bisections
+plus a scan of the matching range. Each worker builds it at start-up (see
+``library_project/wsgi.py``) and then refreshes it incrementally from
+``Book.updated_at``. A periodic full rebuild reconciles books deleted
+through other workers; it is built off the lock and swapped in, so
+suggestions are not held up by it.
+"""
+import heapq
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.conf import settings
+
+from .models import Book
+
+CACHE_SIZE = 10000
+
+
+def normalize(text):
+    """Case- and accent-insensitive form of ``text`` used as the sort key."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.casefold().split())
+
+
+def book_terms(title, author):
+    """Return the ``(kind, text)`` suggestions contributed by one book."""
+    terms = []
+    if title:
+        terms.append(('title', title))
+    if author:
+        terms.append(('author', author))
+    return terms
+
+
+class PrefixIndex:
+    """
+    Sorted-array prefix index over titles and authors.
+
+    ``entries`` is a sorted list of ``(key, kind, text)`` tuples and
+    ``counts`` maps ``(kind, text)`` to the number of books it occurs in,
+    which is used to rank suggestions.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        # Held while rebuilding, so only one thread of a worker rebuilds at a time
+        self.building = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.entries = []
+            self.counts = {}
+            self.books = {}
+            self.cache = {}
+            self.synced_until = None
+            self.checked_at = None
+            self.built_at = None
+
+    @staticmethod
+    def _keys(kind, text):
+        key = normalize(text)
+        keys = {key}
+        if kind == 'author' and ' ' in key:
+            keys.add(key.rsplit(' ', 1)[1])
+        return keys
+
+    def _increment(self, kind, text):
+        term = (kind, text)
+        count = self.counts.get(term, 0)
+        self.counts[term] = count + 1
+        if not count:
+            for key in self._keys(kind, text):
+                insort(self.entries, (key, kind, text))
+
+    def _decrement(self, kind, text):
+        term = (kind, text)
+        count = self.counts.get(term, 0) - 1
+        if count > 0:
+            self.counts[term] = count
+            return
+        self.counts.pop(term, None)
+        for key in self._keys(kind, text):
+            position = bisect_left(self.entries, (key, kind, text))
+            if position < len(self.entries) and self.entries[position] == (key, kind, text):
+                del self.entries[position]
+
+    def add(self, pk, title, author):
+        with self.lock:
+            previous = self.books.get(pk)
+            if previous == (title, author):
+                return
+            self.discard(pk)
+            self.books[pk] = (title, author)
+            for kind, text in book_terms(title, author):
+                self._increment(kind, text)
+            self.cache.clear()
+
+    def discard(self, pk):
+        with self.lock:
+            previous = self.books.pop(pk, None)
+            if previous is None:
+                return
+            for kind, text in book_terms(*previous):
+                self._decrement(kind, text)
+            self.cache.clear()
+
+    def build(self):
+        """
+        Rebuild from scratch with a single sort. The new arrays are built off
+        the lock and then swapped in, so suggestions keep being served from
+        the old ones in the meantime.
+        """
+        books, counts, synced_until = {}, {}, None
+        rows = Book.objects.order_by().values_list('id', 'updated_at', 'title', 'author')
+        for pk, updated_at, title, author in rows.iterator(chunk_size=5000):
+            books[pk] = (title, author)
+            for term in book_terms(title, author):
+                counts[term] = counts.get(term, 0) + 1
+            if synced_until is None or updated_at > synced_until:
+                synced_until = updated_at
+        entries = sorted(
+            (key, kind, text) for kind, text in counts for key in self._keys(kind, text)
+        )
+        built_at = time.monotonic()
+        with self.lock:
+            self.entries, self.counts, self.books = entries, counts, books
+            self.cache = {}
+            self.synced_until = synced_until
+            self.built_at = self.checked_at = built_at
+
+    def sync(self, force=False):
+        """
+        Apply changes made since the last sync.
+
+        Runs at most once every ``AUTOCOMPLETE_REFRESH_SECONDS`` unless
+        ``force`` is set, and rebuilds from scratch every
+        ``AUTOCOMPLETE_REBUILD_SECONDS``. Database reads happen off the lock.
+        """
+        refresh = getattr(settings, 'AUTOCOMPLETE_REFRESH_SECONDS', 5)
+        rebuild = getattr(settings, 'AUTOCOMPLETE_REBUILD_SECONDS', 3600)
+        now = time.monotonic()
+        with self.lock:
+            built_at = self.built_at
+            if built_at is not None and now - built_at < rebuild:
+                if not force and now - self.checked_at < refresh:
+                    return
+                self.checked_at = now
+                since = self.synced_until
+        if built_at is None or now - built_at >= rebuild:
+            # Until the first build is done, other threads wait for it;
+            # afterwards they keep serving the old arrays
+            if self.building.acquire(blocking=built_at is None):
+                try:
+                    if self.built_at == built_at:
+                        self.build()
+                finally:
+                    self.building.release()
+            return
+        queryset = Book.objects.order_by()
+        if since is not None:
+            # ``None``: the table was empty at the last build
+            queryset = queryset.filter(updated_at__gte=since)
+        rows = list(queryset.values_list('id', 'updated_at', 'title', 'author'))
+        with self.lock:
+            for pk, updated_at, title, author in rows:
+                self.add(pk, title, author)
+                if self.synced_until is None or updated_at > self.synced_until:
+                    self.synced_until = updated_at
+
+    def suggest(self, prefix, limit=10):
+        """Return up to ``limit`` suggestions for ``prefix``, most common first."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        cache_key = (prefix, limit)
+        with self.lock:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+            start = bisect_left(self.entries, (prefix,))
+            stop = bisect_left(self.entries, (prefix + '\U0010ffff',), lo=start)
+            seen = set()
+            candidates = []
+            for key, kind, text in self.entries[start:stop]:
+                if (kind, text) not in seen:
+                    seen.add((kind, text))
+                    candidates.append((-self.counts[(kind, text)], key, kind, text))
+            results = [
+                {'text': text, 'type': kind, 'count': -count}
+                for count, _, kind, text in heapq.nsmallest(limit, candidates)
+            ]
+            if len(self.cache) >= CACHE_SIZE:
+                self.cache.clear()
+            self.cache[cache_key] = results
+            return results
+
+
+autocomplete_index = PrefixIndex()
+
+
+def warm_up():
+    """Build the index at worker start; errors are deferred to the first request."""
+    try:
+        autocomplete_index.sync()
+    except Exception:
+        autocomplete_index.reset()
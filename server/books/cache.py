@@ -0,0 +1,122 @@
+"""
+Response cache for catalog reads (book list, book detail, categories).
+
+Entries are stored in the configured Django cache (local memory, file or
+database backends all work) under keys that include the current
+``CatalogGeneration`` value. Any write to ``Book`` bumps the generation in
+the database, so invalidation is a single-row UPDATE and every worker or
+node sharing the database stops using the old entries at once. Borrows and
+returns only bump it when a book's availability flips (see
+``BookQuerySet._move_copy``). The generation itself is kept in the cache
+for ``CATALOG_GENERATION_TTL`` seconds, so a cache hit needs no query; a
+bump deletes it, so with a shared cache every worker sees the bump at once,
+and with per-process caches other processes see it within that time.
+
+Each entry also carries a soft expiry. When it passes, one worker takes a
+short-lived lock via ``cache.add`` and recomputes while the others keep
+serving the stale copy; on a cold key the others wait briefly for the
+winner instead of all hitting the database together. The lock holds a
+token of its owner, and only the owner releases it.
+"""
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import CatalogGeneration
+
+ENTRY_KEY = 'catalog:{generation}:{name}:{digest}'
+LOCK_KEY = '{key}:lock'
+GENERATION_KEY = 'catalog-generation'
+
+
+def cache_settings():
+    return (
+        getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300),
+        getattr(settings, 'CATALOG_CACHE_LOCK_TIMEOUT', 10),
+        getattr(settings, 'CATALOG_CACHE_WAIT', 2.0),
+    )
+
+
+def catalog_generation():
+    """The catalog generation, read from the database at most every ``CATALOG_GENERATION_TTL`` seconds."""
+    value = cache.get(GENERATION_KEY)
+    if value is not None:
+        return value
+    value = CatalogGeneration.objects.filter(pk=1).values_list('value', flat=True).first()
+    if value is None:
+        CatalogGeneration.objects.get_or_create(pk=1)
+        value = 0
+    cache.set(GENERATION_KEY, value, getattr(settings, 'CATALOG_GENERATION_TTL', 1.0))
+    return value
+
+
+def _bump():
+    CatalogGeneration.objects.filter(pk=1).update(value=F('value') + 1)
+    cache.delete(GENERATION_KEY)
+
+
+def bump_catalog_generation():
+    """
+    Invalidate all cached catalog responses, once the current transaction
+    commits. A failed bump (e.g. a locked SQLite database) is logged rather
+    than failing the already committed write; entries then expire normally.
+    """
+    transaction.on_commit(_bump, robust=True)
+
+
+def entry_key(request, name):
+    params = sorted(request.query_params.lists())
+    raw = f'{request.get_host()}|{request.path}|{params}'
+    digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    return ENTRY_KEY.format(generation=catalog_generation(), name=name, digest=digest)
+
+
+def cached_response(request, name, compute):
+    """
+    Return a cached ``Response`` for ``request``, or call ``compute()``.
+
+    Only ``200 OK`` responses are cached, as their data (not the rendered
+    bytes), so content negotiation still happens per request.
+    """
+    timeout, lock_timeout, wait = cache_settings()
+    key = entry_key(request, name)
+    lock = LOCK_KEY.format(key=key)
+
+    entry = cache.get(key)
+    if entry is not None and entry['expires'] > time.time():
+        return Response(entry['data'])
+
+    token = uuid.uuid4().hex
+    if not cache.add(lock, token, lock_timeout):
+        # Someone else is recomputing: serve stale data, or wait for theirs
+        token = None
+        if entry is not None:
+            return Response(entry['data'])
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(key)
+            if entry is not None:
+                return Response(entry['data'])
+
+    try:
+        response = compute()
+        if response.status_code == status.HTTP_200_OK:
+            # Kept past the soft expiry so it can be served while refreshing
+            cache.set(
+                key,
+                {'data': response.data, 'expires': time.time() + timeout},
+                timeout + lock_timeout * 2,
+            )
+        return response
+    finally:
+        # Never release a lock taken by another worker (e.g. after ours expired)
+        if token is not None and cache.get(lock) == token:
+            cache.delete(lock)
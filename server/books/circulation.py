@@ -0,0 +1,178 @@
+"""
+Batch checkout and check-in for circulation desks.
+
+``borrow_books`` and ``return_loans`` process a whole scan list in one
+transaction with a fixed number of queries, however long the list: the rows
+involved are read (and locked) once, copies and loan counters are moved with
+one ``UPDATE`` per distinct amount, and new loans are written with a single
+``bulk_create``. Each item gets its own result, so one unavailable book
+does not fail the others.
+
+``mark_overdue`` is the sweep moving past-due loans from ``active`` to
+``overdue`` in chunks (``manage.py mark_overdue``).
+
+All three keep the daily circulation rollups (``books.rollups``) current.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from accounts.models import User
+from library_project.counts import invalidate_counts
+from .models import Book, Loan
+from .popularity import popularity_increment
+from .rollups import record_borrows, record_on_commit, record_overdues, record_returns
+
+LOAN_DAYS = 14
+OVERDUE_CHUNK_SIZE = 1000
+
+
+def _group_by_count(counts):
+    """Turn ``{id: count}`` into ``{count: [ids]}``, for one UPDATE per count."""
+    groups = defaultdict(list)
+    for pk, count in counts.items():
+        groups[count].append(pk)
+    return groups
+
+
+def borrow_books(user, book_ids, quota=None):
+    """
+    Borrow each book of ``book_ids`` for ``user``, within the borrowing quota.
+
+    Returns one result per id, in order: ``{'book_id', 'loan_id',
+    'due_date'}`` for a loan, ``{'book_id', 'error'}`` otherwise.
+    """
+    quota = settings.LOAN_QUOTA if quota is None else quota
+    results = [{'book_id': book_id} for book_id in book_ids]
+    wanted = set(book_ids)
+    with transaction.atomic():
+        active = User.objects.select_for_update().filter(pk=user.pk).values_list(
+            'active_loans', flat=True
+        ).get()
+        stock, categories = {}, {}
+        for book_id, available, category in (
+            Book.objects.select_for_update().filter(id__in=wanted)
+            .values_list('id', 'available_copies', 'category')
+        ):
+            stock[book_id], categories[book_id] = available, category
+        taken = set(
+            Loan.objects.filter(user=user, book_id__in=wanted).exclude(status='returned')
+            .values_list('book_id', flat=True)
+        )
+        borrowed = []
+        for result in results:
+            book_id = result['book_id']
+            if book_id in taken:
+                result['error'] = 'You already have an active loan for this book.'
+            elif book_id not in stock:
+                result['error'] = 'Book not found.'
+            elif stock[book_id] < 1:
+                result['error'] = 'This book is currently not available.'
+            elif active + len(borrowed) >= quota:
+                result['error'] = f'You have reached the limit of {quota} active loans.'
+            else:
+                borrowed.append(book_id)
+                taken.add(book_id)
+        if not borrowed:
+            return results
+
+        due_date = timezone.now() + timedelta(days=LOAN_DAYS)
+        Book.objects.filter(id__in=borrowed).update(
+            available_copies=F('available_copies') - 1, popularity=popularity_increment()
+        )
+        User.objects.filter(pk=user.pk).update(active_loans=F('active_loans') + len(borrowed))
+        loans = Loan.objects.bulk_create([
+            Loan(user=user, book_id=book_id, due_date=due_date) for book_id in borrowed
+        ])
+        if loans[0].pk is None:  # MySQL does not return the new ids
+            loan_ids = dict(
+                Loan.objects.filter(user=user, book_id__in=borrowed).exclude(status='returned')
+                .values_list('book_id', 'id')
+            )
+        else:
+            loan_ids = {loan.book_id: loan.pk for loan in loans}
+        record_on_commit(record_borrows, user, [(book_id, categories[book_id]) for book_id in borrowed],
+                         loans[0].borrowed_date, list(loan_ids.values()))
+        invalidate_counts(Loan, scopes=[user.pk])
+
+    for result in results:
+        if 'error' not in result:
+            result['loan_id'] = loan_ids[result['book_id']]
+            result['due_date'] = due_date
+    return results
+
+
+def return_loans(loan_ids, user=None):
+    """
+    Return each loan of ``loan_ids``; with ``user``, only that user's loans.
+
+    Returns one result per id, in order: ``{'loan_id', 'book_id',
+    'return_date'}`` for a returned loan, ``{'loan_id', 'error'}`` otherwise.
+    """
+    results = [{'loan_id': loan_id} for loan_id in loan_ids]
+    with transaction.atomic():
+        loans = Loan.objects.select_for_update().filter(id__in=set(loan_ids))
+        if user is not None:
+            loans = loans.filter(user=user)
+        rows = {pk: (user_id, book_id, status) for pk, user_id, book_id, status
+                in loans.values_list('id', 'user_id', 'book_id', 'status')}
+        closing = {}
+        for result in results:
+            row = rows.get(result['loan_id'])
+            if row is None:
+                result['error'] = 'Loan not found.'
+            elif row[2] == 'returned' or result['loan_id'] in closing:
+                result['error'] = 'This book has already been returned.'
+            else:
+                closing[result['loan_id']] = row
+        if not closing:
+            return results
+
+        return_date = timezone.now()
+        Loan.objects.filter(id__in=closing).update(status='returned', return_date=return_date)
+        books = Counter(book_id for _, book_id, _ in closing.values())
+        for count, ids in _group_by_count(books).items():
+            Book.objects.filter(id__in=ids).update(
+                available_copies=Least(F('available_copies') + count, F('total_copies'))
+            )
+        users = Counter(user_id for user_id, _, _ in closing.values())
+        for count, ids in _group_by_count(users).items():
+            User.objects.filter(pk__in=ids).update(active_loans=Greatest(F('active_loans') - count, 0))
+        record_on_commit(record_returns, list(closing), return_date,
+                         {pk for pk, (_, _, status) in closing.items() if status == 'active'})
+        invalidate_counts(Loan, scopes=users)
+
+    for result in results:
+        if 'error' not in result:
+            result['book_id'] = rows[result['loan_id']][1]
+            result['return_date'] = return_date
+    return results
+
+
+def mark_overdue(now=None, chunk_size=OVERDUE_CHUNK_SIZE):
+    """
+    Mark active loans due before ``now`` as overdue and return how many.
+
+    Each chunk is a range scan of the ``(status, due_date)`` index and one
+    ``UPDATE`` in its own transaction, so the cost follows the loans that
+    became overdue, not the number of active loans, and no lock is held
+    for the whole sweep.
+    """
+    now = now or timezone.now()
+    due = Loan.objects.filter(status='active', due_date__lt=now)
+    marked, ids = 0, True
+    while ids:
+        with transaction.atomic():
+            ids = list(
+                due.select_for_update().order_by('due_date', 'id').values_list('id', flat=True)[:chunk_size]
+            )
+            marked += due.filter(id__in=ids).update(status='overdue')
+            record_overdues(ids)
+    if marked:
+        invalidate_counts(Loan)
+    return marked
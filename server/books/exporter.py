@@ -0,0 +1,137 @@
+"""
+Streaming export of the Book and Loan tables as CSV or NDJSON.
+
+Rows are read with ``values_list().iterator(chunk_size=...)`` (a
+server-side cursor on PostgreSQL), encoded and emitted in blocks of about
+``BLOCK_SIZE`` bytes, optionally through an incremental gzip compressor.
+Nothing holds more than one chunk of rows, so memory stays flat however
+large the table is. Loans are flattened: user and book are exported as ids
+plus the username, ISBN and title instead of nested objects, and read from
+``LoanHistory`` so archived loans are included.
+"""
+import csv
+import datetime
+import decimal
+import io
+import json
+import zlib
+
+from django.db import models
+
+from .filters import BookFilter, LoanFilter
+from .models import Book, LoanHistory
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+EXPORTS = {
+    'books': (Book, BookFilter, (
+        'id', 'isbn', 'title', 'author', 'publisher', 'publication_date', 'page_count',
+        'language', 'category', 'description', 'total_copies', 'available_copies',
+        'cover_image', 'created_at', 'updated_at',
+    )),
+    'loans': (LoanHistory, LoanFilter, (
+        'id', 'user_id', 'user__username', 'book_id', 'book__isbn', 'book__title',
+        'borrowed_date', 'due_date', 'return_date', 'status', 'notes',
+    )),
+}
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+CHUNK_SIZE = 2000
+BLOCK_SIZE = 64 * 1024
+
+
+def _plain(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f'Cannot export {type(value).__name__}')
+
+
+def encode_csv(columns, rows, temporal=()):
+    """Yield CSV lines; ``temporal`` are the indexes of date/time columns."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, row in enumerate(rows, 1):
+        if temporal:
+            row = list(row)
+            for index in temporal:
+                if row[index] is not None:
+                    row[index] = row[index].isoformat()
+        writer.writerow(row)
+        if count % 1000 == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def encode_ndjson(columns, rows, temporal=()):
+    if orjson is not None:
+        for row in rows:
+            yield orjson.dumps(dict(zip(columns, row)), default=_plain) + b'\n'
+    else:  # pragma: no cover
+        for row in rows:
+            yield (json.dumps(dict(zip(columns, row)), default=_plain, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+ENCODERS = {'csv': encode_csv, 'ndjson': encode_ndjson}
+
+
+def temporal_columns(model, columns):
+    """Indexes of the ``columns`` (``values_list`` paths) holding dates or times."""
+    indexes = []
+    for index, column in enumerate(columns):
+        current = model
+        for attr in column.split('__'):
+            field = current._meta.get_field(attr)
+            current = field.related_model
+        if isinstance(field, (models.DateField, models.TimeField)):
+            indexes.append(index)
+    return indexes
+
+
+def export_queryset(name, params=None):
+    """
+    Return the ``name`` queryset filtered by its ``FilterSet`` and ``params``.
+
+    Raises ``ValueError`` with the filter errors for invalid parameters.
+    """
+    model, filterset_class, columns = EXPORTS[name]
+    filterset = filterset_class(params or {}, queryset=model.objects.all())
+    if not filterset.is_valid():
+        raise ValueError(filterset.errors)
+    return filterset.qs
+
+
+def export_stream(name, queryset, format='csv', compress=False, chunk_size=CHUNK_SIZE):
+    """Yield the encoded (and optionally gzipped) export in blocks of bytes."""
+    model, _, columns = EXPORTS[name]
+    rows = queryset.order_by('id').values_list(*columns).iterator(chunk_size=chunk_size)
+    labels = [column.replace('__', '_') for column in columns]
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    block, size = [], 0
+    for piece in ENCODERS[format](labels, rows, temporal_columns(model, columns)):
+        block.append(piece)
+        size += len(piece)
+        if size >= BLOCK_SIZE:
+            data = b''.join(block)
+            block, size = [], 0
+            data = compressor.compress(data) if compressor else data
+            if data:
+                yield data
+    data = b''.join(block)
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+def export_filename(name, format, compress=False):
+    return f"{name}.{FORMATS[format][1]}{'.gz' if compress else ''}"
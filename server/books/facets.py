@@ -0,0 +1,152 @@
+"""
+Faceted catalog counts (category, language, availability).
+
+Counts are kept per ``(category, language, available)`` bucket in
+``BookFacetCount`` and adjusted on every write:
+
+* ``Book.save()`` / ``delete()`` through the signals in ``books.signals``;
+* ``bulk_create()`` and ``QuerySet.update()`` through ``BookQuerySet``;
+  an update of more than ``MAX_DELTA_ROWS`` books queues the
+  ``rebuild_facets`` task instead, so the counts catch up once a worker
+  has run it.
+
+Requests filtered only by category, language and/or availability are
+answered by summing bucket rows. Any other ``BookFilter`` filter needs the
+matching books, so those requests group the filtered queryset instead.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import BooleanField, Count, ExpressionWrapper, F, Q, Sum
+
+from .models import Book, BookFacetCount
+
+# BookFilter filters that the bucket rows can answer on their own
+BUCKET_FILTERS = {'category', 'language', 'available'}
+
+# Updates touching more rows than this recount every bucket instead
+MAX_DELTA_ROWS = 1000
+
+
+def facet_key(book):
+    """Return the facet bucket of a ``Book`` instance."""
+    return (book.category, book.language, book.available_copies > 0)
+
+
+def facet_delta(books, sign=1):
+    """Return a ``Counter`` of bucket changes for adding (or removing) ``books``."""
+    return Counter({key: sign * count for key, count in Counter(map(facet_key, books)).items()})
+
+
+def facet_counts(queryset):
+    """Group ``queryset`` into a ``Counter`` of bucket -> number of books."""
+    rows = (
+        queryset.order_by()
+        .annotate(available=ExpressionWrapper(Q(available_copies__gt=0), output_field=BooleanField()))
+        .values_list('category', 'language', 'available')
+        .annotate(count=Count('id'))
+    )
+    return Counter({(category, language, bool(available)): count
+                    for category, language, available, count in rows})
+
+
+def subtract_counts(after, before):
+    """Return ``after - before`` keeping negative values, unlike ``Counter.__sub__``."""
+    delta = Counter(after)
+    delta.subtract(before)
+    return delta
+
+
+def adjust_facet(key, delta):
+    """Atomically add ``delta`` to one bucket, creating it if needed."""
+    if not delta:
+        return
+    category, language, available = key
+    buckets = BookFacetCount.objects.filter(category=category, language=language, available=available)
+    if buckets.update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            BookFacetCount.objects.create(
+                category=category, language=language, available=available, count=delta
+            )
+    except IntegrityError:
+        # Created concurrently; retry as an update
+        buckets.update(count=F('count') + delta)
+
+
+def apply_facet_deltas(deltas):
+    for key, delta in deltas.items():
+        adjust_facet(key, delta)
+
+
+def rebuild_facets():
+    """Recompute every bucket from the Book table."""
+    counts = facet_counts(Book.objects.all())
+    with transaction.atomic():
+        BookFacetCount.objects.all().delete()
+        BookFacetCount.objects.bulk_create([
+            BookFacetCount(category=category, language=language, available=available, count=count)
+            for (category, language, available), count in counts.items()
+        ])
+    return counts
+
+
+def bucket_counts(data):
+    """Sum the maintained buckets matching the bucket-only filters in ``data``."""
+    buckets = BookFacetCount.objects.filter(count__gt=0)
+    if data.get('category'):
+        buckets = buckets.filter(category__icontains=data['category'])
+    if data.get('language'):
+        buckets = buckets.filter(language__icontains=data['language'])
+    if data.get('available') is not None:
+        buckets = buckets.filter(available=data['available'])
+    rows = buckets.values_list('category', 'language', 'available').annotate(total=Sum('count'))
+    return Counter({(category, language, available): total
+                    for category, language, available, total in rows})
+
+
+def active_filters(filterset):
+    return {
+        name for name, value in filterset.form.cleaned_data.items()
+        if value not in (None, '', [])
+    }
+
+
+def catalog_facets(filterset):
+    """
+    Return facet counts for a bound, valid ``BookFilter``.
+
+    Uses the maintained buckets when possible and groups the filtered
+    queryset otherwise.
+    """
+    if active_filters(filterset) <= BUCKET_FILTERS:
+        counts, source = bucket_counts(filterset.form.cleaned_data), 'aggregate'
+    else:
+        counts, source = facet_counts(filterset.qs), 'live'
+    return rollup(counts), source
+
+
+def rollup(counts):
+    """Fold bucket counts into per-dimension facet lists."""
+    categories, languages, availability = Counter(), Counter(), Counter()
+    for (category, language, available), count in counts.items():
+        if count <= 0:
+            continue
+        categories[category] += count
+        languages[language] += count
+        availability['available' if available else 'unavailable'] += count
+
+    def values(counter):
+        return [{'value': value, 'count': count}
+                for value, count in sorted(counter.items(), key=lambda item: (-item[1], item[0]))]
+
+    return {
+        'total': sum(availability.values()),
+        'category': values(categories),
+        'language': values(languages),
+        'availability': [
+            {'value': bucket, 'count': availability[bucket]}
+            for bucket in ('available', 'unavailable')
+        ],
+    }
@@ -1,5 +1,6 @@
 from django_filters import rest_framework as filters
 from .models import Book, Loan
+from .fuzzy import fuzzy_filter
 
 
 class BookFilter(filters.FilterSet):
@@ -11,15 +12,29 @@ class BookFilter(filters.FilterSet):
     available = filters.BooleanFilter(method='filter_available')
     min_pages = filters.NumberFilter(field_name='page_count', lookup_expr='gte')
     max_pages = filters.NumberFilter(field_name='page_count', lookup_expr='lte')
+    fuzzy = filters.BooleanFilter(method='filter_fuzzy')
     
     class Meta:
         model = Book
         fields = ['title', 'author', 'category', 'language', 'isbn']
     
+    def filter_queryset(self, queryset):
+        """With ?fuzzy=1, title and author are matched by trigram similarity."""
+        if self.form.cleaned_data.get('fuzzy'):
+            for name in ('title', 'author'):
+                value = self.form.cleaned_data.pop(name, None)
+                if value:
+                    queryset = fuzzy_filter(queryset, name, value)
+        return super().filter_queryset(queryset)
+    
     def filter_available(self, queryset, name, value):
         if value:
             return queryset.filter(available_copies__gt=0)
         return queryset.filter(available_copies=0)
+    
+    def filter_fuzzy(self, queryset, name, value):
+        # Handled in filter_queryset
+        return queryset
 
 
 class LoanFilter(filters.FilterSet):
@@ -0,0 +1,117 @@
+"""
+Late fines, computed in the database.
+
+A loan is fined ``FINE_DAILY_RATE`` per whole day it is late beyond
+``FINE_GRACE_DAYS``, up to ``FINE_MAX`` per loan (0: no cap). Open loans
+accrue up to now; returned loans up to their return date. Amounts are
+computed in cents by SQL annotations, so per-loan fines, per-user balances
+and the aging report are each one query over the ``(status, due_date)``
+index rather than a pass over every ``Loan`` instance.
+"""
+import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, DateTimeField, F, Func, IntegerField, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+
+from .models import Loan, LoanHistory
+
+# Days overdue of the aging report's buckets: (label, first day, last day)
+AGING_BUCKETS = (
+    ('0-7', 0, 7),
+    ('8-30', 8, 30),
+    ('31+', 31, None),
+)
+
+
+class DaysLate(Func):
+    """Whole days from ``due`` to ``end`` (negative when not yet late)."""
+    arity = 2
+    output_field = IntegerField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        (due, due_params), (end, end_params) = (
+            compiler.compile(expression) for expression in self.get_source_expressions()
+        )
+        if connection.vendor == 'mysql':
+            return f'TIMESTAMPDIFF(DAY, {due}, {end})', (*due_params, *end_params)
+        if connection.vendor == 'postgresql':
+            sql = f'FLOOR(EXTRACT(EPOCH FROM ({end} - {due})) / 86400)::integer'
+        else:
+            sql = f'CAST(julianday({end}) - julianday({due}) AS INTEGER)'
+        return sql, (*end_params, *due_params)
+
+
+def cents(amount):
+    """A currency amount (e.g. a setting) in whole cents."""
+    return int(Decimal(amount) * 100)
+
+
+def amount(cents):
+    """Cents as a ``Decimal`` currency amount."""
+    return Decimal(cents or 0).scaleb(-2)
+
+
+def fine_expression(now):
+    """SQL expression for a loan's fine in cents as of ``now``."""
+    end = Coalesce('return_date', Value(now, output_field=DateTimeField()))
+    days = Greatest(DaysLate(F('due_date'), end) - settings.FINE_GRACE_DAYS, Value(0))
+    fine = days * cents(settings.FINE_DAILY_RATE)
+    if settings.FINE_MAX:
+        fine = Least(fine, Value(cents(settings.FINE_MAX)))
+    return fine
+
+
+def fined_loans(now=None):
+    """Loans late at ``now`` (open, or returned late), annotated with ``fine_cents``."""
+    now = now or timezone.now()
+    late = (
+        Q(status__in=('active', 'overdue'), due_date__lt=now)
+        | Q(status='returned', return_date__gt=F('due_date'))
+    )
+    return (
+        LoanHistory.objects.filter(late)
+        .annotate(fine_cents=fine_expression(now))
+        .filter(fine_cents__gt=0)
+    )
+
+
+def balances(now=None):
+    """Per-user fine totals, largest first: dicts of ``user_id``, ``username``, ``loans``, ``balance_cents``."""
+    return (
+        fined_loans(now).order_by()
+        .values('user_id', 'user__username')
+        .annotate(loans=Count('id'), balance_cents=Sum('fine_cents'))
+        .order_by('-balance_cents', 'user_id')
+    )
+
+
+def aging_report(now=None):
+    """
+    Open overdue loans by days overdue (``AGING_BUCKETS``): loans, patrons
+    and accrued fines per bucket, in one aggregate query.
+    """
+    now = now or timezone.now()
+    overdue = Loan.objects.filter(status__in=('active', 'overdue'), due_date__lt=now)
+    fine = fine_expression(now)
+    aggregates = {}
+    for n, (_, first, last) in enumerate(AGING_BUCKETS):
+        # ``days`` whole days overdue <=> due_date <= now - days
+        bucket = Q(due_date__lte=now - datetime.timedelta(days=first))
+        if last is not None:
+            bucket &= Q(due_date__gt=now - datetime.timedelta(days=last + 1))
+        aggregates[f'loans_{n}'] = Count('id', filter=bucket)
+        aggregates[f'patrons_{n}'] = Count('user', filter=bucket, distinct=True)
+        aggregates[f'fines_{n}'] = Sum(fine, filter=bucket)
+    totals = overdue.aggregate(**aggregates)
+    return [
+        {
+            'bucket': label,
+            'loans': totals[f'loans_{n}'],
+            'patrons': totals[f'patrons_{n}'],
+            'fines': amount(totals[f'fines_{n}']),
+        }
+        for n, (label, _, _) in enumerate(AGING_BUCKETS)
+    ]
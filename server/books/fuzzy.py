@@ -0,0 +1,295 @@
+"""
+Typo-tolerant (fuzzy) matching on ``Book.title`` and ``Book.author``.
+
+Similarity is trigram word similarity: the share of the query's trigrams
+found in the field, as computed by ``pg_trgm``'s ``word_similarity()``.
+
+* PostgreSQL answers with the ``<%`` operator on ``gin_trgm_ops`` indexes.
+* SQLite and MySQL use ``TrigramIndex``, an in-process inverted index
+  built when each worker starts (see ``library_project/wsgi.py``) and then
+  refreshed incrementally from ``Book.updated_at``.
+
+Incremental syncs re-read the last ``SYNC_OVERLAP`` before the watermark,
+so a row saved with an earlier ``updated_at`` but committed after the
+previous sync is still picked up. Changes that never touch ``updated_at``
+(``QuerySet.update()``, raw SQL) and books deleted through other workers
+are reconciled by a full rebuild every ``FUZZY_INDEX_REBUILD_SECONDS``,
+built off the lock and swapped in so searches are not held up by it.
+"""
+import datetime
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import CharField, FloatField, Lookup, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Greatest
+
+from .models import Book
+
+FUZZY_FIELDS = ('title', 'author')
+TRIGRAM_INDEXES = {
+    'title': 'books_book_title_trgm_idx',
+    'author': 'books_book_author_trgm_idx',
+}
+# How far behind the watermark incremental syncs start (longer than any
+# write transaction is expected to stay open)
+SYNC_OVERLAP = datetime.timedelta(seconds=60)
+
+
+def fuzzy_threshold():
+    return getattr(settings, 'FUZZY_SEARCH_THRESHOLD', 0.5)
+
+
+def trigrams(text):
+    """Return the set of trigrams of ``text``, padded per word like ``pg_trgm``."""
+    grams = set()
+    for word in re.findall(r'\w+', (text or '').lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class WordSimilar(Lookup):
+    """``field__word_similar=value`` -> ``value <% field`` (PostgreSQL only)."""
+    lookup_name = 'word_similar'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{rhs} <%% {lhs}', list(rhs_params) + list(lhs_params)
+
+
+CharField.register_lookup(WordSimilar)
+
+
+class TrigramIndex:
+    """
+    In-process trigram inverted index over book titles and authors.
+
+    ``postings`` maps a trigram to the ids of books containing it in any
+    indexed field. Lookups only scan the posting lists of the query's
+    rarest trigrams (a book reaching the threshold must contain at least
+    one of them) and then verify each candidate against its stored
+    trigram sets.
+    """
+
+    def __init__(self, fields=FUZZY_FIELDS):
+        self.fields = fields
+        self.lock = threading.RLock()
+        # Held while rebuilding, so only one thread of a worker rebuilds at a time
+        self.building = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.postings = defaultdict(set)
+            self.documents = {}
+            self.synced_until = None
+            self.checked_at = None
+            self.built_at = None
+
+    @staticmethod
+    def _insert(postings, documents, pk, values):
+        grams = tuple(frozenset(trigrams(value)) for value in values)
+        documents[pk] = grams
+        for gram in set().union(*grams):
+            postings[gram].add(pk)
+
+    def add(self, pk, *values):
+        with self.lock:
+            self.discard(pk)
+            self._insert(self.postings, self.documents, pk, values)
+
+    def discard(self, pk):
+        with self.lock:
+            grams = self.documents.pop(pk, None)
+            if grams is None:
+                return
+            for gram in set().union(*grams):
+                ids = self.postings.get(gram)
+                if ids is not None:
+                    ids.discard(pk)
+                    if not ids:
+                        del self.postings[gram]
+
+    def build(self):
+        """
+        Rebuild from scratch. The new index is built off the lock and then
+        swapped in, so searches keep using the old one in the meantime.
+        """
+        postings, documents, synced_until = defaultdict(set), {}, None
+        rows = Book.objects.order_by().values_list('id', 'updated_at', *self.fields)
+        for pk, updated_at, *values in rows.iterator(chunk_size=5000):
+            self._insert(postings, documents, pk, values)
+            if synced_until is None or updated_at > synced_until:
+                synced_until = updated_at
+        built_at = time.monotonic()
+        with self.lock:
+            self.postings, self.documents, self.synced_until = postings, documents, synced_until
+            self.built_at = self.checked_at = built_at
+
+    def sync(self, force=False):
+        """
+        Pull books changed since the last sync.
+
+        Runs at most once every ``FUZZY_INDEX_REFRESH_SECONDS`` unless
+        ``force`` is set, and rebuilds from scratch every
+        ``FUZZY_INDEX_REBUILD_SECONDS``. Database reads happen off the lock.
+        """
+        refresh = getattr(settings, 'FUZZY_INDEX_REFRESH_SECONDS', 5)
+        rebuild = getattr(settings, 'FUZZY_INDEX_REBUILD_SECONDS', 3600)
+        now = time.monotonic()
+        with self.lock:
+            built_at = self.built_at
+            if built_at is not None and now - built_at < rebuild:
+                if not force and now - self.checked_at < refresh:
+                    return
+                self.checked_at = now
+                since = self.synced_until
+        if built_at is None or now - built_at >= rebuild:
+            # Until the first build is done, other threads wait for it;
+            # afterwards they keep serving the old index
+            if self.building.acquire(blocking=built_at is None):
+                try:
+                    if self.built_at == built_at:
+                        self.build()
+                finally:
+                    self.building.release()
+            return
+        queryset = Book.objects.order_by()
+        if since is not None:
+            # ``None``: the table was empty at the last build
+            queryset = queryset.filter(updated_at__gte=since - SYNC_OVERLAP)
+        rows = list(queryset.values_list('id', 'updated_at', *self.fields))
+        with self.lock:
+            for pk, updated_at, *values in rows:
+                self.add(pk, *values)
+                if self.synced_until is None or updated_at > self.synced_until:
+                    self.synced_until = updated_at
+
+    def search(self, query, fields=None, threshold=None, limit=None):
+        """Return ``[(book_id, similarity), ...]`` best match first."""
+        threshold = fuzzy_threshold() if threshold is None else threshold
+        positions = [self.fields.index(field) for field in (fields or self.fields)]
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+        min_overlap = max(1, math.ceil(threshold * len(query_grams)))
+        with self.lock:
+            rarest = sorted(query_grams, key=lambda gram: len(self.postings.get(gram, ())))
+            candidates = set()
+            for gram in rarest[:len(query_grams) - min_overlap + 1]:
+                candidates.update(self.postings.get(gram, ()))
+            matches = []
+            for pk in candidates:
+                grams = self.documents[pk]
+                score = max(len(query_grams & grams[i]) for i in positions) / len(query_grams)
+                if score >= threshold:
+                    matches.append((pk, score))
+        matches.sort(key=lambda match: (-match[1], match[0]))
+        return matches[:limit] if limit else matches
+
+
+trigram_index = TrigramIndex()
+
+
+class FuzzyResults:
+    """Sliceable, countable fuzzy matches from the in-process index."""
+
+    def __init__(self, matches):
+        self.matches = matches
+
+    def count(self):
+        return len(self.matches)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self[key:key + 1][0]
+        ids = [pk for pk, _ in self.matches[key]]
+        books = Book.objects.in_bulk(ids)
+        for pk in ids:
+            if pk not in books:
+                # Deleted by another worker since the last sync
+                trigram_index.discard(pk)
+        return [books[pk] for pk in ids if pk in books]
+
+
+def uses_pg_trgm(conn=None):
+    return (conn or connection).vendor == 'postgresql'
+
+
+def _set_pg_threshold(threshold):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)",
+            [str(threshold)],
+        )
+
+
+def warm_up():
+    """
+    Build the index at worker start where it is used (not on PostgreSQL);
+    errors are deferred to the first request.
+    """
+    try:
+        if not uses_pg_trgm():
+            trigram_index.sync()
+    except Exception:
+        trigram_index.reset()
+
+
+def fuzzy_search(query, fields=FUZZY_FIELDS):
+    """Return books whose ``fields`` are similar to ``query``, best match first."""
+    limit = getattr(settings, 'FUZZY_SEARCH_LIMIT', 1000)
+    if uses_pg_trgm():
+        _set_pg_threshold(fuzzy_threshold())
+        match = Q()
+        for field in fields:
+            match |= Q(**{f'{field}__word_similar': query})
+        scores = [RawSQL(f'word_similarity(%s, "books_book"."{field}")', [query]) for field in fields]
+        similarity = Greatest(*scores, output_field=FloatField()) if len(scores) > 1 else scores[0]
+        return (
+            Book.objects.filter(match)
+            .annotate(similarity=similarity)
+            .order_by('-similarity', 'id')[:limit]
+        )
+    trigram_index.sync()
+    return FuzzyResults(trigram_index.search(query, fields=fields, limit=limit))
+
+
+def fuzzy_filter(queryset, field, value):
+    """Restrict ``queryset`` to books whose ``field`` is similar to ``value``."""
+    if uses_pg_trgm():
+        _set_pg_threshold(fuzzy_threshold())
+        return queryset.filter(**{f'{field}__word_similar': value})
+    trigram_index.sync()
+    limit = getattr(settings, 'FUZZY_SEARCH_LIMIT', 1000)
+    ids = [pk for pk, _ in trigram_index.search(value, fields=(field,), limit=limit)]
+    return queryset.filter(id__in=ids)
+
+
+def install_trigram_indexes(schema_editor):
+    """Create the ``pg_trgm`` extension and indexes (used by migrations)."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for field, name in TRIGRAM_INDEXES.items():
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON books_book USING GIN ({field} gin_trgm_ops)"
+        )
+
+
+def remove_trigram_indexes(schema_editor):
+    """Drop the ``pg_trgm`` indexes (used by migrations)."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in TRIGRAM_INDEXES.values():
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
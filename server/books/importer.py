@@ -0,0 +1,194 @@
+"""
+Bulk catalog import from CSV or JSON Lines.
+
+Rows are parsed one at a time from the stream, validated with the ``Book``
+model field rules and upserted by ``isbn`` in batches with
+``bulk_create(update_conflicts=True)``: one ``INSERT ... ON CONFLICT DO
+UPDATE`` per batch on PostgreSQL and SQLite, ``ON DUPLICATE KEY UPDATE`` on
+MySQL. Memory use is bounded by the batch size and ``MAX_REPORTED_ERRORS``,
+whatever the size of the file.
+
+Only the columns present in a row are written when it updates an existing
+book. New books missing ``available_copies`` get ``total_copies``.
+"""
+import codecs
+import csv
+import io
+import json
+import re
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import F
+
+from .facets import apply_facet_deltas, facet_counts, subtract_counts
+from .models import Book
+
+IMPORT_FIELDS = (
+    'isbn', 'title', 'author', 'publisher', 'publication_date', 'page_count',
+    'language', 'description', 'category', 'total_copies', 'available_copies',
+    'cover_image',
+)
+FORMATS = ('csv', 'jsonl')
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportReport:
+    """Counts of imported rows plus the first ``MAX_REPORTED_ERRORS`` row errors."""
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line, isbn, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'isbn': isbn, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+
+def detect_format(name):
+    """Guess the format from a file name: ``.jsonl``/``.ndjson`` or CSV."""
+    name = (name or '').lower()
+    return 'jsonl' if name.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def text_stream(stream):
+    """Wrap a binary stream for incremental UTF-8 decoding (BOM tolerated)."""
+    if isinstance(stream, io.TextIOBase):
+        return stream
+    return codecs.getreader('utf-8-sig')(stream)
+
+
+def read_rows(stream, format):
+    """Yield ``(line, row)`` pairs; ``row`` is a dict, or an error string."""
+    if format == 'csv':
+        reader = csv.DictReader(text_stream(stream))
+        for row in reader:
+            row.pop(None, None)  # Values past the header
+            yield reader.line_num, row
+    elif format == 'jsonl':
+        for line, text in enumerate(text_stream(stream), 1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError as exc:
+                yield line, f'Invalid JSON: {exc}'
+                continue
+            yield line, row if isinstance(row, dict) else 'Expected a JSON object.'
+    else:
+        raise ValueError(f'Unknown format {format!r}; expected one of {", ".join(FORMATS)}.')
+
+
+def clean_row(row):
+    """
+    Validate ``row`` with the ``Book`` field rules.
+
+    Returns ``(values, errors)``: the cleaned values of the import fields
+    present in the row, and a dict of field -> messages.
+    """
+    row = {str(key).strip().lower(): value for key, value in row.items()}
+    values, errors = {}, {}
+    for name in IMPORT_FIELDS:
+        if name not in row:
+            continue
+        field = Book._meta.get_field(name)
+        raw = row[name]
+        if isinstance(raw, str):
+            raw = raw.strip()
+            if name == 'isbn':
+                raw = re.sub(r'[\s-]', '', raw)
+        if raw in ('', None) and field.null:
+            values[name] = None
+            continue
+        if raw in ('', None) and field.has_default():
+            continue
+        try:
+            values[name] = field.clean(raw, None)
+        except ValidationError as exc:
+            errors[name] = exc.messages
+    for name in ('isbn', 'title', 'author', 'page_count', 'category'):
+        if name not in values and name not in errors:
+            errors[name] = ['This field is required.']
+    if not errors:
+        total = values.get('total_copies')
+        available = values.get('available_copies')
+        if total is not None and available is not None and available > total:
+            errors['available_copies'] = ['Available copies cannot exceed total copies.']
+    return values, errors
+
+
+def _upsert(batch, report):
+    """Write one batch of ``{isbn: values}`` and update the facet counts."""
+    isbns = list(batch)
+    existing = Book.objects.filter(isbn__in=isbns)
+    with transaction.atomic():
+        before = facet_counts(existing)
+        found = set(existing.values_list('isbn', flat=True))
+        groups = defaultdict(list)
+        for isbn, values in batch.items():
+            groups[frozenset(values)].append(values)
+        for fields, rows in groups.items():
+            books = []
+            for values in rows:
+                book = Book(**values)
+                if 'available_copies' not in values:
+                    book.available_copies = book.total_copies
+                books.append(book)
+            # MySQL upserts on any unique key and rejects an explicit target
+            target = ['isbn'] if connection.features.supports_update_conflicts_with_target else None
+            Book.objects.bulk_create(
+                books, update_conflicts=True, unique_fields=target,
+                update_fields=sorted(fields - {'isbn'}) + ['updated_at'],
+            )
+        apply_facet_deltas(subtract_counts(facet_counts(existing), before))
+        # An update may lower total_copies below the copies on the shelf
+        existing.filter(available_copies__gt=F('total_copies')).update(available_copies=F('total_copies'))
+    report.created += len(isbns) - len(found)
+    report.updated += len(found)
+
+
+def import_books(stream, format='csv', batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """
+    Import books from ``stream`` (binary or text) and return an ``ImportReport``.
+
+    Each batch is written in its own transaction, so valid rows are kept
+    when later rows fail. With ``dry_run`` rows are only validated.
+    """
+    report = ImportReport()
+    batch = {}
+    for line, row in read_rows(stream, format):
+        report.rows += 1
+        if isinstance(row, str):
+            report.add_error(line, None, {'row': [row]})
+            continue
+        values, errors = clean_row(row)
+        if errors:
+            report.add_error(line, values.get('isbn') or row.get('isbn'), errors)
+            continue
+        if dry_run:
+            continue
+        # A repeated ISBN replaces the earlier row of the batch
+        batch.pop(values['isbn'], None)
+        batch[values['isbn']] = values
+        if len(batch) >= batch_size:
+            _upsert(batch, report)
+            batch = {}
+    if batch:
+        _upsert(batch, report)
+    return report
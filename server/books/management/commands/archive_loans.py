@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from books.archive import archive_loans
+
+
+class Command(BaseCommand):
+    help = 'Move loans returned long ago from the loan table to the archive table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Archive loans returned more than this many days ago (default LOAN_ARCHIVE_AFTER_DAYS).')
+        parser.add_argument('--chunk-size', type=int, help='Loans per transaction (default LOAN_ARCHIVE_CHUNK_SIZE).')
+
+    def handle(self, *args, **options):
+        moved = 0
+        for count in archive_loans(days=options['days'], chunk_size=options['chunk_size']):
+            moved += count
+            self.stdout.write(f'{moved} loans archived...')
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} loans.'))
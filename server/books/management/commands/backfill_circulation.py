@@ -0,0 +1,23 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from books.rollups import BACKFILL_WINDOW_DAYS, backfill_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily circulation rollups from the loan history, a window of days at a time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=datetime.date.fromisoformat,
+                            help='First day (YYYY-MM-DD; default: the first loan).')
+        parser.add_argument('--end', type=datetime.date.fromisoformat,
+                            help='Day after the last one (YYYY-MM-DD; default: tomorrow).')
+        parser.add_argument('--window-days', type=int, default=BACKFILL_WINDOW_DAYS)
+
+    def handle(self, *args, **options):
+        total = 0
+        for start, end, rows in backfill_rollups(options['start'], options['end'], options['window_days']):
+            total += rows
+            self.stdout.write(f'{start} to {end}: {rows} rows')
+        self.stdout.write(self.style.SUCCESS(f'Wrote {total} rollup rows.'))
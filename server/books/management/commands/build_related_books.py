@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from books.related import update_related_books
+
+
+class Command(BaseCommand):
+    help = 'Update the related books ("also borrowed") from the loans since the last run.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild every book from the whole history.')
+
+    def handle(self, *args, **options):
+        run = update_related_books(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated related books of {run.books_updated} books (loans up to {run.last_loan_id}).'
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from books.similar import build_similar_books
+
+
+class Command(BaseCommand):
+    help = 'Update the similar books index from the books changed since the last build.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild the index, vocabulary included.')
+        parser.add_argument('--threads', type=int, help='Threads for the similarity products.')
+
+    def handle(self, *args, **options):
+        result = build_similar_books(full=options['full'], threads=options['threads'])
+        kind = 'Rebuilt' if result['full'] else 'Updated'
+        self.stdout.write(self.style.SUCCESS(
+            f"{kind} similar books of {result['books_updated']} books ({result['books']} indexed)."
+        ))
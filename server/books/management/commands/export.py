@@ -0,0 +1,46 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from books.exporter import CHUNK_SIZE, EXPORTS, FORMATS, export_queryset, export_stream
+
+
+class Command(BaseCommand):
+    help = 'Stream the books or loans table to a CSV or NDJSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output.')
+        parser.add_argument('-o', '--output', default='-', help="Output file, or '-' for standard output.")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument(
+            '--filter', action='append', default=[], metavar='NAME=VALUE',
+            help='A list filter, e.g. --filter status=returned. May be repeated.',
+        )
+
+    def handle(self, *args, **options):
+        params = {}
+        for item in options['filter']:
+            key, sep, value = item.partition('=')
+            if not sep:
+                raise CommandError(f'Invalid filter {item!r}; expected NAME=VALUE.')
+            params[key] = value
+        try:
+            queryset = export_queryset(options['name'], params)
+        except ValueError as exc:
+            raise CommandError(f'Invalid filters: {exc.args[0].as_text()}')
+
+        path = options['output']
+        stream = sys.stdout.buffer if path == '-' else open(path, 'wb')
+        try:
+            for block in export_stream(
+                options['name'], queryset, options['format'],
+                compress=options['gzip'], chunk_size=options['chunk_size'],
+            ):
+                stream.write(block)
+        finally:
+            if stream is not sys.stdout.buffer:
+                stream.close()
+        if path != '-':
+            self.stderr.write(self.style.SUCCESS(f"Exported {options['name']} to {path}."))
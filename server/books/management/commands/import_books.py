@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from books.importer import DEFAULT_BATCH_SIZE, FORMATS, detect_format, import_books
+
+
+class Command(BaseCommand):
+    help = 'Import books from a CSV or JSON Lines file, upserting by ISBN.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for standard input.")
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Validate rows without writing.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or detect_format(path)
+        try:
+            stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        except OSError as exc:
+            raise CommandError(exc)
+        with stream:
+            report = import_books(
+                stream, format, batch_size=options['batch_size'], dry_run=options['dry_run']
+            )
+
+        for error in report.errors:
+            messages = '; '.join(
+                f'{field}: {" ".join(messages)}' for field, messages in error['errors'].items()
+            )
+            self.stderr.write(f"line {error['line']} ({error['isbn'] or 'no isbn'}): {messages}")
+        if report.failed > len(report.errors):
+            self.stderr.write(f'... {report.failed - len(report.errors)} more errors not shown.')
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {report.rows} rows: {report.created} created, '
+            f'{report.updated} updated, {report.failed} failed.'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from books.circulation import OVERDUE_CHUNK_SIZE, mark_overdue
+
+
+class Command(BaseCommand):
+    help = 'Mark active loans past their due date as overdue (run it periodically, e.g. from cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=OVERDUE_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        marked = mark_overdue(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Marked {marked} loans overdue.'))
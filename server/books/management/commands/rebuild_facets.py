@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from books.facets import rebuild_facets
+
+
+class Command(BaseCommand):
+    help = 'Recompute the catalog facet counts from the Book table.'
+
+    def handle(self, *args, **options):
+        counts = rebuild_facets()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {len(counts)} facet buckets covering {sum(counts.values())} books.'
+        ))
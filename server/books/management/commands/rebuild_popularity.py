@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from books.popularity import rebuild_popularity
+
+
+class Command(BaseCommand):
+    help = 'Recompute the time-decayed popularity of every book from the loan history.'
+
+    def handle(self, *args, **options):
+        books = rebuild_popularity()
+        self.stdout.write(self.style.SUCCESS(f'Recomputed the popularity of {books} borrowed books.'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from books.notices import KINDS, send_notices
+
+
+class Command(BaseCommand):
+    help = 'Email due-soon and overdue notices, one digest per patron. Loans already notified are skipped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=KINDS + ('all',), default='all')
+        parser.add_argument('--chunk-size', type=int, help='Loans per chunk (default NOTICE_CHUNK_SIZE).')
+        parser.add_argument('--dry-run', action='store_true', help='Count the notices without sending.')
+
+    def handle(self, *args, **options):
+        kinds = KINDS if options['kind'] == 'all' else (options['kind'],)
+        verb = 'Would send' if options['dry_run'] else 'Sent'
+        for kind in kinds:
+            report = send_notices(kind, chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{verb} {report['emails']} {kind} emails covering {report['loans']} loans."
+            ))
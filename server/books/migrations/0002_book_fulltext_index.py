@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def create_fulltext_index(apps, schema_editor):
+    from books.search import install_fulltext_index
+    install_fulltext_index(schema_editor)
+
+
+def drop_fulltext_index(apps, schema_editor):
+    from books.search import remove_fulltext_index
+    remove_fulltext_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
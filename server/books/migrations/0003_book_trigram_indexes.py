@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def create_trigram_indexes(apps, schema_editor):
+    from books.fuzzy import install_trigram_indexes
+    install_trigram_indexes(schema_editor)
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    from books.fuzzy import remove_trigram_indexes
+    remove_trigram_indexes(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0002_book_fulltext_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:38
+
+from django.db import migrations, models
+
+
+def populate_facet_counts(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    BookFacetCount = apps.get_model('books', 'BookFacetCount')
+    rows = (
+        Book.objects.order_by()
+        .annotate(available=models.ExpressionWrapper(
+            models.Q(available_copies__gt=0), output_field=models.BooleanField()
+        ))
+        .values_list('category', 'language', 'available')
+        .annotate(count=models.Count('id'))
+    )
+    BookFacetCount.objects.bulk_create([
+        BookFacetCount(category=category, language=language, available=bool(available), count=count)
+        for category, language, available, count in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0003_book_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookFacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=100)),
+                ('language', models.CharField(max_length=50)),
+                ('available', models.BooleanField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Book facet count',
+                'verbose_name_plural': 'Book facet counts',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='bookfacetcount',
+            constraint=models.UniqueConstraint(fields=('category', 'language', 'available'), name='unique_book_facet_bucket'),
+        ),
+        migrations.RunPython(populate_facet_counts, migrations.RunPython.noop),
+    ]
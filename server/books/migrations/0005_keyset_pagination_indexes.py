@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_bookfacetcount'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['created_at', 'id'], name='books_book_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['borrowed_date', 'id'], name='books_loan_borrowed_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['user', 'borrowed_date', 'id'], name='books_loan_user_borrowed_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:42
+
+from django.db import migrations, models
+
+
+def create_generation_row(apps, schema_editor):
+    CatalogGeneration = apps.get_model('books', 'CatalogGeneration')
+    CatalogGeneration.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Catalog generation',
+                'verbose_name_plural': 'Catalog generation',
+            },
+        ),
+        migrations.RunPython(create_generation_row, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:13
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_active_loans(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    Loan = apps.get_model('books', 'Loan')
+    open_loans = (
+        Loan.objects.filter(user=OuterRef('pk')).exclude(status='returned')
+        .order_by().values('user').annotate(count=Count('pk')).values('count')
+    )
+    User.objects.update(active_loans=Coalesce(Subquery(open_loans), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_user_active_loans'),
+        ('books', '0006_cataloggeneration'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='loan',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'returned'), _negated=True), fields=('user', 'book'), name='books_loan_one_open_per_user_book'),
+        ),
+        migrations.RunPython(count_active_loans, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_loan_open_loan_constraint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['status', 'due_date'], name='books_loan_status_due_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0008_loan_status_due_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('due_soon', 'Due soon'), ('overdue', 'Overdue')], max_length=10)),
+                ('sent_at', models.DateTimeField(auto_now_add=True)),
+                ('loan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notices', to='books.loan')),
+            ],
+            options={
+                'verbose_name': 'Notice',
+                'verbose_name_plural': 'Notices',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='notice',
+            constraint=models.UniqueConstraint(fields=('loan', 'kind'), name='books_notice_once_per_loan_kind'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0009_notice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LibraryStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_books', models.PositiveIntegerField(default=0)),
+                ('available_books', models.PositiveIntegerField(default=0)),
+                ('total_copies', models.PositiveIntegerField(default=0)),
+                ('available_copies', models.PositiveIntegerField(default=0)),
+                ('active_loans', models.PositiveIntegerField(default=0)),
+                ('overdue_loans', models.PositiveIntegerField(default=0)),
+                ('returned_loans', models.PositiveIntegerField(default=0)),
+                ('total_users', models.PositiveIntegerField(default=0)),
+                ('borrowing_users', models.PositiveIntegerField(default=0)),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Library stats',
+                'verbose_name_plural': 'Library stats',
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0010_library_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CirculationDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('dimension', models.CharField(choices=[('all', 'All'), ('book', 'Book'), ('category', 'Category'), ('cohort', 'Cohort')], max_length=10)),
+                ('key', models.CharField(blank=True, default='', max_length=100)),
+                ('borrows', models.PositiveIntegerField(default=0)),
+                ('returns', models.PositiveIntegerField(default=0)),
+                ('overdues', models.PositiveIntegerField(default=0)),
+                ('unique_borrowers', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Circulation day',
+                'verbose_name_plural': 'Circulation days',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='circulationday',
+            constraint=models.UniqueConstraint(fields=('dimension', 'key', 'day'), name='unique_circulation_day'),
+        ),
+    ]
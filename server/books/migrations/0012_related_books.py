@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0011_circulation_day'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedBooksRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_loan_id', models.BigIntegerField()),
+                ('books_updated', models.PositiveIntegerField(default=0)),
+                ('full', models.BooleanField(default=False)),
+                ('finished_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Related books run',
+                'verbose_name_plural': 'Related books runs',
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RelatedBook',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_books', to='books.book')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_to', to='books.book')),
+            ],
+            options={
+                'verbose_name': 'Related book',
+                'verbose_name_plural': 'Related books',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='relatedbook',
+            constraint=models.UniqueConstraint(fields=('book', 'rank'), name='unique_related_book_rank'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-17 06:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0012_related_books'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='popularity',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['popularity', 'id'], name='books_book_popularity_id_idx'),
+        ),
+    ]
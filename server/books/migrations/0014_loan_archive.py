@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-17 06:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+COLUMNS = 'id, user_id, book_id, borrowed_date, due_date, return_date, status, notes'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('books', '0013_book_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanHistory',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('borrowed_date', models.DateTimeField()),
+                ('due_date', models.DateTimeField()),
+                ('return_date', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('returned', 'Returned'), ('overdue', 'Overdue')], max_length=10)),
+                ('notes', models.TextField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Loan history',
+                'verbose_name_plural': 'Loan history',
+                'db_table': 'books_loanhistory',
+                'ordering': ['-borrowed_date'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedLoan',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('borrowed_date', models.DateTimeField()),
+                ('due_date', models.DateTimeField()),
+                ('return_date', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('returned', 'Returned'), ('overdue', 'Overdue')], default='returned', max_length=10)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_loans', to='books.book')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_loans', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Archived loan',
+                'verbose_name_plural': 'Archived loans',
+                'indexes': [models.Index(fields=['user', 'borrowed_date', 'id'], name='books_archive_user_borr_idx'), models.Index(fields=['borrowed_date', 'id'], name='books_archive_borrowed_idx')],
+            },
+        ),
+        migrations.RunSQL(
+            f'CREATE VIEW books_loanhistory AS SELECT {COLUMNS} FROM books_loan '
+            f'UNION ALL SELECT {COLUMNS} FROM books_archivedloan',
+            'DROP VIEW books_loanhistory',
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-17 06:41
+
+from django.db import migrations, models
+
+# books.popularity.EPOCH (2024-01-01 UTC), the epoch scores were stored against so far
+EPOCH = 1704067200.0
+
+
+def create_epoch_row(apps, schema_editor):
+    PopularityEpoch = apps.get_model('books', 'PopularityEpoch')
+    PopularityEpoch.objects.get_or_create(pk=1, defaults={'value': EPOCH})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0014_loan_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularityEpoch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.FloatField()),
+            ],
+            options={
+                'verbose_name': 'Popularity epoch',
+                'verbose_name_plural': 'Popularity epoch',
+            },
+        ),
+        migrations.RunPython(create_epoch_row, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def create_prefix_indexes(apps, schema_editor):
+    from books.query import install_prefix_indexes
+    install_prefix_indexes(schema_editor.connection)
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    from books.query import remove_prefix_indexes
+    remove_prefix_indexes(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0015_popularity_epoch'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
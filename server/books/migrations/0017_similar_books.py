@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-17 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0016_book_prefix_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarBooksIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('k', models.PositiveSmallIntegerField()),
+                ('data', models.BinaryField()),
+                ('built_at', models.DateTimeField()),
+                ('full_built_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Similar books index',
+                'verbose_name_plural': 'Similar books index',
+            },
+        ),
+        migrations.CreateModel(
+            name='SimilarBook',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_books', to='books.book')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_to', to='books.book')),
+            ],
+            options={
+                'verbose_name': 'Similar book',
+                'verbose_name_plural': 'Similar books',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='similarbook',
+            constraint=models.UniqueConstraint(fields=('book', 'rank'), name='unique_similar_book_rank'),
+        ),
+    ]
@@ -1,10 +1,125 @@
 from django.db import models
+from django.db.models import F, Q
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from datetime import datetime, timedelta
 
 User = get_user_model()
 
+# Book fields that determine its facet bucket (see books/facets.py)
+FACET_FIELDS = ('category', 'language', 'available_copies')
+
+
+class BookQuerySet(models.QuerySet):
+    """
+    QuerySet keeping the facet aggregates, cached list counts and catalog
+    response cache in sync on bulk writes, which bypass the model signals.
+    """
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        from .facets import facet_delta, apply_facet_deltas
+        objs = super().bulk_create(objs, *args, **kwargs)
+        if not kwargs.get('update_conflicts') and not kwargs.get('ignore_conflicts'):
+            apply_facet_deltas(facet_delta(objs))
+        self._invalidate_caches()
+        return objs
+    
+    def update(self, **kwargs):
+        if set(FACET_FIELDS).intersection(kwargs):
+            rows = self._update_facets(**kwargs)
+        else:
+            rows = super().update(**kwargs)
+        self._invalidate_caches()
+        return rows
+    
+    def take_copy(self, pk, **changes):
+        """
+        Take one copy of book ``pk`` with a single conditional UPDATE
+        (``... WHERE id = pk AND available_copies > 0``) and return the
+        updated book, or ``None`` if no copy was left or there is no such book.
+        ``changes`` are further columns set by the same UPDATE.
+        """
+        return self._move_copy(pk, -1, Q(available_copies__gt=0), **changes)
+    
+    def return_copy(self, pk):
+        """Put one copy of book ``pk`` back, never above ``total_copies``."""
+        return self._move_copy(pk, 1, Q(available_copies__lt=F('total_copies')))
+    
+    def _move_copy(self, pk, delta, condition, **changes):
+        """
+        Caches are only invalidated when the book moves between available and
+        unavailable: cached catalog responses may show a copy count or
+        popularity order up to ``CATALOG_CACHE_TIMEOUT`` old, but never a
+        wrong availability, and borrows do not all contend on the catalog
+        generation row.
+        """
+        from .facets import adjust_facet
+        book = self._update_returning(pk, condition, available_copies=F('available_copies') + delta, **changes)
+        if book is None:
+            return None
+        if book.available_copies == (0 if delta < 0 else 1):
+            # The book moved between the available and unavailable buckets
+            adjust_facet((book.category, book.language, delta > 0), 1)
+            adjust_facet((book.category, book.language, delta < 0), -1)
+            self._invalidate_caches()
+        return book
+    
+    def _update_returning(self, pk, condition, **values):
+        """
+        Update row ``pk`` if it matches ``condition`` and return it as
+        updated, or ``None``: one ``UPDATE ... RETURNING`` on PostgreSQL and
+        SQLite, an UPDATE and a SELECT elsewhere.
+        """
+        from django.db import connections
+        from django.db.models.sql import UpdateQuery
+        queryset = self.filter(condition, pk=pk)
+        connection = connections[self.db]
+        if connection.vendor not in ('postgresql', 'sqlite') or not connection.features.can_return_columns_from_insert:
+            if not models.QuerySet.update(queryset, **values):
+                return None
+            # The row stays locked by the UPDATE until commit, so this reads our own write
+            return self.get(pk=pk)
+        query = queryset.query.chain(UpdateQuery)
+        query.add_update_values(values)
+        sql, params = query.get_compiler(self.db).as_sql()
+        fields = self.model._meta.concrete_fields
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        with connection.cursor() as cursor:
+            cursor.execute(f'{sql} RETURNING {columns}', params)
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        converted = []
+        for field, value in zip(fields, row):
+            column = field.get_col(self.model._meta.db_table)
+            for converter in connection.ops.get_db_converters(column) + column.get_db_converters(connection):
+                value = converter(value, column, connection)
+            converted.append(value)
+        return self.model.from_db(self.db, [field.attname for field in fields], converted)
+    
+    def _invalidate_caches(self):
+        from library_project.counts import invalidate_counts
+        from .cache import bump_catalog_generation
+        invalidate_counts(self.model)
+        bump_catalog_generation()
+    
+    def _update_facets(self, **kwargs):
+        from django.db import transaction
+        from .facets import MAX_DELTA_ROWS, facet_counts, apply_facet_deltas, subtract_counts
+        from .tasks import rebuild_facets
+        with transaction.atomic(using=self.db):
+            ids = list(self.select_for_update().values_list('pk', flat=True)[:MAX_DELTA_ROWS + 1])
+            if len(ids) > MAX_DELTA_ROWS:
+                rows = super().update(**kwargs)
+                # Too many rows to diff: a worker recounts every bucket once this commits
+                rebuild_facets.enqueue()
+                return rows
+            affected = Book.objects.filter(pk__in=ids)
+            before = facet_counts(affected)
+            rows = super().update(**kwargs)
+            apply_facet_deltas(subtract_counts(facet_counts(affected), before))
+        return rows
+
 
 class Book(models.Model):
     """
@@ -22,9 +137,13 @@ class Book(models.Model):
     total_copies = models.IntegerField(default=1, validators=[MinValueValidator(1)])
     available_copies = models.IntegerField(default=1, validators=[MinValueValidator(0)])
     cover_image = models.URLField(blank=True, null=True)
+    # Time-decayed borrow count, stored scaled to an epoch (see books/popularity.py)
+    popularity = models.FloatField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = BookQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Book'
@@ -32,6 +151,9 @@ class Book(models.Model):
         indexes = [
             models.Index(fields=['title', 'author']),
             models.Index(fields=['isbn']),
+            # Keyset pagination key
+            models.Index(fields=['created_at', 'id'], name='books_book_created_id_idx'),
+            models.Index(fields=['popularity', 'id'], name='books_book_popularity_id_idx'),
         ]
     
     def __str__(self):
@@ -49,6 +171,63 @@ class Book(models.Model):
         super().save(*args, **kwargs)
 
 
+class BookFacetCount(models.Model):
+    """
+    Maintained count of books per (category, language, availability) bucket.
+    Facet counts for the catalog sidebar are summed from these rows
+    instead of grouping the whole Book table on every request.
+    """
+    category = models.CharField(max_length=100)
+    language = models.CharField(max_length=50)
+    available = models.BooleanField()
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Book facet count'
+        verbose_name_plural = 'Book facet counts'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['category', 'language', 'available'],
+                name='unique_book_facet_bucket',
+            ),
+        ]
+    
+    def __str__(self):
+        availability = 'available' if self.available else 'unavailable'
+        return f"{self.category} / {self.language} / {availability}: {self.count}"
+
+
+class CatalogGeneration(models.Model):
+    """
+    Single-row counter bumped whenever the catalog changes.
+    Cached catalog responses are keyed by its value, so bumping it
+    invalidates them for every worker and node sharing the database.
+    """
+    value = models.BigIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Catalog generation'
+        verbose_name_plural = 'Catalog generation'
+    
+    def __str__(self):
+        return f"Catalog generation {self.value}"
+
+
+class PopularityEpoch(models.Model):
+    """
+    Single-row Unix time that stored book popularities are scaled to
+    (see books/popularity.py); moved forward by rebasing the scores.
+    """
+    value = models.FloatField()
+    
+    class Meta:
+        verbose_name = 'Popularity epoch'
+        verbose_name_plural = 'Popularity epoch'
+    
+    def __str__(self):
+        return f"Popularity epoch {self.value}"
+
+
 class Loan(models.Model):
     """
     Model representing a book loan transaction.
@@ -74,6 +253,18 @@ class Loan(models.Model):
         indexes = [
             models.Index(fields=['user', 'status']),
             models.Index(fields=['book', 'status']),
+            # Keyset pagination keys (all loans, and one user's loans)
+            models.Index(fields=['borrowed_date', 'id'], name='books_loan_borrowed_id_idx'),
+            models.Index(fields=['user', 'borrowed_date', 'id'], name='books_loan_user_borrowed_idx'),
+            # Overdue sweep and report: open loans by due date
+            models.Index(fields=['status', 'due_date'], name='books_loan_status_due_idx'),
+        ]
+        constraints = [
+            # At most one open loan of a book per user
+            models.UniqueConstraint(
+                fields=['user', 'book'], condition=~Q(status='returned'),
+                name='books_loan_one_open_per_user_book',
+            ),
         ]
     
     def __str__(self):
@@ -100,3 +291,222 @@ class Loan(models.Model):
             return 0
         from django.utils import timezone
         return (timezone.now() - self.due_date).days
+
+
+class ArchivedLoan(models.Model):
+    """
+    A returned loan moved out of ``Loan`` by ``books.archive``, keeping its
+    id, so the hot table and its indexes hold open and recent loans only.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_loans')
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='archived_loans')
+    borrowed_date = models.DateTimeField()
+    due_date = models.DateTimeField()
+    return_date = models.DateTimeField(blank=True, null=True)
+    status = models.CharField(max_length=10, choices=Loan.STATUS_CHOICES, default='returned')
+    notes = models.TextField(blank=True, null=True)
+    
+    class Meta:
+        verbose_name = 'Archived loan'
+        verbose_name_plural = 'Archived loans'
+        indexes = [
+            models.Index(fields=['user', 'borrowed_date', 'id'], name='books_archive_user_borr_idx'),
+            models.Index(fields=['borrowed_date', 'id'], name='books_archive_borrowed_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.book.title} ({self.status})"
+
+
+class LoanHistory(models.Model):
+    """
+    Read-only view over ``Loan`` and ``ArchivedLoan`` (``UNION ALL``), for
+    reads of the whole loan history: a user's past loans, exports, stats.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, related_name='+', db_constraint=False)
+    book = models.ForeignKey(Book, on_delete=models.DO_NOTHING, related_name='+', db_constraint=False)
+    borrowed_date = models.DateTimeField()
+    due_date = models.DateTimeField()
+    return_date = models.DateTimeField(blank=True, null=True)
+    status = models.CharField(max_length=10, choices=Loan.STATUS_CHOICES)
+    notes = models.TextField(blank=True, null=True)
+    
+    is_overdue = Loan.is_overdue
+    days_overdue = Loan.days_overdue
+    
+    class Meta:
+        managed = False
+        db_table = 'books_loanhistory'
+        ordering = ['-borrowed_date']
+        verbose_name = 'Loan history'
+        verbose_name_plural = 'Loan history'
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.book.title} ({self.status})"
+
+
+class Notice(models.Model):
+    """
+    Sent-log of loan notices: one row per loan and kind of notice, written
+    once the digest containing it was sent, so reruns skip it.
+    """
+    KIND_CHOICES = (
+        ('due_soon', 'Due soon'),
+        ('overdue', 'Overdue'),
+    )
+    
+    loan = models.ForeignKey(Loan, on_delete=models.CASCADE, related_name='notices')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    sent_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Notice'
+        verbose_name_plural = 'Notices'
+        constraints = [
+            models.UniqueConstraint(fields=['loan', 'kind'], name='books_notice_once_per_loan_kind'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} notice for loan {self.loan_id}"
+
+
+class CirculationDay(models.Model):
+    """
+    Daily circulation counts for one slice of the collection: everything
+    (``dimension='all'``), one book, one category or one user cohort (the
+    month users joined). Kept up to date by borrows, returns and the
+    overdue sweep (``books.rollups``); trend charts read these rows instead
+    of grouping the Loan table.
+    """
+    DIMENSION_CHOICES = (
+        ('all', 'All'),
+        ('book', 'Book'),
+        ('category', 'Category'),
+        ('cohort', 'Cohort'),
+    )
+    
+    day = models.DateField()
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES)
+    key = models.CharField(max_length=100, blank=True, default='')
+    borrows = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+    overdues = models.PositiveIntegerField(default=0)
+    unique_borrowers = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Circulation day'
+        verbose_name_plural = 'Circulation days'
+        constraints = [
+            # Also the index time series are read from: one slice, by day
+            models.UniqueConstraint(fields=['dimension', 'key', 'day'], name='unique_circulation_day'),
+        ]
+    
+    def __str__(self):
+        return f"{self.dimension} {self.key} {self.day}: {self.borrows} borrows"
+
+
+class RelatedBook(models.Model):
+    """
+    One of the top ``RELATED_BOOKS_K`` co-borrowed books of a book ("patrons
+    who borrowed this also borrowed"), by cosine similarity of their
+    borrower sets. Built from the loan history by ``books.related``.
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='related_books')
+    related = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='related_to')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    
+    class Meta:
+        verbose_name = 'Related book'
+        verbose_name_plural = 'Related books'
+        constraints = [
+            # Also the index the related books are served from, in rank order
+            models.UniqueConstraint(fields=['book', 'rank'], name='unique_related_book_rank'),
+        ]
+    
+    def __str__(self):
+        return f"{self.book_id} -> {self.related_id} ({self.score:.3f})"
+
+
+class RelatedBooksRun(models.Model):
+    """A run of the related books job: loans up to ``last_loan_id`` are counted."""
+    last_loan_id = models.BigIntegerField()
+    books_updated = models.PositiveIntegerField(default=0)
+    full = models.BooleanField(default=False)
+    finished_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-id']
+        verbose_name = 'Related books run'
+        verbose_name_plural = 'Related books runs'
+    
+    def __str__(self):
+        return f"Related books up to loan {self.last_loan_id} ({self.books_updated} books)"
+
+
+class SimilarBook(models.Model):
+    """
+    One of the top ``SIMILAR_BOOKS_K`` books closest to a book in title,
+    author, category and description. Built by ``books.similar``.
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='similar_books')
+    similar = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='similar_to')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    
+    class Meta:
+        verbose_name = 'Similar book'
+        verbose_name_plural = 'Similar books'
+        constraints = [
+            # Also the index the similar books are served from, in rank order
+            models.UniqueConstraint(fields=['book', 'rank'], name='unique_similar_book_rank'),
+        ]
+    
+    def __str__(self):
+        return f"{self.book_id} -> {self.similar_id} ({self.score:.3f})"
+
+
+class SimilarBooksIndex(models.Model):
+    """
+    The state of the last similar books build (the vocabulary and IDF of
+    the last full build as one ``.npz`` archive), one row that incremental
+    builds start from.
+    """
+    k = models.PositiveSmallIntegerField()
+    data = models.BinaryField()
+    built_at = models.DateTimeField()
+    full_built_at = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = 'Similar books index'
+        verbose_name_plural = 'Similar books index'
+    
+    def __str__(self):
+        return f"Similar books index built {self.built_at:%Y-%m-%d %H:%M}"
+
+
+class LibraryStats(models.Model):
+    """
+    Summary counts for the admin dashboard, one row refreshed periodically
+    by ``books.stats.refresh_stats`` so reading them costs one primary key
+    lookup whatever the table sizes.
+    """
+    total_books = models.PositiveIntegerField(default=0)
+    available_books = models.PositiveIntegerField(default=0)
+    total_copies = models.PositiveIntegerField(default=0)
+    available_copies = models.PositiveIntegerField(default=0)
+    active_loans = models.PositiveIntegerField(default=0)
+    overdue_loans = models.PositiveIntegerField(default=0)
+    returned_loans = models.PositiveIntegerField(default=0)
+    total_users = models.PositiveIntegerField(default=0)
+    borrowing_users = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = 'Library stats'
+        verbose_name_plural = 'Library stats'
+    
+    def __str__(self):
+        return f"Library stats as of {self.computed_at}"
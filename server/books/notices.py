@@ -0,0 +1,105 @@
+"""
+Due-soon and overdue notices, sent as one digest email per patron.
+
+``send_notices(kind)`` walks the loans still needing a notice in keyset
+chunks ordered by ``(user_id, id)``, with the user and book joined in. The
+loans of a chunk are grouped per user (the last user's loans are held back
+to the next chunk, where more of them may follow), the digests rendered in
+a thread pool, and sent over one email backend connection kept open for the
+whole run. A ``Notice`` row per loan is written once its digest was sent,
+so a rerun sends only what is missing. Should sending fail midway, the
+chunk being sent is sent again on the next run.
+"""
+import contextlib
+import datetime
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Exists, OuterRef, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Loan, Notice
+
+KINDS = ('due_soon', 'overdue')
+SUBJECTS = {
+    'due_soon': 'Library books due soon',
+    'overdue': 'Overdue library books',
+}
+# Columns the digests need
+LOAN_FIELDS = (
+    'id', 'user_id', 'due_date',
+    'user__username', 'user__first_name', 'user__email',
+    'book__title', 'book__author',
+)
+
+
+def pending_loans(kind, now=None):
+    """Open loans that need a ``kind`` notice and have not had one."""
+    now = now or timezone.now()
+    if kind == 'due_soon':
+        loans = Loan.objects.filter(
+            status='active', due_date__gte=now,
+            due_date__lt=now + datetime.timedelta(days=settings.NOTICE_DUE_SOON_DAYS),
+        )
+    elif kind == 'overdue':
+        loans = Loan.objects.filter(status__in=('active', 'overdue'), due_date__lt=now)
+    else:
+        raise ValueError(f'Unknown notice kind {kind!r}; expected one of {", ".join(KINDS)}.')
+    return loans.exclude(Exists(Notice.objects.filter(loan=OuterRef('pk'), kind=kind)))
+
+
+def loan_chunks(queryset, size):
+    """Yield lists of loans (user and book joined) in ``(user_id, id)`` keyset order."""
+    queryset = queryset.select_related('user', 'book').only(*LOAN_FIELDS).order_by('user_id', 'id')
+    page = queryset
+    while True:
+        chunk = list(page[:size])
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1]
+        page = queryset.filter(Q(user_id__gt=last.user_id) | Q(user_id=last.user_id, id__gt=last.id))
+
+
+def render_digest(kind, loans):
+    """Return the digest ``EmailMessage`` for one user's ``loans``."""
+    user = loans[0].user
+    body = render_to_string(f'books/notices/{kind}.txt', {'user': user, 'loans': loans})
+    return EmailMessage(SUBJECTS[kind], body, to=[user.email])
+
+
+def send_notices(kind, now=None, chunk_size=None, dry_run=False, connection=None):
+    """
+    Send the ``kind`` notices due at ``now`` and return ``{'loans', 'emails'}``
+    counts. With ``dry_run`` the notices are only counted.
+    """
+    chunk_size = chunk_size or settings.NOTICE_CHUNK_SIZE
+    report = {'loans': 0, 'emails': 0}
+    connection = connection or get_connection()
+
+    def send(loans, pool):
+        digests = [list(group) for _, group in itertools.groupby(loans, key=lambda loan: loan.user_id)]
+        report['loans'] += len(loans)
+        report['emails'] += len(digests)
+        if dry_run or not loans:
+            return
+        messages = list(pool.map(lambda digest: render_digest(kind, digest), digests))
+        connection.send_messages(messages)
+        Notice.objects.bulk_create([Notice(loan=loan, kind=kind) for loan in loans], ignore_conflicts=True)
+
+    held = []
+    with ThreadPoolExecutor(settings.NOTICE_RENDER_THREADS) as pool, \
+            contextlib.nullcontext() if dry_run else connection:
+        for chunk in loan_chunks(pending_loans(kind, now), chunk_size):
+            loans = held + chunk
+            # The last user's loans may continue in the next chunk
+            split = len(loans)
+            while split and loans[split - 1].user_id == loans[-1].user_id:
+                split -= 1
+            held = loans[split:]
+            send(loans[:split], pool)
+        send(held, pool)
+    return report
@@ -0,0 +1,147 @@
+"""
+Time-decayed book popularity behind ``?ordering=-popularity`` and
+``/api/books/trending/``.
+
+A book's popularity at time ``t`` is the sum over its borrows of
+``2 ** -((t - borrowed) / half-life)``: a borrow counts 1 when it happens
+and half as much every ``POPULARITY_HALF_LIFE_DAYS`` after. All scores
+decay by the same factor, so ``Book.popularity`` stores them scaled to an
+epoch instead: a borrow at ``t`` adds ``2 ** ((t - epoch) / half-life)``
+with one expression in the borrow's UPDATE, nothing is rewritten as time
+passes, and the stored values sort like the decayed ones. ``decayed``
+divides by the weight of now to get the score back.
+
+The epoch is the ``PopularityEpoch`` row, read by the borrow's UPDATE
+itself, so a borrow needs no extra query. Weights double every half-life
+and overflow a float after 1,024, so ``rebase_popularity`` (a periodic
+task) moves the epoch to now once it is ``REBASE_AFTER`` half-lives old,
+dividing every score by the same factor in the same transaction. On
+PostgreSQL it first locks the epoch table, so borrows in flight finish
+before it and later ones read the new epoch; SQLite runs one write at a
+time anyway. ``check_half_life`` rejects a half-life too short for
+``POPULARITY_REBASE_INTERVAL`` at startup. ``rebuild_popularity``
+recomputes every score from the loan history, e.g. after changing the
+half-life.
+"""
+import datetime
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.db.models import Case, F, FloatField, Subquery, Value, When
+from django.db.models.functions import Coalesce, Power
+from django.utils import timezone
+
+from .models import Book, LoanHistory, PopularityEpoch
+
+# The epoch of a fresh database (the ``PopularityEpoch`` row's initial value)
+EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+# Half-lives after which the epoch is moved forward, and the most it may
+# ever lag (2.0 ** 1024 overflows)
+REBASE_AFTER = 64
+MAX_HALF_LIVES = 1000
+# Decayed score below which a book is no longer trending (a single borrow
+# some 6.6 half-lives ago)
+TRENDING_MIN_SCORE = 0.01
+# Books per UPDATE when rebuilding
+REBUILD_BATCH = 1000
+
+
+def half_life_seconds():
+    return settings.POPULARITY_HALF_LIFE_DAYS * 86400
+
+
+def check_half_life():
+    """Raise ``ImproperlyConfigured`` unless rebases keep every weight within float range."""
+    if settings.POPULARITY_HALF_LIFE_DAYS <= 0:
+        raise ImproperlyConfigured('POPULARITY_HALF_LIFE_DAYS must be positive.')
+    lag = REBASE_AFTER + settings.POPULARITY_REBASE_INTERVAL / half_life_seconds()
+    if lag > MAX_HALF_LIVES:
+        raise ImproperlyConfigured(
+            f'POPULARITY_HALF_LIFE_DAYS={settings.POPULARITY_HALF_LIFE_DAYS} is too short for '
+            f'POPULARITY_REBASE_INTERVAL={settings.POPULARITY_REBASE_INTERVAL}: the epoch could '
+            f'lag {lag:,.0f} half-lives, more than {MAX_HALF_LIVES}.'
+        )
+
+
+def current_epoch():
+    """The stored epoch, as Unix time."""
+    value = PopularityEpoch.objects.filter(pk=1).values_list('value', flat=True).first()
+    if value is None:
+        value = PopularityEpoch.objects.get_or_create(pk=1, defaults={'value': EPOCH.timestamp()})[0].value
+    return value
+
+
+def borrow_weight(when=None, epoch=None):
+    """What a borrow at ``when`` (default: now) adds to the stored popularity."""
+    when = when or timezone.now()
+    epoch = current_epoch() if epoch is None else epoch
+    return 2.0 ** ((when.timestamp() - epoch) / half_life_seconds())
+
+
+def popularity_increment(when=None):
+    """
+    Expression adding a borrow at ``when`` to ``Book.popularity``, weighted
+    against the stored epoch within the same statement.
+    """
+    when = when or timezone.now()
+    # The initial epoch if the row is gone (e.g. after a flush)
+    epoch = Coalesce(Subquery(PopularityEpoch.objects.filter(pk=1).values('value')[:1]), Value(EPOCH.timestamp()))
+    half_lives = (Value(when.timestamp()) - epoch) / Value(half_life_seconds())
+    return F('popularity') + Power(Value(2.0), half_lives, output_field=FloatField())
+
+
+def decayed(popularity, now=None, epoch=None):
+    """A stored popularity as the decayed borrow count at ``now``."""
+    return popularity / borrow_weight(now, epoch)
+
+
+def trending(limit, epoch=None):
+    """The ``limit`` most popular books whose decayed score is above ``TRENDING_MIN_SCORE``."""
+    floor = TRENDING_MIN_SCORE * borrow_weight(epoch=epoch)
+    return Book.objects.filter(popularity__gt=floor).order_by('-popularity', '-id')[:limit]
+
+
+def rebase_popularity(now=None, force=False):
+    """
+    Move the epoch to ``now`` if it is more than ``REBASE_AFTER`` half-lives
+    old (or ``force``), dividing every score to match; returns whether it moved.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'LOCK TABLE {connection.ops.quote_name(PopularityEpoch._meta.db_table)} '
+                    f'IN ACCESS EXCLUSIVE MODE'
+                )
+        epoch = current_epoch()
+        half_lives = (now.timestamp() - epoch) / half_life_seconds()
+        if half_lives <= (0 if force else REBASE_AFTER):
+            return False
+        if half_lives < MAX_HALF_LIVES:
+            Book.objects.exclude(popularity=0).update(popularity=F('popularity') / 2.0 ** half_lives)
+        else:
+            # Every score is below 2 ** -1000 of a borrow now (or the half-life changed)
+            Book.objects.exclude(popularity=0).update(popularity=0)
+        PopularityEpoch.objects.filter(pk=1).update(value=now.timestamp())
+    return True
+
+
+def rebuild_popularity():
+    """Recompute every book's popularity from the loan history; returns the books updated."""
+    scores = Counter()
+    epoch = current_epoch()
+    for book_id, borrowed in LoanHistory.objects.order_by().values_list('book_id', 'borrowed_date').iterator(chunk_size=5000):
+        scores[book_id] += borrow_weight(borrowed, epoch)
+    ids = sorted(scores)
+    with transaction.atomic():
+        Book.objects.exclude(popularity=0).update(popularity=0)
+        for start in range(0, len(ids), REBUILD_BATCH):
+            batch = ids[start:start + REBUILD_BATCH]
+            Book.objects.filter(id__in=batch).update(popularity=Case(
+                *(When(id=book_id, then=Value(scores[book_id])) for book_id in batch),
+                output_field=FloatField(),
+            ))
+    return len(ids)
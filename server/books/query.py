@@ -0,0 +1,182 @@
+"""
+Query planner for ``search_books``.
+
+The ``q`` parameter is parsed into a list of clauses, e.g.::
+
+    author:tolkien "the hobbit"   ->  [Clause('author', 'tolkien', False),
+                                       Clause(None, 'the hobbit', True)]
+
+and every clause is routed to the cheapest access path available:
+
+* ``isbn``     - normalized ISBN-10/13 exact lookup on the unique ``isbn`` index
+* ``exact``    - quoted, qualified values (``category:"Science Fiction"``)
+* ``prefix``   - qualified words, matched as prefixes on the indexed columns
+* ``fulltext`` - free text, answered by the full-text index
+* ``scan``     - free text when no full-text index exists (last resort)
+
+Both ``exact`` and ``prefix`` are case-insensitive, so plain indexes on
+the columns cannot serve them everywhere. ``install_prefix_indexes``
+adds indexes matching how Django compiles ``iexact``/``istartswith``:
+``UPPER(column::text)`` with ``text_pattern_ops`` (for ``LIKE 'x%'``) on
+PostgreSQL and ``column COLLATE NOCASE`` (SQLite's LIKE optimization) on
+SQLite. MySQL's default collations are case-insensitive already.
+"""
+import re
+from collections import namedtuple
+
+from django.db.models import Q
+
+from .models import Book
+from .search import FullTextResults, fulltext_available, tokenize
+
+Clause = namedtuple('Clause', ('field', 'value', 'phrase'))
+
+QUALIFIERS = ('title', 'author', 'isbn', 'category')
+SCAN_FIELDS = ('title', 'author', 'isbn', 'category', 'description')
+
+# Case-insensitive indexes behind the exact and prefix paths
+PREFIX_INDEXES = {
+    'title': 'books_book_title_ci_idx',
+    'author': 'books_book_author_ci_idx',
+    'category': 'books_book_category_ci_idx',
+}
+
+CLAUSE_RE = re.compile(r'(?:(\w+):)?(?:"([^"]*)"?|(\S+))')
+ISBN_RE = re.compile(r'^(?:\d{9}[\dX]|\d{13})$')
+
+
+def parse(query):
+    """Parse a search string into a list of ``Clause`` tuples."""
+    clauses = []
+    for match in CLAUSE_RE.finditer(query):
+        field, phrase, word = match.groups()
+        if field and field.lower() not in QUALIFIERS:
+            # Unknown qualifier: keep the whole token as free text
+            field, word = None, match.group(0)
+        value = (phrase if phrase is not None else word or '').strip()
+        if value:
+            clauses.append(Clause(field.lower() if field else None, value, phrase is not None))
+    return clauses
+
+
+def isbn10_check_digit(digits):
+    total = sum((10 - i) * int(d) for i, d in enumerate(digits[:9]))
+    check = (11 - total % 11) % 11
+    return 'X' if check == 10 else str(check)
+
+
+def isbn13_check_digit(digits):
+    total = sum((3 if i % 2 else 1) * int(d) for i, d in enumerate(digits[:12]))
+    return str((10 - total % 10) % 10)
+
+
+def normalize_isbn(value):
+    """
+    Return the normalized ISBN plus its ISBN-10/13 counterpart, if any.
+
+    Hyphens and spaces are stripped; returns ``None`` if ``value`` does not
+    look like an ISBN.
+    """
+    isbn = re.sub(r'[\s-]', '', value).upper()
+    if not ISBN_RE.match(isbn):
+        return None
+    candidates = [isbn]
+    if len(isbn) == 10 and isbn10_check_digit(isbn) == isbn[9]:
+        isbn13 = '978' + isbn[:9]
+        candidates.append(isbn13 + isbn13_check_digit(isbn13))
+    elif len(isbn) == 13 and isbn.startswith('978') and isbn13_check_digit(isbn) == isbn[12]:
+        candidates.append(isbn[3:12] + isbn10_check_digit(isbn[3:12]))
+    return candidates
+
+
+class SearchPlan:
+    """The access paths chosen for a parsed query, and how to run them."""
+
+    def __init__(self, clauses):
+        self.clauses = clauses
+        self.filters = Q()
+        self.text = []
+        self.paths = []
+        for clause in clauses:
+            self._plan(clause)
+
+    def _use(self, path):
+        if path not in self.paths:
+            self.paths.append(path)
+
+    def _plan(self, clause):
+        field, value, phrase = clause
+        isbn = normalize_isbn(value) if field in (None, 'isbn') else None
+        if isbn:
+            self.filters &= Q(isbn__in=isbn)
+            self._use('isbn')
+        elif field == 'isbn':
+            self.filters &= Q(isbn=value)
+            self._use('isbn')
+        elif field and phrase:
+            self.filters &= Q(**{f'{field}__iexact': value})
+            self._use('exact')
+        elif field:
+            self.filters &= Q(**{f'{field}__istartswith': value})
+            self._use('prefix')
+        elif tokenize(value):
+            self.text.append(f'"{value}"' if phrase else value)
+
+    @property
+    def text_query(self):
+        return ' '.join(self.text)
+
+    def explain(self):
+        """Short description of the chosen paths, e.g. ``prefix+fulltext``."""
+        paths = list(self.paths)
+        if self.text:
+            paths.append('fulltext' if fulltext_available() else 'scan')
+        return '+'.join(paths) or 'none'
+
+    def results(self):
+        """Return a sliceable, countable result set for the plan."""
+        queryset = Book.objects.filter(self.filters) if self.paths else None
+        if not self.text:
+            if queryset is None:
+                return Book.objects.none()
+            return queryset.order_by('title', 'id')
+        if fulltext_available():
+            return FullTextResults(self.text_query, queryset=queryset)
+        queryset = queryset if queryset is not None else Book.objects.all()
+        for value in self.text:
+            value = value.strip('"')
+            scan = Q()
+            for name in SCAN_FIELDS:
+                scan |= Q(**{f'{name}__icontains': value})
+            queryset = queryset.filter(scan)
+        return queryset.order_by('title', 'id')
+
+
+def plan_search(query):
+    """Parse ``query`` and return its ``SearchPlan``."""
+    return SearchPlan(parse(query))
+
+
+def install_prefix_indexes(connection):
+    """
+    Create the case-insensitive indexes of ``PREFIX_INDEXES`` (used by a
+    migration, and after every migrate on SQLite, whose table rebuilds drop them).
+    """
+    for field, name in PREFIX_INDEXES.items():
+        if connection.vendor == 'postgresql':
+            sql = f'CREATE INDEX IF NOT EXISTS {name} ON books_book (UPPER({field}::text) text_pattern_ops)'
+        elif connection.vendor == 'sqlite':
+            sql = f'CREATE INDEX IF NOT EXISTS {name} ON books_book ({field} COLLATE NOCASE)'
+        else:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+
+
+def remove_prefix_indexes(connection):
+    """Drop the indexes of ``PREFIX_INDEXES`` (used by migrations)."""
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        return
+    with connection.cursor() as cursor:
+        for name in PREFIX_INDEXES.values():
+            cursor.execute(f'DROP INDEX IF EXISTS {name}')
@@ -0,0 +1,162 @@
+"""
+"Patrons who borrowed this also borrowed": related books from co-borrowing.
+
+The loan history is read as a sparse binary user x book matrix ``X``.
+``X.T @ X`` counts, for every pair of books, the patrons who borrowed both;
+scaled by the borrower counts of the two books this is their cosine
+similarity. The top ``RELATED_BOOKS_K`` books per book (with at least
+``RELATED_MIN_COBORROWERS`` patrons in common) are stored in
+``RelatedBook``, which ``/api/books/{id}/related/`` reads with one indexed
+lookup.
+
+Runs are incremental: only the books of patrons who borrowed since the
+last run (loans above its ``last_loan_id``) have their co-borrowing counts
+changed, so only their columns are recomputed, from the loans of the
+patrons sharing one of them. The other books keep their lists, whose
+scores may drift slightly as borrower counts grow; ``full=True`` rebuilds
+everything.
+
+Loan ids are allocated before their transaction commits, so a loan may
+become visible after a run that already counted higher ids. Incremental
+runs therefore re-scan the last ``RESCAN_LOANS`` ids below the previous
+watermark, and a full rebuild runs every ``RELATED_BOOKS_FULL_INTERVAL``
+seconds to catch anything older and reset the drift.
+"""
+import datetime
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+from scipy import sparse
+
+from .cache import bump_catalog_generation
+from .models import LoanHistory, RelatedBook, RelatedBooksRun
+
+# Similarity columns computed per sparse product, bounding memory
+COLUMN_CHUNK = 2000
+# Ids per DELETE statement
+DELETE_CHUNK = 1000
+# (user, book) pairs read and converted per batch when building the matrix
+PAIR_CHUNK = 100000
+# Loan ids below the previous watermark re-scanned by incremental runs
+RESCAN_LOANS = 1000
+
+
+def pair_array(pairs, chunk_size=PAIR_CHUNK):
+    """
+    Read an iterable of ``(user_id, book_id)`` pairs into an ``n x 2`` int64
+    array, ``chunk_size`` pairs at a time, so no Python list of every pair
+    is ever held.
+    """
+    pairs = iter(pairs)
+    chunks = []
+    while batch := list(islice(pairs, chunk_size)):
+        chunks.append(np.array(batch, dtype=np.int64).reshape(-1, 2))
+    return np.concatenate(chunks) if chunks else np.empty((0, 2), dtype=np.int64)
+
+
+def borrow_matrix(pairs):
+    """Return the binary user x book CSR matrix of ``(user_id, book_id)`` pairs, and its book ids."""
+    pairs = pair_array(pairs)
+    _, user_index = np.unique(pairs[:, 0], return_inverse=True)
+    book_ids, book_index = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.float32), (user_index, book_index)),
+        shape=(user_index.max(initial=-1) + 1, len(book_ids)),
+    )
+    matrix.data[:] = 1  # a book borrowed twice by a patron counts once
+    return matrix, book_ids
+
+
+def top_related(matrix, book_ids, borrowers, columns, k, min_count):
+    """
+    Yield ``(book_id, [(related_id, score), ...])`` for the ``columns`` of
+    ``matrix``, best first; ``borrowers`` holds each book's borrower count.
+    """
+    by_book = matrix.T.tocsr()
+    for start in range(0, len(columns), COLUMN_CHUNK):
+        chunk = columns[start:start + COLUMN_CHUNK]
+        counts = (by_book @ matrix[:, chunk]).tocsc()
+        for n, column in enumerate(chunk):
+            rows = counts.indices[counts.indptr[n]:counts.indptr[n + 1]]
+            common = counts.data[counts.indptr[n]:counts.indptr[n + 1]]
+            keep = (rows != column) & (common >= min_count)
+            rows, common = rows[keep], common[keep]
+            scores = common / np.sqrt(borrowers[rows] * borrowers[column])
+            if len(scores) > k:
+                best = np.argpartition(-scores, k)[:k]
+                rows, scores = rows[best], scores[best]
+            # Best first, ties by book id for stable results
+            order = np.lexsort((book_ids[rows], -scores))
+            yield int(book_ids[column]), [(int(book_ids[rows[i]]), float(scores[i])) for i in order]
+
+
+def changed_books(since_loan_id, last_loan_id):
+    """Books whose co-borrowing changed with loans ``since_loan_id < id <= last_loan_id``, as a subquery."""
+    patrons = LoanHistory.objects.filter(id__gt=since_loan_id, id__lte=last_loan_id).values('user_id')
+    return LoanHistory.objects.filter(user_id__in=patrons).order_by().values('book_id').distinct()
+
+
+def full_rebuild_due():
+    """Whether the last full run is older than ``RELATED_BOOKS_FULL_INTERVAL`` seconds."""
+    last = RelatedBooksRun.objects.filter(full=True).values_list('finished_at', flat=True).first()
+    interval = datetime.timedelta(seconds=settings.RELATED_BOOKS_FULL_INTERVAL)
+    return last is None or timezone.now() - last >= interval
+
+
+def update_related_books(full=False, k=None, min_count=None):
+    """
+    Bring ``RelatedBook`` up to date with the loans and return the
+    ``RelatedBooksRun``, or the previous one when no loans arrived since.
+    """
+    k = k or settings.RELATED_BOOKS_K
+    min_count = min_count or settings.RELATED_MIN_COBORROWERS
+    last_loan_id = LoanHistory.objects.aggregate(last=Max('id'))['last'] or 0
+    previous = RelatedBooksRun.objects.first()
+    full = full or previous is None or full_rebuild_due()
+    loans = LoanHistory.objects.filter(id__lte=last_loan_id).order_by()
+    if full:
+        books = None
+    else:
+        if last_loan_id <= previous.last_loan_id:
+            return previous
+        changed = changed_books(max(previous.last_loan_id - RESCAN_LOANS, 0), last_loan_id)
+        books = {row['book_id'] for row in changed}
+        # Everyone who borrowed a changed book: their loans make up its column
+        loans = loans.filter(user_id__in=LoanHistory.objects.filter(book_id__in=changed).values('user_id'))
+    pairs = loans.values_list('user_id', 'book_id').distinct().iterator(chunk_size=PAIR_CHUNK)
+    matrix, book_ids = borrow_matrix(pairs)
+    # Borrower counts of the matrix's books, including patrons outside the matrix
+    counted = LoanHistory.objects.filter(id__lte=last_loan_id).order_by()
+    if books is not None:
+        counted = counted.filter(book_id__in=loans.values('book_id'))
+    borrower_counts = dict(
+        counted.values('book_id').annotate(n=Count('user_id', distinct=True)).values_list('book_id', 'n')
+    )
+    borrowers = np.array([borrower_counts.get(int(book_id), 0) for book_id in book_ids], dtype=np.float64)
+    columns = (
+        np.arange(len(book_ids)) if books is None
+        else np.flatnonzero(np.isin(book_ids, np.fromiter(books, dtype=np.int64)))
+    )
+    rows = [
+        RelatedBook(book_id=book_id, related_id=related_id, rank=rank, score=score)
+        for book_id, related in top_related(matrix, book_ids, borrowers, columns, k, min_count)
+        for rank, (related_id, score) in enumerate(related, 1)
+    ]
+
+    with transaction.atomic():
+        if books is None:
+            RelatedBook.objects.all().delete()
+        else:
+            ids = sorted(books)
+            for start in range(0, len(ids), DELETE_CHUNK):
+                RelatedBook.objects.filter(book_id__in=ids[start:start + DELETE_CHUNK]).delete()
+        RelatedBook.objects.bulk_create(rows, batch_size=5000)
+        run = RelatedBooksRun.objects.create(
+            last_loan_id=last_loan_id, books_updated=len(columns), full=full
+        )
+    bump_catalog_generation()
+    return run
@@ -0,0 +1,220 @@
+"""
+Daily circulation rollups behind the borrowing trend charts.
+
+Each ``CirculationDay`` row counts the borrows, returns, overdues and
+distinct borrowers of one day in one slice: all loans, one book, one
+category or one user cohort (``YYYY-MM`` the user joined). Days are local
+dates in ``TIME_ZONE``.
+
+Rows are maintained as loans change: ``record_borrows`` and
+``record_returns`` run through ``record_on_commit`` once a borrow or return
+has committed, in a short transaction of their own, so the hot ``all`` and
+category rows are never locked for the rest of a request (a failed update
+is logged; ``backfill_rollups`` repairs the counts), and
+``record_overdues`` runs in the overdue sweep. An overdue is counted on the day
+the loan fell due, when the sweep marks it or, if it was returned late
+before the sweep got to it, on return. Increments are applied with one
+``INSERT ... ON CONFLICT DO NOTHING`` for missing rows and one ``UPDATE``
+per day, metric and amount, so a batch of any size costs a few queries.
+
+``backfill_rollups`` rebuilds the rows from the loan history (archived
+loans included) a window of days at a time (``manage.py
+backfill_circulation``), reading the window's loans once per date column
+and counting them in Python, and ``trend_series`` sums the rows per day,
+week or month.
+"""
+import datetime
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import F, Min, Q, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import CirculationDay, Loan, LoanHistory
+
+METRICS = ('borrows', 'returns', 'overdues', 'unique_borrowers')
+RESOLUTIONS = {'day': None, 'week': TruncWeek, 'month': TruncMonth}
+BACKFILL_WINDOW_DAYS = 31
+
+
+def cohort(date_joined):
+    """The cohort of a user who joined at ``date_joined``."""
+    return timezone.localtime(date_joined).strftime('%Y-%m')
+
+
+def slices(book_id, category, user_cohort):
+    """The ``(dimension, key)`` slices a loan counts towards."""
+    return (('all', ''), ('book', str(book_id)), ('category', category), ('cohort', user_cohort))
+
+
+def record(counts):
+    """Add a ``Counter`` of ``(day, dimension, key, metric) -> amount`` to the rollup rows."""
+    groups = defaultdict(set)
+    for (day, dimension, key, metric), amount in counts.items():
+        if amount:
+            groups[day, metric, amount].add((dimension, key))
+    if not groups:
+        return
+    CirculationDay.objects.bulk_create([
+        CirculationDay(day=day, dimension=dimension, key=key)
+        for day, dimension, key in {
+            (day, dimension, key) for (day, _, _), rows in groups.items() for dimension, key in rows
+        }
+    ], ignore_conflicts=True)
+    for (day, metric, amount), rows in groups.items():
+        keys = defaultdict(list)
+        for dimension, key in rows:
+            keys[dimension].append(key)
+        match = Q()
+        for dimension, dimension_keys in keys.items():
+            match |= Q(dimension=dimension, key__in=dimension_keys)
+        CirculationDay.objects.filter(match, day=day).update(**{metric: F(metric) + amount})
+
+
+def record_on_commit(record_function, *args):
+    """Call ``record_function(*args)`` in its own transaction once the current one commits."""
+    def run():
+        with transaction.atomic():
+            record_function(*args)
+    transaction.on_commit(run, robust=True)
+
+
+def day_range(day):
+    """The ``[start, end)`` datetimes of local date ``day``."""
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    return start, start + datetime.timedelta(days=1)
+
+
+def record_borrows(user, books, when, new_loan_ids=()):
+    """
+    Count ``user`` borrowing ``books`` (``(book_id, category)`` pairs) at
+    ``when``. Distinct borrowers are counted against the user's other loans
+    of the day, i.e. all but ``new_loan_ids``.
+    """
+    day = timezone.localdate(when)
+    user_cohort = cohort(user.date_joined)
+    start, end = day_range(day)
+    earlier = (
+        Loan.objects.filter(user=user, borrowed_date__gte=start, borrowed_date__lt=end)
+        .exclude(id__in=new_loan_ids).values_list('book_id', 'book__category')
+    )
+    seen = {row for book_id, category in earlier for row in slices(book_id, category, user_cohort)}
+    counts = Counter()
+    for book_id, category in books:
+        for dimension, key in slices(book_id, category, user_cohort):
+            counts[day, dimension, key, 'borrows'] += 1
+            if (dimension, key) not in seen:
+                seen.add((dimension, key))
+                counts[day, dimension, key, 'unique_borrowers'] += 1
+    record(counts)
+
+
+def record_returns(loan_ids, when, unswept=()):
+    """
+    Count the return of ``loan_ids`` at ``when``; loans in ``unswept`` were
+    still ``active`` and are counted overdue too if returned late.
+    """
+    day = timezone.localdate(when)
+    counts = Counter()
+    for pk, book_id, category, joined, due_date in _loan_slices(loan_ids):
+        for dimension, key in slices(book_id, category, cohort(joined)):
+            counts[day, dimension, key, 'returns'] += 1
+            if pk in unswept and due_date < when:
+                counts[timezone.localdate(due_date), dimension, key, 'overdues'] += 1
+    record(counts)
+
+
+def record_overdues(loan_ids):
+    """Count ``loan_ids`` overdue, on the day each fell due."""
+    counts = Counter()
+    for _, book_id, category, joined, due_date in _loan_slices(loan_ids):
+        for dimension, key in slices(book_id, category, cohort(joined)):
+            counts[timezone.localdate(due_date), dimension, key, 'overdues'] += 1
+    record(counts)
+
+
+def _loan_slices(loan_ids):
+    return Loan.objects.filter(id__in=loan_ids).values_list(
+        'id', 'book_id', 'book__category', 'user__date_joined', 'due_date'
+    )
+
+
+def rollup_window(start, end, now=None):
+    """Recount the rollup rows of local dates ``start`` to ``end`` (exclusive)."""
+    now = now or timezone.now()
+    lower, upper = day_range(start)[0], day_range(end)[0]
+    counts, borrowers = Counter(), defaultdict(set)
+    cohorts = {}
+
+    def loans(date_field, *conditions):
+        rows = LoanHistory.objects.filter(
+            *conditions, **{f'{date_field}__gte': lower, f'{date_field}__lt': upper}
+        ).values_list(date_field, 'book_id', 'book__category', 'user_id', 'user__date_joined')
+        for when, book_id, category, user_id, joined in rows.iterator(chunk_size=5000):
+            if user_id not in cohorts:
+                cohorts[user_id] = cohort(joined)
+            yield timezone.localdate(when), slices(book_id, category, cohorts[user_id]), user_id
+
+    for day, loan_slices, user_id in loans('borrowed_date'):
+        for dimension, key in loan_slices:
+            counts[day, dimension, key, 'borrows'] += 1
+            borrowers[day, dimension, key].add(user_id)
+    for day, loan_slices, _ in loans('return_date'):
+        for dimension, key in loan_slices:
+            counts[day, dimension, key, 'returns'] += 1
+    late = Q(return_date__gt=F('due_date')) | Q(return_date__isnull=True, due_date__lt=now)
+    for day, loan_slices, _ in loans('due_date', late):
+        for dimension, key in loan_slices:
+            counts[day, dimension, key, 'overdues'] += 1
+
+    rows = defaultdict(dict)
+    for (day, dimension, key, metric), amount in counts.items():
+        rows[day, dimension, key][metric] = amount
+    for row, users in borrowers.items():
+        rows[row]['unique_borrowers'] = len(users)
+    with transaction.atomic():
+        CirculationDay.objects.filter(day__gte=start, day__lt=end).delete()
+        CirculationDay.objects.bulk_create([
+            CirculationDay(day=day, dimension=dimension, key=key, **totals)
+            for (day, dimension, key), totals in rows.items()
+        ], batch_size=1000)
+    return len(rows)
+
+
+def backfill_rollups(start=None, end=None, window_days=BACKFILL_WINDOW_DAYS):
+    """
+    Rebuild the rollup rows from ``start`` (default: the first loan) to
+    ``end`` (default: today), ``window_days`` at a time. Yields each window
+    as ``(start, end, rows written)``.
+    """
+    if start is None:
+        first = LoanHistory.objects.aggregate(first=Min('borrowed_date'))['first']
+        if first is None:
+            return
+        start = timezone.localdate(first)
+    end = end or timezone.localdate() + datetime.timedelta(days=1)
+    while start < end:
+        stop = min(start + datetime.timedelta(days=window_days), end)
+        yield start, stop, rollup_window(start, stop)
+        start = stop
+
+
+def trend_series(resolution='day', dimension='all', key='', start=None, end=None):
+    """
+    Circulation per day, week (from Monday) or month of one slice, oldest
+    first: dicts of ``period`` and the ``METRICS``. Over weeks and months
+    ``unique_borrowers`` sums the distinct borrowers of each day.
+    """
+    rows = CirculationDay.objects.filter(dimension=dimension, key=key)
+    if start:
+        rows = rows.filter(day__gte=start)
+    if end:
+        rows = rows.filter(day__lte=end)
+    trunc = RESOLUTIONS[resolution]
+    period = trunc('day') if trunc else F('day')
+    return list(
+        rows.annotate(period=period).order_by().values('period')
+        .annotate(**{metric: Sum(metric) for metric in METRICS})
+        .order_by('period')
+    )
@@ -0,0 +1,307 @@
+"""
+Full-text search over the book catalog.
+
+Each supported database keeps its own full-text index in sync with the
+``books_book`` table at the database level, so ``Book.save()``, deletes,
+``bulk_create()`` and ``QuerySet.update()`` are all covered:
+
+* PostgreSQL: a generated, weighted ``tsvector`` column with a GIN index.
+* SQLite: an external-content FTS5 table maintained by triggers.
+* MySQL: an InnoDB ``FULLTEXT`` index.
+
+Every backend matches single words as prefixes and quoted phrases exactly,
+requiring all of them.
+
+Any other backend (or an SQLite build without FTS5) falls back to the
+original ``icontains`` scan.
+"""
+import re
+
+from django.db import connection, OperationalError
+from django.db.models import Q
+
+from .models import Book
+
+FTS_TABLE = 'books_book_fts'
+SEARCH_VECTOR_COLUMN = 'search_vector'
+SEARCH_VECTOR_INDEX = 'books_book_search_vector_idx'
+FULLTEXT_INDEX = 'books_book_fulltext'
+FULLTEXT_COLUMNS = ('title', 'author', 'isbn', 'category', 'description')
+
+# Relative column weights used for ranking (title, author, isbn, category, description)
+SQLITE_RANK = 'bm25(10.0, 8.0, 10.0, 4.0, 1.0)'
+
+SQLITE_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON books_book BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, author, isbn, category, description)
+        VALUES (new.id, new.title, new.author, new.isbn, new.category, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON books_book BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author, isbn, category, description)
+        VALUES ('delete', old.id, old.title, old.author, old.isbn, old.category, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+    AFTER UPDATE OF title, author, isbn, category, description ON books_book BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author, isbn, category, description)
+        VALUES ('delete', old.id, old.title, old.author, old.isbn, old.category, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, author, isbn, category, description)
+        VALUES (new.id, new.title, new.author, new.isbn, new.category, new.description);
+    END
+    """,
+)
+
+_available = {}
+_mysql_rules = {}
+
+
+def install_fulltext_index(schema_editor):
+    """Create the vendor-specific full-text index (used by migrations)."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            f"""
+            ALTER TABLE books_book ADD COLUMN {SEARCH_VECTOR_COLUMN} tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('simple', coalesce(isbn, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(author, '')), 'B') ||
+                setweight(to_tsvector('english', coalesce(category, '')), 'C') ||
+                setweight(to_tsvector('english', coalesce(description, '')), 'D')
+            ) STORED
+            """
+        )
+        schema_editor.execute(
+            f"CREATE INDEX {SEARCH_VECTOR_INDEX} ON books_book USING GIN ({SEARCH_VECTOR_COLUMN})"
+        )
+    elif vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                f"""
+                CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+                    {', '.join(FULLTEXT_COLUMNS)},
+                    content='books_book', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+                """
+            )
+        except OperationalError:
+            # SQLite compiled without FTS5; search falls back to a scan.
+            return
+        install_sqlite_triggers(schema_editor.connection)
+        schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', '{SQLITE_RANK}')"
+        )
+    elif vendor == 'mysql':
+        schema_editor.execute(
+            f"CREATE FULLTEXT INDEX {FULLTEXT_INDEX} ON books_book ({', '.join(FULLTEXT_COLUMNS)})"
+        )
+
+
+def remove_fulltext_index(schema_editor):
+    """Drop the vendor-specific full-text index (used by migrations)."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(f"DROP INDEX IF EXISTS {SEARCH_VECTOR_INDEX}")
+        schema_editor.execute(f"ALTER TABLE books_book DROP COLUMN IF EXISTS {SEARCH_VECTOR_COLUMN}")
+    elif vendor == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif vendor == 'mysql':
+        schema_editor.execute(f"DROP INDEX {FULLTEXT_INDEX} ON books_book")
+
+
+def install_sqlite_triggers(conn):
+    """
+    (Re)create the FTS5 sync triggers.
+
+    SQLite migrations that alter ``books_book`` rebuild the table and drop
+    its triggers, so this also runs after every ``migrate``.
+    """
+    if conn.vendor != 'sqlite' or FTS_TABLE not in conn.introspection.table_names():
+        return
+    with conn.cursor() as cursor:
+        for sql in SQLITE_TRIGGERS:
+            cursor.execute(sql)
+
+
+def fulltext_available(conn=None):
+    """Return True if the current database has a usable full-text index."""
+    conn = conn or connection
+    key = (conn.alias, conn.settings_dict['NAME'])
+    if key not in _available:
+        if conn.vendor == 'sqlite':
+            _available[key] = FTS_TABLE in conn.introspection.table_names()
+        else:
+            _available[key] = conn.vendor in ('postgresql', 'mysql')
+    return _available[key]
+
+
+def mysql_fulltext_rules(conn):
+    """
+    Return InnoDB's ``(min_token_size, stopwords)``. Words it never indexes
+    must not be required by a boolean query, or nothing would match.
+    """
+    key = (conn.alias, conn.settings_dict['NAME'])
+    if key not in _mysql_rules:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT @@innodb_ft_min_token_size, @@innodb_ft_enable_stopword, "
+                "@@innodb_ft_server_stopword_table"
+            )
+            min_token_size, enabled, table = cursor.fetchone()
+            stopwords = frozenset()
+            if enabled:
+                # A server stopword table is named ``database/table``
+                if table:
+                    table = '.'.join(f'`{part}`' for part in table.split('/'))
+                else:
+                    table = 'INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD'
+                cursor.execute(f"SELECT value FROM {table}")
+                stopwords = frozenset(row[0].lower() for row in cursor.fetchall())
+        _mysql_rules[key] = (min_token_size, stopwords)
+    return _mysql_rules[key]
+
+
+def tokenize(query):
+    """Split a free-text query into plain word tokens."""
+    return re.findall(r'\w+', query.lower())
+
+
+def text_groups(query):
+    """
+    Split a free-text query into word groups.
+
+    Quoted phrases become one multi-word group; everything else becomes
+    single-word groups. Punctuation is dropped.
+    """
+    groups = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+        if phrase:
+            words = tokenize(phrase)
+            if words:
+                groups.append((tuple(words), True))
+        else:
+            groups.extend(((token,), False) for token in tokenize(word))
+    return groups
+
+
+class FullTextResults:
+    """
+    Lazy, relevance-ranked search results.
+
+    Behaves like a sliceable sequence so it can be handed straight to a
+    Django/DRF paginator: ``count()`` and each page slice are answered by
+    the full-text index, and only the rows of the requested page are
+    loaded as ``Book`` instances. An optional ``queryset`` restricts the
+    matches to its rows.
+    """
+
+    def __init__(self, query, conn=None, queryset=None):
+        self.query = query
+        self.groups = text_groups(query)
+        self.tokens = [word for words, _ in self.groups for word in words]
+        self.connection = conn or connection
+        self.queryset = queryset
+        self._count = None
+
+    def _match_sql(self):
+        vendor = self.connection.vendor
+        if vendor == 'postgresql':
+            tsquery = ' & '.join(
+                f'({" <-> ".join(words)})' if phrase else f'{words[0]}:*'
+                for words, phrase in self.groups
+            )
+            match_sql, params = (
+                f"FROM books_book, to_tsquery('english', %s) query "
+                f"WHERE {SEARCH_VECTOR_COLUMN} @@ query",
+                [tsquery],
+            )
+            order_sql, order_params = f"ts_rank_cd({SEARCH_VECTOR_COLUMN}, query) DESC, id", []
+        elif vendor == 'sqlite':
+            match = ' '.join(
+                f'"{" ".join(words)}"' if phrase else f'"{words[0]}"*'
+                for words, phrase in self.groups
+            )
+            match_sql, params = f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]
+            order_sql, order_params = "rank, rowid", []
+        else:
+            columns = ', '.join(FULLTEXT_COLUMNS)
+            min_token_size, stopwords = mysql_fulltext_rules(self.connection)
+            boolean_query = ' '.join(
+                ('+' if any(len(word) >= min_token_size and word not in stopwords for word in words) else '')
+                + (f'"{" ".join(words)}"' if phrase else f'{words[0]}*')
+                for words, phrase in self.groups
+            )
+            match_sql, params = (
+                f"FROM books_book WHERE MATCH({columns}) AGAINST (%s IN BOOLEAN MODE)",
+                [boolean_query],
+            )
+            order_sql, order_params = f"MATCH({columns}) AGAINST (%s) DESC, id", [self.query]
+        if self.queryset is not None:
+            subquery, subquery_params = self.queryset.order_by().values('id').query.sql_with_params()
+            match_sql += f" AND {self._id_column()} IN ({subquery})"
+            params = params + list(subquery_params)
+        return match_sql, params, order_sql, order_params
+
+    def _id_column(self):
+        return 'rowid' if self.connection.vendor == 'sqlite' else 'id'
+
+    def count(self):
+        if self._count is None:
+            if not self.tokens:
+                self._count = 0
+            else:
+                from_sql, params, _, _ = self._match_sql()
+                with self.connection.cursor() as cursor:
+                    cursor.execute(f"SELECT COUNT(*) {from_sql}", params)
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def ids(self, offset, limit):
+        """Return the ids of matching books in rank order."""
+        if not self.tokens or limit <= 0:
+            return []
+        from_sql, params, order_sql, order_params = self._match_sql()
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {self._id_column()} {from_sql} ORDER BY {order_sql} LIMIT %s OFFSET %s",
+                params + order_params + [limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self[key:key + 1][0]
+        start = key.start or 0
+        stop = key.stop if key.stop is not None else self.count()
+        ids = self.ids(start, stop - start)
+        books = Book.objects.in_bulk(ids)
+        return [books[pk] for pk in ids if pk in books]
+
+
+def scan_search(query):
+    """The original unindexed search: five ``icontains`` clauses OR-ed together."""
+    return Book.objects.filter(
+        Q(title__icontains=query) |
+        Q(author__icontains=query) |
+        Q(isbn__icontains=query) |
+        Q(category__icontains=query) |
+        Q(description__icontains=query)
+    ).order_by('title', 'id')
+
+
+def search(query):
+    """Return ranked results for ``query``, using the full-text index when available."""
+    if fulltext_available():
+        return FullTextResults(query)
+    return scan_search(query)
@@ -1,9 +1,11 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import Book, Loan
 from accounts.serializers import UserSerializer
+from library_project.fieldsets import SparseFieldsMixin
 
 
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for Book model."""
     is_available = serializers.ReadOnlyField()
     
@@ -11,6 +13,7 @@ class BookSerializer(serializers.ModelSerializer):
         model = Book
         fields = '__all__'
         read_only_fields = ('created_at', 'updated_at')
+        field_dependencies = {'is_available': ('available_copies',)}
     
     def validate(self, attrs):
         """Validate that available_copies doesn't exceed total_copies."""
@@ -24,7 +27,7 @@ class BookSerializer(serializers.ModelSerializer):
         return attrs
 
 
-class BookListSerializer(serializers.ModelSerializer):
+class BookListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Lightweight serializer for listing books."""
     is_available = serializers.ReadOnlyField()
     
@@ -32,9 +35,10 @@ class BookListSerializer(serializers.ModelSerializer):
         model = Book
         fields = ('id', 'title', 'author', 'isbn', 'category', 
                   'available_copies', 'total_copies', 'is_available')
+        field_dependencies = {'is_available': ('available_copies',)}
 
 
-class LoanSerializer(serializers.ModelSerializer):
+class LoanSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for Loan model."""
     user = UserSerializer(read_only=True)
     book = BookSerializer(read_only=True)
@@ -50,6 +54,10 @@ class LoanSerializer(serializers.ModelSerializer):
         model = Loan
         fields = '__all__'
         read_only_fields = ('user', 'borrowed_date', 'status')
+        field_dependencies = {
+            'is_overdue': ('status', 'due_date'),
+            'days_overdue': ('status', 'due_date'),
+        }
     
     def validate_book_id(self, value):
         """Validate that the book is available for borrowing."""
@@ -60,7 +68,7 @@ class LoanSerializer(serializers.ModelSerializer):
         return value
 
 
-class LoanListSerializer(serializers.ModelSerializer):
+class LoanListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Lightweight serializer for listing loans."""
     user_username = serializers.CharField(source='user.username', read_only=True)
     book_title = serializers.CharField(source='book.title', read_only=True)
@@ -70,6 +78,7 @@ class LoanListSerializer(serializers.ModelSerializer):
         model = Loan
         fields = ('id', 'user_username', 'book_title', 'borrowed_date', 
                   'due_date', 'return_date', 'status', 'is_overdue')
+        field_dependencies = {'is_overdue': ('status', 'due_date')}
 
 
 class BorrowBookSerializer(serializers.Serializer):
@@ -92,3 +101,44 @@ class ReturnBookSerializer(serializers.Serializer):
     """Serializer for returning a book."""
     loan_id = serializers.IntegerField()
     notes = serializers.CharField(required=False, allow_blank=True)
+
+
+class BatchIdsField(serializers.ListField):
+    """Non-empty list of ids, at most ``LOAN_BATCH_MAX_ITEMS`` long."""
+    
+    def __init__(self, **kwargs):
+        super().__init__(child=serializers.IntegerField(min_value=1), allow_empty=False, **kwargs)
+    
+    def to_internal_value(self, data):
+        if isinstance(data, list) and len(data) > settings.LOAN_BATCH_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f'Ensure this field has no more than {settings.LOAN_BATCH_MAX_ITEMS} elements.'
+            )
+        return super().to_internal_value(data)
+
+
+class BatchBorrowSerializer(serializers.Serializer):
+    """Serializer for borrowing several books; admins may borrow for ``user_id``."""
+    book_ids = BatchIdsField()
+    user_id = serializers.IntegerField(required=False)
+
+
+class BatchReturnSerializer(serializers.Serializer):
+    """Serializer for returning several loans."""
+    loan_ids = BatchIdsField()
+
+
+class CirculationTrendsSerializer(serializers.Serializer):
+    """Query parameters of the circulation trends endpoint."""
+    resolution = serializers.ChoiceField(choices=('day', 'week', 'month'), default='day')
+    dimension = serializers.ChoiceField(choices=('all', 'book', 'category', 'cohort'), default='all')
+    key = serializers.CharField(required=False, default='')
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    
+    def validate(self, data):
+        if data['dimension'] != 'all' and not data['key']:
+            raise serializers.ValidationError({'key': f"A {data['dimension']} key is required."})
+        if data['dimension'] == 'all':
+            data['key'] = ''
+        return data
@@ -0,0 +1,74 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Book, FACET_FIELDS, Loan
+from .facets import adjust_facet, facet_key
+from .cache import bump_catalog_generation
+
+
+@receiver(post_init, sender=Book)
+def remember_facet_bucket(sender, instance, **kwargs):
+    """Remember the facet bucket a book was loaded with."""
+    if instance.pk is not None and not instance.get_deferred_fields().intersection(FACET_FIELDS):
+        instance._facet_key = facet_key(instance)
+
+
+@receiver(pre_save, sender=Book)
+def load_previous_facet_bucket(sender, instance, update_fields=None, **kwargs):
+    """Look up the stored bucket if it was not known when the book was loaded."""
+    if update_fields is not None and not set(update_fields).intersection(FACET_FIELDS):
+        return
+    if instance._state.adding or hasattr(instance, '_facet_key'):
+        return
+    previous = Book.objects.filter(pk=instance.pk).values_list(*FACET_FIELDS).first()
+    if previous:
+        instance._facet_key = (previous[0], previous[1], previous[2] > 0)
+
+
+@receiver(post_save, sender=Book)
+def update_facet_counts(sender, instance, created, update_fields=None, **kwargs):
+    """Move the book between facet buckets when its bucket fields change."""
+    if update_fields is not None and not set(update_fields).intersection(FACET_FIELDS):
+        return
+    key = facet_key(instance)
+    previous = None if created else getattr(instance, '_facet_key', None)
+    if previous != key:
+        if previous is not None:
+            adjust_facet(previous, -1)
+        adjust_facet(key, 1)
+    instance._facet_key = key
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_catalog_cache(sender, **kwargs):
+    """Bump the catalog generation so cached catalog responses are dropped."""
+    bump_catalog_generation()
+
+
+@receiver(post_delete, sender=Book)
+def remove_book_from_facets(sender, instance, **kwargs):
+    """Decrement the facet bucket of a deleted book."""
+    adjust_facet(getattr(instance, '_facet_key', facet_key(instance)), -1)
+
+
+@receiver(post_delete, sender=Book)
+def remove_book_from_fuzzy_index(sender, instance, **kwargs):
+    """Drop a deleted book from this worker's in-process trigram index."""
+    from .fuzzy import trigram_index
+    trigram_index.discard(instance.pk)
+
+
+@receiver(post_delete, sender=Book)
+def remove_book_from_autocomplete(sender, instance, **kwargs):
+    """Drop a deleted book from this worker's autocomplete index."""
+    from .autocomplete import autocomplete_index
+    autocomplete_index.discard(instance.pk)
+
+
+@receiver(post_delete, sender=Loan)
+def release_deleted_loan(sender, instance, **kwargs):
+    """Uncount a deleted loan that was still open from its user's active loans."""
+    if instance.status != 'returned':
+        from accounts.models import User
+        User.objects.release_loans(instance.user_id)
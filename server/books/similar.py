@@ -0,0 +1,336 @@
+"""
+Content-based "similar books", for titles without a loan history.
+
+Each book is a TF-IDF vector of the words of its title and description plus
+one term for its author and one for its category (sublinear term counts,
+smoothed IDF, L2-normalised rows), so the dot product of two rows is their
+cosine similarity. Terms found in more than ``SIMILAR_MAX_DF`` books are
+dropped: they say little about a book, and as every pair of books sharing
+a term costs a multiply-add, capping their count keeps the products linear
+in the catalog size. The top ``SIMILAR_BOOKS_K``
+neighbours of every book are found with sparse products of
+``MATMUL_CHUNK`` rows against the whole matrix, run on
+``SIMILAR_BOOKS_THREADS`` threads.
+
+The lists are stored in ``SimilarBook`` (one row per neighbour, read by
+``/api/books/{id}/similar/`` with one indexed lookup), so every web and
+worker process shares them. Only the vocabulary and IDF of the last full
+build are kept besides, as a compressed ``.npz`` archive in the
+``SimilarBooksIndex`` row; arrays are indexed by position in the sorted
+book ids, never by id.
+
+Incremental builds re-vectorise the catalog with that vocabulary and IDF
+but only run the products of the books whose ``updated_at`` moved since the
+last build, less ``SYNC_OVERLAP`` for saves committed after it started
+(an unchanged book re-read this way rewrites nothing): their own lists are exact, and the changed books are merged
+into or removed from the other books' stored lists, reading and rewriting
+only those. Deleted books leave every list through the cascade, so lists
+may be shorter than K until the next full build. Terms new since the last
+full build are ignored and the IDF does not follow the catalog, so a full
+build (which also picks up ``QuerySet.update()`` edits, as they do not
+touch ``updated_at``) runs every ``SIMILAR_BOOKS_FULL_INTERVAL`` seconds.
+"""
+import datetime
+import io
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from scipy import sparse
+
+from .cache import bump_catalog_generation
+from .models import Book, SimilarBook, SimilarBooksIndex
+
+# Rows per sparse product
+MATMUL_CHUNK = 512
+# Ids per DELETE statement
+DELETE_CHUNK = 1000
+# How far before the last build incremental builds look for changed books
+# (longer than any write transaction is expected to stay open)
+SYNC_OVERLAP = datetime.timedelta(seconds=60)
+TOKEN = re.compile(r'[a-z0-9]{2,}')
+STOP_WORDS = frozenset((
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'he',
+    'her', 'his', 'in', 'is', 'it', 'its', 'of', 'on', 'or', 'she', 'that', 'the',
+    'their', 'this', 'to', 'was', 'were', 'will', 'with',
+))
+
+
+def book_terms(title, author, category, description):
+    """The terms of a book: words of title and description, its author and category."""
+    text = f'{title} {description or ""}'.lower()
+    terms = [word for word in TOKEN.findall(text) if word not in STOP_WORDS]
+    terms.append(f'author:{author.strip().lower()}')
+    terms.append(f'category:{category.strip().lower()}')
+    return terms
+
+
+def term_counts(rows, vocabulary, grow):
+    """
+    Sparse term count matrix of ``(title, author, category, description)``
+    rows; unknown terms are added to ``vocabulary`` when ``grow``, else dropped.
+    """
+    indptr, indices = [0], []
+    for row in rows:
+        for term in book_terms(*row):
+            index = vocabulary.get(term)
+            if index is None and grow:
+                index = vocabulary[term] = len(vocabulary)
+            if index is not None:
+                indices.append(index)
+        indptr.append(len(indices))
+    counts = sparse.csr_matrix(
+        (np.ones(len(indices), dtype=np.float32), np.asarray(indices, dtype=np.int64), indptr),
+        shape=(len(indptr) - 1, len(vocabulary)),
+    )
+    counts.sum_duplicates()
+    return counts
+
+
+def tfidf(counts, idf):
+    """L2-normalised TF-IDF rows of a term count matrix."""
+    vectors = counts.copy()
+    vectors.data = (1 + np.log(vectors.data)) * idf[vectors.indices]
+    norms = np.sqrt(np.asarray(vectors.multiply(vectors).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.csr_matrix(sparse.diags(1 / norms) @ vectors, dtype=np.float32)
+
+
+def products(vectors, rows, threads):
+    """Yield ``(rows chunk, vectors[chunk] @ vectors.T)`` over ``rows``, computed on ``threads`` threads."""
+    by_term = vectors.T.tocsr()
+    chunks = [rows[start:start + MATMUL_CHUNK] for start in range(0, len(rows), MATMUL_CHUNK)]
+    with ThreadPoolExecutor(max_workers=max(threads, 1)) as pool:
+        yield from zip(chunks, pool.map(lambda chunk: (vectors[chunk] @ by_term).tocsr(), chunks))
+
+
+def top_k(product, chunk, k):
+    """The ``(positions, scores)`` of the best ``k`` columns of each product row, excluding the row itself."""
+    positions = np.full((len(chunk), k), -1, dtype=np.int64)
+    scores = np.zeros((len(chunk), k), dtype=np.float32)
+    indptr, indices, data = product.indptr, product.indices, product.data
+    for n, row in enumerate(chunk):
+        start, end = indptr[n], indptr[n + 1]
+        # The best k + 1 (the row itself is usually among them), unsorted
+        if end - start > k + 1:
+            best = start + np.argpartition(data[start:end], end - start - k - 1)[end - start - k - 1:]
+        else:
+            best = np.arange(start, end)
+        columns, values = indices[best], data[best]
+        keep = columns != row
+        columns, values = columns[keep], values[keep]
+        # Best first, ties by position (book id order) for stable results
+        order = np.lexsort((columns, -values))[:k]
+        positions[n, :len(order)] = columns[order]
+        scores[n, :len(order)] = values[order]
+    return positions, scores
+
+
+def full_build_due(previous, now):
+    """Whether the last full build is older than ``SIMILAR_BOOKS_FULL_INTERVAL`` seconds."""
+    interval = datetime.timedelta(seconds=settings.SIMILAR_BOOKS_FULL_INTERVAL)
+    return now - previous['meta']['full_built_at'] >= interval
+
+
+def build_similar_books(full=False, k=None, threads=None):
+    """
+    Bring the similarity index up to date with the catalog; returns a dict
+    of ``full``, ``books_updated`` and ``books``.
+    """
+    k = k or settings.SIMILAR_BOOKS_K
+    threads = threads or settings.SIMILAR_BOOKS_THREADS
+    started = timezone.now()
+    previous = load_index()
+    if previous is None or previous['meta']['k'] != k or full_build_due(previous, started):
+        full = True
+    if full:
+        result = _full_build(k, threads, started)
+    else:
+        result = _incremental_build(previous, k, threads, started)
+        if result is None:
+            return {'full': False, 'books_updated': 0, 'books': Book.objects.count()}
+    bump_catalog_generation()
+    return {'full': full, **result}
+
+
+def _book_rows(books):
+    return books.order_by('id').values_list('id', 'title', 'author', 'category', 'description')
+
+
+def _catalog_counts(vocabulary, grow):
+    """The ids of every book, in order, and their term count matrix (see ``term_counts``)."""
+    ids = []
+
+    def texts():
+        for book_id, *text in _book_rows(Book.objects.all()).iterator(chunk_size=5000):
+            ids.append(book_id)
+            yield text
+    counts = term_counts(texts(), vocabulary, grow)
+    return np.asarray(ids, dtype=np.int64), counts
+
+
+def _full_build(k, threads, started):
+    vocabulary = {}
+    ids, counts = _catalog_counts(vocabulary, grow=True)
+    df = np.bincount(counts.indices, minlength=len(vocabulary))
+    idf = (np.log((1 + len(ids)) / (1 + df)) + 1).astype(np.float32)
+    idf[df > settings.SIMILAR_MAX_DF] = 0
+    vectors = tfidf(counts, idf)
+    vectors.eliminate_zeros()
+
+    # Row n holds the list of book ids[n]
+    neighbours = np.full((len(ids), k), -1, dtype=np.int64)
+    scores = np.zeros((len(ids), k), dtype=np.float32)
+    for chunk, product in products(vectors, np.arange(len(ids)), threads):
+        positions, chunk_scores = top_k(product, chunk, k)
+        neighbours[chunk] = np.where(positions >= 0, ids[positions], -1)
+        scores[chunk] = chunk_scores
+    with transaction.atomic():
+        SimilarBook.objects.all().delete()
+        _insert_lists(zip(ids, neighbours, scores))
+        SimilarBooksIndex.objects.update_or_create(pk=1, defaults={
+            'k': k, 'data': _pack_vocabulary(list(vocabulary), idf),
+            'built_at': started, 'full_built_at': started,
+        })
+    return {'books_updated': len(ids), 'books': len(ids)}
+
+
+def _incremental_build(previous, k, threads, started):
+    since = previous['meta']['built_at'] - SYNC_OVERLAP
+    changed_ids = np.fromiter(
+        Book.objects.filter(updated_at__gte=since).order_by('id').values_list('id', flat=True), dtype=np.int64
+    )
+    if not len(changed_ids):
+        return None
+    vocabulary = {term: n for n, term in enumerate(previous['terms'])}
+    ids, counts = _catalog_counts(vocabulary, grow=False)
+    vectors = tfidf(counts, previous['idf'])
+    vectors.eliminate_zeros()
+    # Books deleted since have left every list already (``SimilarBook`` cascades)
+    changed_ids = np.intersect1d(changed_ids, ids)
+    if not len(changed_ids):
+        return None
+
+    lists = {}
+    candidates = []
+    for chunk, product in products(vectors, np.searchsorted(ids, changed_ids), threads):
+        positions, chunk_scores = top_k(product, chunk, k)
+        for book_id, row, row_scores in zip(ids[chunk], positions, chunk_scores):
+            listed = row >= 0
+            lists[int(book_id)] = (ids[row[listed]], row_scores[listed])
+        rows = np.repeat(ids[chunk], np.diff(product.indptr))
+        others = ids[product.indices]
+        keep = ~np.isin(others, changed_ids) & (product.data > 0)
+        candidates.append((others[keep], rows[keep], product.data[keep]))
+    books, entering, entering_scores = (np.concatenate(column) for column in zip(*candidates))
+
+    # A changed book enters another book's list if it beats the last entry (any, if not full)
+    last = _last_scores(np.unique(books), k)
+    keep = entering_scores > np.array([last.get(int(book), 0) for book in books], dtype=np.float32)
+    books, entering, entering_scores = books[keep], entering[keep], entering_scores[keep]
+    # ... and changed books leave every list, which closes up
+    holding = SimilarBook.objects.filter(similar_id__in=changed_ids.tolist()).values_list('book_id', flat=True)
+    affected = np.setdiff1d(np.union1d(books, np.fromiter(holding, dtype=np.int64)), changed_ids)
+
+    old = _stored_lists(np.union1d(affected, changed_ids))
+    order = np.argsort(books, kind='stable')
+    books, entering, entering_scores = books[order], entering[order], entering_scores[order]
+    starts = np.searchsorted(books, affected, side='left')
+    ends = np.searchsorted(books, affected, side='right')
+    for book, start, end in zip(affected, starts, ends):
+        listed, listed_scores = old.get(int(book), _NO_LIST)
+        stay = ~np.isin(listed, changed_ids)
+        merged = np.concatenate([listed[stay], entering[start:end]])
+        merged_scores = np.concatenate([listed_scores[stay], entering_scores[start:end]])
+        best = np.lexsort((merged, -merged_scores))[:k]
+        lists[int(book)] = merged[best], merged_scores[best]
+    rewrite = {book: lists[book] for book in lists if not _same_list(lists[book], old.get(book, _NO_LIST))}
+
+    with transaction.atomic():
+        _delete_lists(sorted(rewrite))
+        _insert_lists((book, *rewrite[book]) for book in rewrite)
+        SimilarBooksIndex.objects.filter(pk=1).update(built_at=started)
+    return {'books_updated': len(changed_ids), 'books': len(ids)}
+
+
+_NO_LIST = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+
+
+def _same_list(new, old):
+    return np.array_equal(new[0], old[0]) and np.array_equal(new[1], old[1])
+
+
+def _last_scores(books, k):
+    """The score of the ``k``-th entry of each full list among ``books``."""
+    last = {}
+    books = books.tolist()
+    for start in range(0, len(books), DELETE_CHUNK):
+        last.update(SimilarBook.objects.filter(
+            book_id__in=books[start:start + DELETE_CHUNK], rank=k,
+        ).values_list('book_id', 'score'))
+    return last
+
+
+def _stored_lists(books):
+    """The stored ``(neighbour ids, scores)`` of each of ``books`` that has a list."""
+    lists = {}
+    books = books.tolist()
+    for start in range(0, len(books), DELETE_CHUNK):
+        rows = (
+            SimilarBook.objects.filter(book_id__in=books[start:start + DELETE_CHUNK])
+            .order_by('book_id', 'rank').values_list('book_id', 'similar_id', 'score')
+        )
+        for book_id, similar_id, score in rows:
+            lists.setdefault(book_id, ([], []))
+            lists[book_id][0].append(similar_id)
+            lists[book_id][1].append(score)
+    return {
+        book_id: (np.asarray(similar, dtype=np.int64), np.asarray(scores, dtype=np.float32))
+        for book_id, (similar, scores) in lists.items()
+    }
+
+
+def _delete_lists(books):
+    for start in range(0, len(books), DELETE_CHUNK):
+        SimilarBook.objects.filter(book_id__in=books[start:start + DELETE_CHUNK]).delete()
+
+
+def _insert_lists(lists):
+    """Insert the ``SimilarBook`` rows of ``(book_id, neighbour ids, scores)`` lists (``-1`` ids are padding)."""
+    rows = (
+        SimilarBook(book_id=int(book_id), similar_id=int(similar_id), rank=rank, score=float(score))
+        for book_id, neighbours, scores in lists
+        for rank, (similar_id, score) in enumerate(zip(neighbours, scores), 1)
+        if similar_id >= 0
+    )
+    SimilarBook.objects.bulk_create(rows, batch_size=5000)
+
+
+def _pack_vocabulary(terms, idf):
+    buffer = io.BytesIO()
+    # JSON rather than a fixed-width string array, which would pad every term
+    np.savez_compressed(buffer, idf=idf, terms=np.frombuffer(json.dumps(terms).encode('utf-8'), dtype=np.uint8))
+    return buffer.getvalue()
+
+
+def load_index():
+    """The vocabulary, IDF and times of the last build, for building on; ``None`` if there is none."""
+    row = SimilarBooksIndex.objects.filter(pk=1).first()
+    if row is None:
+        return None
+    with np.load(io.BytesIO(row.data)) as archive:
+        index = {
+            'idf': archive['idf'],
+            'terms': json.loads(archive['terms'].tobytes().decode('utf-8')),
+        }
+    index['meta'] = {'k': row.k, 'built_at': row.built_at, 'full_built_at': row.full_built_at}
+    return index
+
+
+def similar_book_ids(book_id):
+    """The ``(book_id, score)`` pairs most similar to ``book_id``, best first; ``[]`` if the book is not indexed."""
+    return list(SimilarBook.objects.filter(book_id=book_id).order_by('rank').values_list('similar_id', 'score'))
@@ -0,0 +1,49 @@
+"""
+Admin dashboard statistics.
+
+The counts are computed by a few aggregate queries in ``refresh_stats()``,
+run every ``STATS_REFRESH_INTERVAL`` seconds by the task worker, and stored
+in the single ``LibraryStats`` row that ``GET /api/admin/stats/`` reads. A
+loan counts as overdue once its due date has passed, like in the overdue
+report, whether or not the sweep has marked it yet.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import Book, LibraryStats, LoanHistory
+
+STATS_PK = 1
+
+
+def compute_stats(now=None):
+    """Count books, loans and users as of ``now``: three aggregate queries."""
+    now = now or timezone.now()
+    books = Book.objects.aggregate(
+        total_books=Count('id'),
+        available_books=Count('id', filter=Q(available_copies__gt=0)),
+        total_copies=Sum('total_copies', default=0),
+        available_copies=Sum('available_copies', default=0),
+    )
+    open_loans = Q(status__in=('active', 'overdue'))
+    loans = LoanHistory.objects.aggregate(
+        active_loans=Count('id', filter=open_loans & Q(due_date__gte=now)),
+        overdue_loans=Count('id', filter=open_loans & Q(due_date__lt=now)),
+        returned_loans=Count('id', filter=Q(status='returned')),
+    )
+    users = get_user_model().objects.aggregate(
+        total_users=Count('id'),
+        borrowing_users=Count('id', filter=Q(active_loans__gt=0)),
+    )
+    return {**books, **loans, **users, 'computed_at': now}
+
+
+def refresh_stats(now=None):
+    """Recompute the stored statistics and return the ``LibraryStats`` row."""
+    stats, _ = LibraryStats.objects.update_or_create(pk=STATS_PK, defaults=compute_stats(now))
+    return stats
+
+
+def current_stats():
+    """The stored statistics, computed first if they never were."""
+    return LibraryStats.objects.filter(pk=STATS_PK).first() or refresh_stats()
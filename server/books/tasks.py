@@ -0,0 +1,62 @@
+"""Background tasks of the catalog and circulation (run by ``manage.py run_worker``)."""
+from django.conf import settings
+
+from taskqueue.registry import task
+
+
+@task(every=settings.OVERDUE_SWEEP_INTERVAL)
+def mark_overdue():
+    """Periodic overdue sweep (see ``books.circulation.mark_overdue``)."""
+    from .circulation import mark_overdue
+    mark_overdue()
+
+
+@task(max_attempts=3)
+def rebuild_facets():
+    """Recount the facet aggregates from the book table."""
+    from .facets import rebuild_facets
+    rebuild_facets()
+
+
+@task(every=settings.NOTICE_INTERVAL)
+def send_notices():
+    """Periodic due-soon and overdue notices (see ``books.notices``)."""
+    from .notices import KINDS, send_notices
+    for kind in KINDS:
+        send_notices(kind)
+
+
+@task(every=settings.STATS_REFRESH_INTERVAL)
+def refresh_stats():
+    """Periodic refresh of the admin dashboard statistics."""
+    from .stats import refresh_stats
+    refresh_stats()
+
+
+@task(every=settings.RELATED_BOOKS_INTERVAL)
+def update_related_books():
+    """Periodic incremental update of the related books."""
+    from .related import update_related_books
+    update_related_books()
+
+
+@task(every=settings.SIMILAR_BOOKS_INTERVAL)
+def build_similar_books():
+    """Periodic incremental build of the similar books index."""
+    from .similar import build_similar_books
+    build_similar_books()
+
+
+@task(every=settings.POPULARITY_REBASE_INTERVAL)
+def rebase_popularity():
+    """Periodic move of the popularity epoch, before the borrow weights grow too large."""
+    from .popularity import rebase_popularity
+    rebase_popularity()
+
+
+@task(every=settings.LOAN_ARCHIVE_INTERVAL)
+def archive_loans():
+    """Periodic move of old returned loans to the archive table."""
+    from .archive import archive_loans
+    for _ in archive_loans():
+        pass
@@ -107,7 +107,86 @@ class TestBookAPI:
         
         response = self.client.get('/api/books/search/?q=Python')
         assert response.status_code == status.HTTP_200_OK
-        assert len(response.data) == 2
+        assert response.data['count'] == 2
+        assert len(response.data['results']) == 2
+    
+    def test_search_books_ranked_by_relevance(self):
+        """Test title matches rank above description-only matches."""
+        user = UserFactory()
+        self.client.force_authenticate(user=user)
+        
+        BookFactory(title='Cooking Basics', description='Includes a chapter on dragons')
+        BookFactory(title='Dragons of Autumn', description='A fantasy novel')
+        
+        response = self.client.get('/api/books/search/?q=dragons')
+        assert response.status_code == status.HTTP_200_OK
+        titles = [book['title'] for book in response.data['results']]
+        assert titles == ['Dragons of Autumn', 'Cooking Basics']
+    
+    def test_search_books_pagination(self):
+        """Test search results are paginated."""
+        user = UserFactory()
+        self.client.force_authenticate(user=user)
+        
+        BookFactory.create_batch(15, category='Poetry')
+        
+        response = self.client.get('/api/books/search/?q=poetry')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['count'] == 15
+        assert len(response.data['results']) == 10
+        assert response.data['next'] is not None
+        
+        response = self.client.get('/api/books/search/?q=poetry&page=2')
+        assert len(response.data['results']) == 5
+    
+    def test_search_books_reports_plan(self):
+        """Test the chosen access path is reported in a header."""
+        user = UserFactory()
+        self.client.force_authenticate(user=user)
+        
+        book = BookFactory(isbn='9780201657883')
+        
+        response = self.client.get('/api/books/search/?q=978-0-201-65788-3')
+        assert response.status_code == status.HTTP_200_OK
+        assert response['X-Search-Plan'] == 'isbn'
+        assert [b['id'] for b in response.data['results']] == [book.id]
+    
+    def test_fuzzy_search_books(self):
+        """Test fuzzy search tolerates misspelled authors."""
+        from books.fuzzy import trigram_index
+        trigram_index.reset()
+        user = UserFactory()
+        self.client.force_authenticate(user=user)
+        
+        book = BookFactory(title='Good Omens', author='Terry Pratchett')
+        BookFactory(title='Emma', author='Jane Austen')
+        
+        response = self.client.get('/api/books/search/?q=pratchet&fuzzy=1')
+        assert response.status_code == status.HTTP_200_OK
+        assert response['X-Search-Plan'] == 'ngram-index'
+        assert [b['id'] for b in response.data['results']] == [book.id]
+    
+    def test_search_books_requires_query(self):
+        """Test search without a query is rejected."""
+        user = UserFactory()
+        self.client.force_authenticate(user=user)
+        
+        response = self.client.get('/api/books/search/')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_autocomplete_books(self):
+        """Test anonymous users get prefix suggestions."""
+        from books.autocomplete import autocomplete_index
+        autocomplete_index.reset()
+        BookFactory(title='Foundation', author='Isaac Asimov')
+        BookFactory(title='Frankenstein', author='Mary Shelley')
+        
+        response = self.client.get('/api/books/autocomplete/?prefix=fou')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == [{'text': 'Foundation', 'type': 'title', 'count': 1}]
+        
+        response = self.client.get('/api/books/autocomplete/?prefix=asi&limit=abc')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
     
     def test_filter_books_by_category(self):
         """Test filtering books by category."""
@@ -118,6 +197,80 @@ class TestBookAPI:
         assert response.status_code == status.HTTP_200_OK
         assert len(response.data['results']) == 3
     
+    def test_fuzzy_filter_books_by_author(self):
+        """Test the book filter matches authors fuzzily with ?fuzzy=1."""
+        from books.fuzzy import trigram_index
+        trigram_index.reset()
+        BookFactory.create_batch(2, author='Ursula K. Le Guin')
+        BookFactory(author='Isaac Asimov')
+        
+        response = self.client.get('/api/books/?author=ursla&fuzzy=1')
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['results']) == 2
+        
+        response = self.client.get('/api/books/?author=ursla')
+        assert len(response.data['results']) == 0
+    
+    def test_book_facets(self):
+        """Test facet counts are served from the maintained buckets."""
+        BookFactory.create_batch(3, category='Fiction', available_copies=5)
+        BookFactory.create_batch(2, category='Science', language='French', available_copies=0)
+        
+        response = self.client.get('/api/books/facets/')
+        assert response.status_code == status.HTTP_200_OK
+        assert response['X-Facet-Source'] == 'aggregate'
+        assert response.data['total'] == 5
+        assert response.data['category'] == [
+            {'value': 'Fiction', 'count': 3},
+            {'value': 'Science', 'count': 2},
+        ]
+        assert response.data['language'] == [
+            {'value': 'English', 'count': 3},
+            {'value': 'French', 'count': 2},
+        ]
+        assert response.data['availability'] == [
+            {'value': 'available', 'count': 3},
+            {'value': 'unavailable', 'count': 2},
+        ]
+        
+        response = self.client.get('/api/books/facets/?available=false')
+        assert response['X-Facet-Source'] == 'aggregate'
+        assert response.data['category'] == [{'value': 'Science', 'count': 2}]
+    
+    def test_book_facets_honor_other_filters(self):
+        """Test filters the buckets cannot answer fall back to the books."""
+        BookFactory(author='John Doe', category='Fiction')
+        BookFactory(author='Jane Smith', category='Science')
+        
+        response = self.client.get('/api/books/facets/?author=john')
+        assert response.status_code == status.HTTP_200_OK
+        assert response['X-Facet-Source'] == 'live'
+        assert response.data['category'] == [{'value': 'Fiction', 'count': 1}]
+    
+    def test_book_categories(self):
+        """Test categories are listed from the facet buckets."""
+        user = UserFactory()
+        self.client.force_authenticate(user=user)
+        BookFactory(category='Science')
+        BookFactory(category='Art')
+        book = BookFactory(category='Travel')
+        book.delete()
+        
+        response = self.client.get('/api/books/categories/')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == ['Art', 'Science']
+    
+    def test_book_sparse_fields(self):
+        """Test ?fields= on the book list and detail endpoints."""
+        book = BookFactory()
+        
+        response = self.client.get('/api/books/?fields=id,title,is_available')
+        assert response.data['results'] == [{'id': book.id, 'title': book.title, 'is_available': True}]
+        
+        response = self.client.get(f'/api/books/{book.id}/?exclude=description,cover_image')
+        assert 'description' not in response.data
+        assert response.data['isbn'] == book.isbn
+    
     def test_filter_available_books(self):
         """Test filtering available books."""
         BookFactory.create_batch(3, available_copies=5)
@@ -127,6 +280,76 @@ class TestBookAPI:
         assert response.status_code == status.HTTP_200_OK
         assert len(response.data['results']) == 3
 
+    
+    def test_related_books(self, settings):
+        """Test related books are served best first, with one query."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from books.related import update_related_books
+        settings.RELATED_MIN_COBORROWERS = 1
+        book, close, far = BookFactory(), BookFactory(), BookFactory()
+        for user in (UserFactory(), UserFactory()):
+            for other in (book, close):
+                LoanFactory(user=user, book=other, status='returned')
+        LoanFactory(book=far, user=Loan.objects.first().user, status='returned')
+        update_related_books()
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/books/{book.id}/related/')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert [row['id'] for row in response.data['results']] == [close.id, far.id]
+        assert len([q for q in queries if 'books_relatedbook' in q['sql']]) == 1
+        assert self.client.get('/api/books/999999/related/').status_code == status.HTTP_404_NOT_FOUND
+
+    def test_similar_books(self):
+        """Test similar books are served best first with their scores."""
+        from books.similar import build_similar_books
+        book = BookFactory(title='Dragon Riders', description='dragons and riders')
+        close = BookFactory(title='Dragon Riders Return', description='dragons and riders again')
+        far = BookFactory(title='Dragon Cookbook', description='recipes')
+        build_similar_books()
+        
+        response = self.client.get(f'/api/books/{book.id}/similar/')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert [row['id'] for row in response.data['results']][:2] == [close.id, far.id]
+        assert response.data['results'][0]['score'] > response.data['results'][1]['score']
+        assert self.client.get('/api/books/999999/similar/').status_code == status.HTTP_404_NOT_FOUND
+
+    def test_trending_and_popularity_ordering(self):
+        """Test books are ordered by decayed popularity, paged and by cursor."""
+        from books.popularity import borrow_weight
+        from django.utils import timezone
+        old, recent, forgotten, idle = BookFactory(), BookFactory(), BookFactory(), BookFactory()
+        # Three borrows a month ago weigh less than two today
+        Book.objects.filter(pk=old.pk).update(
+            popularity=3 * borrow_weight(timezone.now() - timedelta(days=28))
+        )
+        Book.objects.filter(pk=recent.pk).update(popularity=2 * borrow_weight())
+        # Too long ago to be trending, though still ordered above never borrowed books
+        Book.objects.filter(pk=forgotten.pk).update(
+            popularity=borrow_weight(timezone.now() - timedelta(days=100))
+        )
+        
+        response = self.client.get('/api/books/trending/?limit=5')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert [row['id'] for row in response.data['results']] == [recent.id, old.id]
+        assert response.data['results'][0]['popularity'] == pytest.approx(2, rel=1e-3)
+        assert response.data['results'][1]['popularity'] == pytest.approx(0.188, rel=1e-2)
+        
+        expected = [recent.id, old.id, forgotten.id, idle.id]
+        response = self.client.get('/api/books/?ordering=-popularity')
+        assert [row['id'] for row in response.data['results']] == expected
+        seen, url = [], '/api/books/?ordering=-popularity&pagination=cursor&page_size=2'
+        while url:
+            response = self.client.get(url)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        assert seen == expected
+        assert self.client.get('/api/books/trending/?limit=x').status_code == status.HTTP_400_BAD_REQUEST
+
 
 @pytest.mark.django_db
 class TestLoanAPI:
@@ -153,6 +376,7 @@ class TestLoanAPI:
         
         book.refresh_from_db()
         assert book.available_copies == 4
+        assert book.popularity > 0
     
     def test_cannot_borrow_unavailable_book(self):
         """Test cannot borrow book when none available."""
@@ -201,6 +425,122 @@ class TestLoanAPI:
         book.refresh_from_db()
         assert book.available_copies == 4
     
+    def test_return_refreshes_loan_counts(self):
+        """Test a return invalidates cached loan list counts."""
+        user = UserFactory()
+        loan = Loan.objects.create(user=user, book=BookFactory(), status='active')
+        self.client.force_authenticate(user=user)
+        assert self.client.get('/api/loans/?status=active').data['count'] == 1
+        
+        self.client.post(f'/api/loans/{loan.id}/return/')
+        
+        response = self.client.get('/api/loans/?status=active')
+        assert response.data['count'] == 0
+        assert response.data['results'] == []
+    
+    def test_borrow_and_return_count_active_loans(self):
+        """Test borrowing and returning keep the user's active loan count."""
+        user = UserFactory()
+        book = BookFactory(available_copies=3)
+        self.client.force_authenticate(user=user)
+        
+        response = self.client.post('/api/loans/', {'book_id': book.id})
+        assert response.status_code == status.HTTP_201_CREATED
+        user.refresh_from_db()
+        assert user.active_loans == 1
+        
+        response = self.client.post(f"/api/loans/{response.data['id']}/return/")
+        assert response.status_code == status.HTTP_200_OK
+        user.refresh_from_db()
+        assert user.active_loans == 0
+    
+    def test_cannot_borrow_beyond_quota(self, settings):
+        """Test the borrowing quota, without taking a copy on refusal."""
+        settings.LOAN_QUOTA = 2
+        user = UserFactory()
+        books = BookFactory.create_batch(3, available_copies=1)
+        self.client.force_authenticate(user=user)
+        
+        for book in books[:2]:
+            assert self.client.post('/api/loans/', {'book_id': book.id}).status_code == status.HTTP_201_CREATED
+        response = self.client.post('/api/loans/', {'book_id': books[2].id})
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'limit' in response.data['error']
+        books[2].refresh_from_db()
+        assert books[2].available_copies == 1
+    
+    def test_second_borrow_rolls_back_copy_and_quota(self):
+        """Test a refused duplicate borrow keeps the copy and the quota slot."""
+        user = UserFactory()
+        book = BookFactory(available_copies=3)
+        self.client.force_authenticate(user=user)
+        
+        self.client.post('/api/loans/', {'book_id': book.id})
+        response = self.client.post('/api/loans/', {'book_id': book.id})
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['error'] == 'You already have an active loan for this book.'
+        book.refresh_from_db()
+        user.refresh_from_db()
+        assert book.available_copies == 2
+        assert user.active_loans == 1
+    
+    def test_borrow_checks_need_no_select(self):
+        """Test the quota and duplicate checks run without reading loans or users."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        user = UserFactory()
+        book = BookFactory(available_copies=3)
+        self.client.force_authenticate(user=user)
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/loans/', {'book_id': book.id})
+        
+        assert response.status_code == status.HTTP_201_CREATED
+        sqls = [q['sql'] for q in queries]
+        # Checks come before the loan is inserted; the circulation rollups after
+        checks = sqls[:next(i for i, sql in enumerate(sqls) if sql.startswith('INSERT INTO "books_loan"'))]
+        selects = [sql for sql in checks if sql.startswith('SELECT')]
+        assert not [sql for sql in selects if '"books_loan"' in sql or '"accounts_user"' in sql]
+    
+    def test_borrow_updates_book_in_one_statement(self, django_capture_on_commit_callbacks):
+        """Test a borrow reads the book back from its UPDATE and leaves rollups and caches out of the transaction."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from books.models import CatalogGeneration, CirculationDay
+        from books.cache import catalog_generation
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            pytest.skip('Needs UPDATE ... RETURNING.')
+        book = BookFactory(available_copies=3)
+        generation = catalog_generation()
+        self.client.force_authenticate(user=UserFactory())
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/loans/', {'book_id': book.id})
+        
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['book']['available_copies'] == 2
+        sqls = [q['sql'] for q in queries]
+        assert not [sql for sql in sqls if sql.startswith('SELECT') and 'FROM "books_book"' in sql]
+        assert not [sql for sql in sqls if 'books_circulationday' in sql]
+        # The rollups are recorded after commit; copies remain, so the catalog cache is kept
+        assert CirculationDay.objects.filter(dimension='book', key=str(book.id), borrows=1).exists()
+        assert CatalogGeneration.objects.get(pk=1).value == generation
+    
+    def test_borrowing_last_copy_invalidates_catalog(self, django_capture_on_commit_callbacks):
+        """Test cached availability is refreshed when a book runs out."""
+        book = BookFactory(available_copies=1, total_copies=1)
+        self.client.force_authenticate(user=UserFactory())
+        assert self.client.get('/api/books/?available=true').data['count'] == 1
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            self.client.post('/api/loans/', {'book_id': book.id})
+        
+        assert self.client.get('/api/books/?available=true').data['count'] == 0
+        assert self.client.get(f'/api/books/{book.id}/').data['available_copies'] == 0
+    
     def test_user_can_view_own_loans(self):
         """Test user can view their own loans."""
         user = UserFactory()
@@ -213,6 +553,44 @@ class TestLoanAPI:
         assert response.status_code == status.HTTP_200_OK
         assert len(response.data['results']) == 3
     
+    def test_loan_sparse_fields(self):
+        """Test ?fields= narrows loans and their nested book."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        user = UserFactory()
+        LoanFactory.create_batch(3, user=user)
+        
+        self.client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/loans/my-loans/?fields=id,status,book.title')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert set(response.data['results'][0]) == {'id', 'status', 'book'}
+        assert set(response.data['results'][0]['book']) == {'title'}
+        loan_queries = [query['sql'] for query in queries.captured_queries if 'books_loanhistory"."id' in query['sql']]
+        assert len(loan_queries) == 1
+        assert 'description' not in loan_queries[0]
+        assert 'accounts_user' not in loan_queries[0]
+    
+    def test_loan_expand_and_exclude(self):
+        """Test ?expand= collapses other relations and ?exclude= drops fields."""
+        user = UserFactory()
+        loan = LoanFactory(user=user)
+        
+        self.client.force_authenticate(user=user)
+        response = self.client.get('/api/loans/?expand=book&exclude=book.description,notes')
+        
+        result = response.data['results'][0]
+        assert result['user'] == user.id
+        assert result['book']['id'] == loan.book_id
+        assert 'description' not in result['book']
+        assert 'notes' not in result
+        
+        # Without parameters the full nested objects are returned
+        result = self.client.get('/api/loans/').data['results'][0]
+        assert result['user']['username'] == user.username
+        assert 'description' in result['book']
+    
     def test_admin_can_view_all_loans(self):
         """Test admin can view all loans."""
         admin = AdminUserFactory()
@@ -224,6 +602,112 @@ class TestLoanAPI:
         assert response.status_code == status.HTTP_200_OK
         assert len(response.data['results']) == 5
     
+    def test_admin_can_import_books(self):
+        """Test the admin bulk import upload."""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        admin = AdminUserFactory()
+        upload = SimpleUploadedFile(
+            'books.csv',
+            b'isbn,title,author,page_count,category\n9780000000011,Dune,Frank Herbert,412,Fiction\n,Untitled,Nobody,1,Misc\n',
+        )
+        
+        self.client.force_authenticate(user=admin)
+        response = self.client.post('/api/admin/books/import/', {'file': upload}, format='multipart')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert (response.data['created'], response.data['failed']) == (1, 1)
+        assert response.data['errors'][0]['line'] == 3
+        assert Book.objects.filter(isbn='9780000000011').exists()
+    
+    def test_regular_user_cannot_import_books(self):
+        """Test regular users cannot use the bulk import."""
+        self.client.force_authenticate(user=UserFactory())
+        response = self.client.post('/api/admin/books/import/', {}, format='multipart')
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+    
+    def test_admin_can_export_loans(self):
+        """Test streaming a filtered loan export as CSV."""
+        import csv
+        admin = AdminUserFactory()
+        returned = LoanFactory(status='returned')
+        LoanFactory(status='active')
+        
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/api/admin/export/loans/?status=returned')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Disposition'] == 'attachment; filename="loans.csv"'
+        rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        assert [row['id'] for row in rows] == [str(returned.id)]
+        assert rows[0]['user_username'] == returned.user.username
+        assert rows[0]['book_isbn'] == returned.book.isbn
+    
+    def test_archived_loans_are_still_listed_and_exported(self):
+        """Test my-loans and exports read archived loans with the current ones."""
+        import csv
+        from django.utils import timezone
+        from books.archive import archive_loans
+        user = UserFactory()
+        long_ago = timezone.now() - timedelta(days=400)
+        archived = LoanFactory(user=user, status='returned', return_date=long_ago)
+        returned = LoanFactory(user=user, status='returned', return_date=timezone.now())
+        active = LoanFactory(user=user, status='active')
+        list(archive_loans(days=365))
+        assert not Loan.objects.filter(pk=archived.pk).exists()
+        
+        self.client.force_authenticate(user=user)
+        response = self.client.get('/api/loans/my-loans/?status=returned')
+        assert {loan['id'] for loan in response.data['results']} == {archived.id, returned.id}
+        response = self.client.get('/api/loans/my-loans/?status=active')
+        assert [loan['id'] for loan in response.data['results']] == [active.id]
+        
+        self.client.force_authenticate(user=AdminUserFactory())
+        response = self.client.get('/api/admin/export/loans/?status=returned')
+        rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        assert {row['id'] for row in rows} == {str(archived.id), str(returned.id)}
+        assert {row['user_username'] for row in rows} == {user.username}
+    
+    def test_loan_history_counts_follow_loan_changes(self):
+        """Test my-loans history counts are invalidated by borrows, returns and archiving."""
+        from django.utils import timezone
+        from books.archive import archive_loans
+        user = UserFactory()
+        old = LoanFactory(user=user, status='returned', return_date=timezone.now() - timedelta(days=400))
+        self.client.force_authenticate(user=user)
+        response = self.client.post('/api/loans/', {'book_id': BookFactory(available_copies=1).id})
+        assert self.client.get('/api/loans/my-loans/?status=returned').data['count'] == 1
+        
+        self.client.post(f"/api/loans/{response.data['id']}/return/")
+        assert self.client.get('/api/loans/my-loans/?status=returned').data['count'] == 2
+        
+        self.client.post('/api/loans/', {'book_id': BookFactory(available_copies=1).id})
+        list(archive_loans(days=365))
+        assert not Loan.objects.filter(pk=old.pk).exists()
+        response = self.client.get('/api/loans/my-loans/')
+        assert response.data['count'] == 3
+        assert len(response.data['results']) == 3
+    
+    def test_admin_can_export_books_gzipped(self):
+        """Test streaming a gzipped NDJSON book export."""
+        import gzip
+        import json
+        admin = AdminUserFactory()
+        BookFactory.create_batch(3)
+        
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/api/admin/export/books/?output=ndjson&gzip=1')
+        
+        assert response['Content-Type'] == 'application/gzip'
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        assert [json.loads(line)['id'] for line in lines] == sorted(Book.objects.values_list('id', flat=True))
+    
+    def test_export_rejects_invalid_filters(self):
+        """Test invalid export parameters return errors."""
+        self.client.force_authenticate(user=AdminUserFactory())
+        assert self.client.get('/api/admin/export/loans/?status=lost').status_code == status.HTTP_400_BAD_REQUEST
+        assert self.client.get('/api/admin/export/books/?output=xml').status_code == status.HTTP_400_BAD_REQUEST
+        assert self.client.get('/api/admin/export/users/').status_code == status.HTTP_404_NOT_FOUND
+    
     def test_regular_user_cannot_view_all_loans(self):
         """Test regular user cannot view all loans (should only see their own)."""
         user = UserFactory()
@@ -258,7 +742,250 @@ class TestLoanAPI:
         response = self.client.get('/api/admin/loans/overdue/')
         
         assert response.status_code == status.HTTP_200_OK
-        assert len(response.data) >= 1
+        assert response.data['count'] == 1
+        assert response.data['results'][0]['status'] == 'overdue'
+    
+    def test_overdue_loans_is_read_only_and_paginated(self):
+        """Test listing overdue loans writes nothing and pages the results."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.utils import timezone
+        admin = AdminUserFactory()
+        now = timezone.now()
+        for days in range(12):
+            LoanFactory(status='active', due_date=now - timedelta(days=days + 1))
+        LoanFactory(status='active', due_date=now + timedelta(days=1))
+        LoanFactory(status='returned', due_date=now - timedelta(days=30))
+        
+        self.client.force_authenticate(user=admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/admin/loans/overdue/')
+        
+        assert response.data['count'] == 12
+        assert len(response.data['results']) == 10
+        assert response.data['results'][0]['due_date'] < response.data['results'][1]['due_date']
+        assert not [q for q in queries if q['sql'].startswith(('UPDATE', 'INSERT'))]
+        assert not Loan.objects.filter(status='overdue').exists()
+        # The status is derived in the query, not patched in afterwards
+        assert {row['status'] for row in response.data['results']} == {'overdue'}
+        assert any('CASE WHEN' in q['sql'] for q in queries)
+
+    
+    def test_fines_endpoints(self, settings):
+        """Test the aging report and balances are admin only, and users see their own fines."""
+        from decimal import Decimal
+        from django.utils import timezone
+        settings.FINE_DAILY_RATE, settings.FINE_GRACE_DAYS, settings.FINE_MAX = Decimal('0.50'), 0, Decimal('10')
+        user, admin = UserFactory(), AdminUserFactory()
+        loan = LoanFactory(user=user, status='active', due_date=timezone.now() - timedelta(days=4, hours=1))
+        LoanFactory(status='active', due_date=timezone.now() - timedelta(days=40))
+        
+        self.client.force_authenticate(user=user)
+        assert self.client.get('/api/admin/fines/').status_code == status.HTTP_403_FORBIDDEN
+        assert self.client.get('/api/admin/loans/aging/').status_code == status.HTTP_403_FORBIDDEN
+        response = self.client.get('/api/loans/my-fines/')
+        assert response.data['balance'] == '2.00'
+        assert [(row['loan_id'], row['fine']) for row in response.data['loans']] == [(loan.id, '2.00')]
+        
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/api/admin/fines/')
+        assert [row['balance'] for row in response.data['results']] == ['10.00', '2.00']
+        response = self.client.get('/api/admin/loans/aging/')
+        assert [bucket['loans'] for bucket in response.data['buckets']] == [1, 0, 1]
+
+    
+    def test_admin_stats(self):
+        """Test the dashboard statistics are admin only and read from the summary row."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.utils import timezone
+        from books.stats import refresh_stats
+        admin = AdminUserFactory()
+        BookFactory(total_copies=2, available_copies=0)
+        LoanFactory(status='active', due_date=timezone.now() + timedelta(days=3))
+        LoanFactory(status='active', due_date=timezone.now() - timedelta(days=3))
+        LoanFactory(status='returned')
+        
+        self.client.force_authenticate(user=UserFactory())
+        assert self.client.get('/api/admin/stats/').status_code == status.HTTP_403_FORBIDDEN
+        
+        refresh_stats()
+        self.client.force_authenticate(user=admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/admin/stats/')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['loans'] == {'active': 1, 'overdue': 1, 'returned': 1}
+        assert response.data['books']['total'] == Book.objects.count()
+        assert response.data['books']['available'] == Book.objects.count() - 1
+        assert len([q for q in queries if 'books_' in q['sql']]) == 1
+
+    
+    def test_circulation_trends(self, django_capture_on_commit_callbacks):
+        """Test the trends endpoint is admin only, validates its parameters and reads the rollups."""
+        from django.utils import timezone
+        user, book = UserFactory(), BookFactory(category='Poetry')
+        self.client.force_authenticate(user=user)
+        with django_capture_on_commit_callbacks(execute=True):
+            self.client.post('/api/loans/', {'book_id': book.id})
+        assert self.client.get('/api/admin/circulation/trends/').status_code == status.HTTP_403_FORBIDDEN
+        
+        self.client.force_authenticate(user=AdminUserFactory())
+        response = self.client.get('/api/admin/circulation/trends/', {'dimension': 'category', 'key': 'Poetry',
+                                                                     'resolution': 'month'})
+        assert response.status_code == status.HTTP_200_OK
+        assert [(row['borrows'], row['unique_borrowers']) for row in response.data['results']] == [(1, 1)]
+        assert response.data['results'][0]['period'] == timezone.localdate().replace(day=1)
+        response = self.client.get('/api/admin/circulation/trends/', {'dimension': 'book'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'key' in response.data
+
+
+@pytest.mark.django_db
+class TestBatchCirculation:
+    """Test cases for the batch borrow and return endpoints."""
+    
+    def setup_method(self):
+        """Setup test client."""
+        self.client = APIClient()
+    
+    def test_batch_borrow_reports_each_item(self):
+        """Test a batch borrow lends what it can and explains the rest."""
+        user = UserFactory()
+        available = BookFactory.create_batch(2, available_copies=1)
+        unavailable = BookFactory(available_copies=0)
+        self.client.force_authenticate(user=user)
+        
+        book_ids = [available[0].id, unavailable.id, available[1].id, available[0].id, 999999]
+        response = self.client.post('/api/loans/batch/borrow/', {'book_ids': book_ids}, format='json')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['succeeded'] == 2
+        assert response.data['failed'] == 3
+        results = response.data['results']
+        assert [result['book_id'] for result in results] == book_ids
+        assert 'loan_id' in results[0] and 'loan_id' in results[2]
+        assert results[1]['error'] == 'This book is currently not available.'
+        assert results[3]['error'] == 'You already have an active loan for this book.'
+        assert results[4]['error'] == 'Book not found.'
+        
+        user.refresh_from_db()
+        assert user.active_loans == 2
+        assert set(Loan.objects.filter(user=user).values_list('id', flat=True)) == {
+            results[0]['loan_id'], results[2]['loan_id']
+        }
+        for book in available:
+            book.refresh_from_db()
+            assert book.available_copies == 0
+    
+    def test_batch_borrow_stops_at_quota(self, settings):
+        """Test a batch borrow lends no more than the quota allows."""
+        settings.LOAN_QUOTA = 2
+        user = UserFactory()
+        books = BookFactory.create_batch(3, available_copies=1)
+        self.client.force_authenticate(user=user)
+        
+        response = self.client.post(
+            '/api/loans/batch/borrow/', {'book_ids': [book.id for book in books]}, format='json'
+        )
+        
+        assert response.data['succeeded'] == 2
+        assert 'limit' in response.data['results'][2]['error']
+        books[2].refresh_from_db()
+        assert books[2].available_copies == 1
+    
+    def test_admin_batch_borrows_for_patron(self):
+        """Test admins borrow for a patron, other users cannot."""
+        admin = AdminUserFactory()
+        patron = UserFactory()
+        book = BookFactory(available_copies=2)
+        
+        self.client.force_authenticate(user=UserFactory())
+        response = self.client.post(
+            '/api/loans/batch/borrow/', {'book_ids': [book.id], 'user_id': patron.id}, format='json'
+        )
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        
+        self.client.force_authenticate(user=admin)
+        response = self.client.post(
+            '/api/loans/batch/borrow/', {'book_ids': [book.id], 'user_id': patron.id}, format='json'
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert Loan.objects.get(id=response.data['results'][0]['loan_id']).user == patron
+    
+    def test_batch_rejects_invalid_lists(self, settings):
+        """Test empty, malformed and oversized id lists are rejected."""
+        settings.LOAN_BATCH_MAX_ITEMS = 3
+        self.client.force_authenticate(user=UserFactory())
+        
+        for book_ids in ([], ['abc'], [1, 2, 3, 4]):
+            response = self.client.post('/api/loans/batch/borrow/', {'book_ids': book_ids}, format='json')
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_batch_return(self):
+        """Test a batch return closes loans and restocks copies."""
+        admin = AdminUserFactory()
+        book = BookFactory(total_copies=5, available_copies=2)
+        users = UserFactory.create_batch(3)
+        loans = [LoanFactory(user=user, book=book, status='active') for user in users]
+        returned = LoanFactory(status='returned')
+        for user in users:
+            user.active_loans = 1
+            user.save()
+        self.client.force_authenticate(user=admin)
+        
+        loan_ids = [loan.id for loan in loans] + [returned.id, loans[0].id, 999999]
+        response = self.client.post('/api/loans/batch/return/', {'loan_ids': loan_ids}, format='json')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['succeeded'] == 3
+        results = response.data['results']
+        assert results[3]['error'] == 'This book has already been returned.'
+        assert results[4]['error'] == 'This book has already been returned.'
+        assert results[5]['error'] == 'Loan not found.'
+        assert not Loan.objects.filter(id__in=[loan.id for loan in loans]).exclude(status='returned').exists()
+        book.refresh_from_db()
+        assert book.available_copies == 5
+        assert all(user.active_loans == 0 for user in type(admin).objects.filter(id__in=[u.id for u in users]))
+    
+    def test_batch_return_only_own_loans(self):
+        """Test regular users cannot return other users' loans in a batch."""
+        user = UserFactory()
+        own = LoanFactory(user=user, status='active')
+        other = LoanFactory(status='active')
+        self.client.force_authenticate(user=user)
+        
+        response = self.client.post(
+            '/api/loans/batch/return/', {'loan_ids': [own.id, other.id]}, format='json'
+        )
+        
+        assert response.data['succeeded'] == 1
+        assert response.data['results'][1]['error'] == 'Loan not found.'
+        other.refresh_from_db()
+        assert other.status == 'active'
+    
+    def test_batch_queries_do_not_grow_with_size(self, settings):
+        """Test a batch costs the same number of queries for 5 or 50 items."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        def batch_queries(size):
+            user = UserFactory()
+            # One facet bucket: facet updates grow with buckets, not items
+            books = BookFactory.create_batch(size, available_copies=1, category='Fiction', language='English')
+            self.client.force_authenticate(user=user)
+            with CaptureQueriesContext(connection) as borrow:
+                response = self.client.post(
+                    '/api/loans/batch/borrow/', {'book_ids': [book.id for book in books]}, format='json'
+                )
+            loan_ids = [result['loan_id'] for result in response.data['results']]
+            with CaptureQueriesContext(connection) as back:
+                self.client.post('/api/loans/batch/return/', {'loan_ids': loan_ids}, format='json')
+            return len(borrow), len(back)
+        
+        settings.LOAN_QUOTA = 100
+        batch_queries(1)  # Creates the facet rows
+        assert batch_queries(5) == batch_queries(50)
 
 
 @pytest.mark.django_db
@@ -297,3 +1024,298 @@ class TestPaginationAndFiltering:
         response = self.client.get('/api/books/?author=John')
         assert response.status_code == status.HTTP_200_OK
         assert len(response.data['results']) == 3
+    
+    def test_books_page_size(self):
+        """Test the page_size parameter is honored and bounded."""
+        BookFactory.create_batch(25)
+        
+        response = self.client.get('/api/books/?page_size=20')
+        assert len(response.data['results']) == 20
+        
+        response = self.client.get('/api/books/?page_size=1000')
+        assert len(response.data['results']) == 25
+    
+    def test_books_cursor_pagination(self):
+        """Test walking the catalog with keyset cursors, including ties."""
+        from django.utils import timezone
+        BookFactory.create_batch(25)
+        # Force ties on created_at so the id tie-breaker is exercised
+        Book.objects.filter(id__in=Book.objects.order_by('id').values('id')[:10]).update(
+            created_at=timezone.now()
+        )
+        expected = list(Book.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        
+        seen = []
+        url = '/api/books/?pagination=cursor&page_size=7'
+        while url:
+            response = self.client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            assert 'count' not in response.data
+            seen.extend(book['id'] for book in response.data['results'])
+            last = response
+            url = response.data['next']
+        assert seen == expected
+        
+        response = self.client.get(last.data['previous'])
+        assert [book['id'] for book in response.data['results']] == expected[14:21]
+        assert response.data['next'] is not None
+    
+    def test_books_invalid_cursor(self):
+        """Test malformed cursors are rejected."""
+        response = self.client.get('/api/books/?cursor=not-a-cursor')
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+    
+    def test_loans_cursor_pagination(self):
+        """Test loan history can be paged with keyset cursors."""
+        user = UserFactory()
+        LoanFactory.create_batch(12, user=user)
+        self.client.force_authenticate(user=user)
+        expected = list(
+            Loan.objects.filter(user=user).order_by('-borrowed_date', '-id').values_list('id', flat=True)
+        )
+        
+        response = self.client.get('/api/loans/?pagination=cursor&page_size=5')
+        assert [loan['id'] for loan in response.data['results']] == expected[:5]
+        response = self.client.get(response.data['next'])
+        assert [loan['id'] for loan in response.data['results']] == expected[5:10]
+        
+        response = self.client.get('/api/loans/my-loans/?pagination=cursor&page_size=10')
+        assert [loan['id'] for loan in response.data['results']] == expected[:10]
+    
+    def test_books_count_is_cached(self):
+        """Test repeated list requests reuse the cached count."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        BookFactory.create_batch(15)
+        
+        response = self.client.get('/api/books/?page=2')
+        assert response.data['count'] == 15
+        assert response.data['count_exact'] is True
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/books/')
+        assert response.data['count'] == 15
+        assert not any('COUNT(' in query['sql'] for query in queries.captured_queries)
+    
+    def test_books_count_invalidated_on_change(self, django_capture_on_commit_callbacks):
+        """Test writes invalidate cached counts."""
+        BookFactory.create_batch(3, category='Fiction')
+        assert self.client.get('/api/books/?category=Fiction').data['count'] == 3
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            BookFactory(category='Fiction')
+        assert self.client.get('/api/books/?category=Fiction').data['count'] == 4
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            Book.objects.filter(category='Fiction').update(category='Drama')
+        assert self.client.get('/api/books/?category=Fiction').data['count'] == 0
+    
+    def test_loan_counts_kept_across_other_users_borrows(self, django_capture_on_commit_callbacks):
+        """Test a user's cached loan counts survive other users' borrows, but not their own."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        user, other = UserFactory(), UserFactory()
+        LoanFactory.create_batch(2, user=user)
+        self.client.force_authenticate(user=user)
+        assert self.client.get('/api/loans/my-loans/').data['count'] == 2
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            self.client.force_authenticate(user=other)
+            self.client.post('/api/loans/', {'book_id': BookFactory().id})
+        self.client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as queries:
+            assert self.client.get('/api/loans/my-loans/').data['count'] == 2
+        assert not any('COUNT(' in query['sql'] for query in queries.captured_queries)
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            self.client.post('/api/loans/', {'book_id': BookFactory().id})
+        assert self.client.get('/api/loans/my-loans/').data['count'] == 3
+    
+    def test_loan_history_count_estimated_on_large_tables(self, monkeypatch, settings):
+        """Test the loan history view is estimated from the sizes of its tables."""
+        from django.core.cache import cache
+        from library_project import counts
+        from books.models import ArchivedLoan, LoanHistory
+        settings.COUNT_ESTIMATE_THRESHOLD = 1000
+        for model, rows in ((Loan, 3000), (ArchivedLoan, 2000)):
+            cache.set(counts.TABLE_ESTIMATE_KEY.format(table=model._meta.db_table), rows)
+        monkeypatch.setattr(counts, 'query_estimate', lambda queryset: 40)
+        user = UserFactory()
+        self.client.force_authenticate(user=user)
+        
+        assert counts.table_estimate(LoanHistory) == 5000
+        response = self.client.get('/api/loans/my-loans/')
+        assert (response.data['count'], response.data['count_exact']) == (40, False)
+    
+    def test_books_count_estimated_on_large_tables(self, monkeypatch, settings):
+        """Test large tables report planner estimates as approximate."""
+        from library_project import counts
+        settings.COUNT_ESTIMATE_THRESHOLD = 1000
+        monkeypatch.setattr(counts, 'table_estimate', lambda model, using='default': 5000)
+        monkeypatch.setattr(counts, 'query_estimate', lambda queryset: 1200)
+        BookFactory.create_batch(3)
+        
+        response = self.client.get('/api/books/')
+        assert response.data['count'] == 5000
+        assert response.data['count_exact'] is False
+        assert len(response.data['results']) == 3
+        
+        response = self.client.get('/api/books/?category=Fiction')
+        assert response.data['count'] == 1200
+        
+        # Pages past the rows are empty rather than errors
+        response = self.client.get('/api/books/?page=3')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['results'] == []
+
+
+@pytest.mark.django_db
+class TestCatalogCache:
+    """Test the versioned catalog response cache."""
+    
+    def setup_method(self):
+        """Setup test client."""
+        self.client = APIClient()
+        Book.objects.all().delete()
+    
+    def test_book_list_served_from_cache(self):
+        """Test repeated list requests skip the list queries."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        BookFactory.create_batch(3)
+        
+        first = self.client.get('/api/books/?page_size=2')
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get('/api/books/?page_size=2')
+        assert second.data == first.data
+        # Neither the list nor the catalog generation is read from the database
+        assert not any('"books_book' in query['sql'] for query in queries.captured_queries)
+    
+    def test_book_detail_invalidated_on_update(self, django_capture_on_commit_callbacks):
+        """Test admin updates invalidate cached book details."""
+        admin = AdminUserFactory()
+        book = BookFactory(title='Old Title')
+        assert self.client.get(f'/api/books/{book.id}/').data['title'] == 'Old Title'
+        
+        self.client.force_authenticate(user=admin)
+        with django_capture_on_commit_callbacks(execute=True):
+            response = self.client.patch(f'/api/books/{book.id}/', {'title': 'New Title'}, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        
+        self.client.force_authenticate(user=None)
+        assert self.client.get(f'/api/books/{book.id}/').data['title'] == 'New Title'
+    
+    def test_missing_book_not_cached(self):
+        """Test error responses are not cached."""
+        response = self.client.get('/api/books/999999/')
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        
+        book = BookFactory()
+        assert self.client.get(f'/api/books/{book.id}/').status_code == status.HTTP_200_OK
+    
+    def test_stale_entry_served_while_recomputing(self, monkeypatch):
+        """Test only the lock holder recomputes an expired entry."""
+        from django.core.cache import cache
+        from rest_framework.request import Request
+        from rest_framework.response import Response
+        from rest_framework.test import APIRequestFactory
+        from books import cache as catalog_cache
+        request = Request(APIRequestFactory().get('/api/books/categories/'))
+        
+        response = catalog_cache.cached_response(request, 'test', lambda: Response(['Fiction']))
+        assert response.data == ['Fiction']
+        
+        # Expire the entry and hold the recompute lock
+        key = catalog_cache.entry_key(request, 'test')
+        cache.set(key, dict(cache.get(key), expires=0))
+        cache.add(catalog_cache.LOCK_KEY.format(key=key), 1)
+        response = catalog_cache.cached_response(request, 'test', lambda: Response(['Drama']))
+        assert response.data == ['Fiction']
+        
+        cache.delete(catalog_cache.LOCK_KEY.format(key=key))
+        response = catalog_cache.cached_response(request, 'test', lambda: Response(['Drama']))
+        assert response.data == ['Drama']
+    
+    def test_waiting_worker_keeps_the_lock_holders_lock(self, settings):
+        """Test a worker that gave up waiting on a cold key does not release another's lock."""
+        from django.core.cache import cache
+        from rest_framework.request import Request
+        from rest_framework.response import Response
+        from rest_framework.test import APIRequestFactory
+        from books import cache as catalog_cache
+        settings.CATALOG_CACHE_WAIT = 0.1
+        request = Request(APIRequestFactory().get('/api/books/categories/'))
+        lock = catalog_cache.LOCK_KEY.format(key=catalog_cache.entry_key(request, 'test'))
+        cache.add(lock, 'other-worker')
+        
+        response = catalog_cache.cached_response(request, 'test', lambda: Response(['Drama']))
+        
+        assert response.data == ['Drama']
+        assert cache.get(lock) == 'other-worker'
+
+
+class TestConcurrentBorrowing:
+    """Stress test borrowing a hot book from many threads."""
+    
+    @pytest.fixture
+    def stress_db(self, tmp_path, django_db_blocker):
+        """
+        Point the default database at a fresh, migrated SQLite file for the
+        test: threads cannot share an in-memory database, and the test's
+        commits must never reach (or be flushed from) a configured one.
+        """
+        from django.core.management import call_command
+        from django.db import connections
+        saved_settings, saved_connection = connections.settings['default'], connections['default']
+        connections.settings['default'] = connections.configure_settings({'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': str(tmp_path / 'stress.sqlite3'),
+            'ATOMIC_REQUESTS': saved_settings.get('ATOMIC_REQUESTS', False),
+        }})['default']
+        connections['default'] = connections.create_connection('default')
+        try:
+            with django_db_blocker.unblock():
+                call_command('migrate', verbosity=0)
+                yield
+        finally:
+            connections['default'].close()
+            connections['default'] = saved_connection
+            connections.settings['default'] = saved_settings
+    
+    def test_no_oversubscription(self, stress_db):
+        """Test concurrent borrows never hand out more copies than exist."""
+        import threading
+        from django.db import connection
+        book = BookFactory(total_copies=5, available_copies=5)
+        users = UserFactory.create_batch(20)
+        results = []
+        barrier = threading.Barrier(len(users))
+        
+        def borrow(user):
+            # The test client collects request exceptions from every thread,
+            # so failures are read from the response status instead
+            client = APIClient(raise_request_exception=False)
+            client.force_authenticate(user=user)
+            barrier.wait()
+            try:
+                response = client.post('/api/loans/', {'book_id': book.id})
+                # SQLite reports lock contention instead of waiting: retry
+                for _ in range(50):
+                    if response.status_code != status.HTTP_500_INTERNAL_SERVER_ERROR:
+                        break
+                    response = client.post('/api/loans/', {'book_id': book.id})
+                results.append(response.status_code)
+            finally:
+                connection.close()
+        
+        threads = [threading.Thread(target=borrow, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        book.refresh_from_db()
+        assert results.count(status.HTTP_201_CREATED) == 5
+        assert results.count(status.HTTP_400_BAD_REQUEST) == 15
+        assert book.available_copies == 0
+        assert Loan.objects.filter(book=book).count() == 5
@@ -1,6 +1,13 @@
 import pytest
+from io import StringIO
 from datetime import datetime, timedelta
-from books.models import Book, Loan
+from decimal import Decimal
+from books.models import Book, BookFacetCount, Loan, Notice
+from books.facets import facet_counts, rebuild_facets
+from books.autocomplete import PrefixIndex
+from books.fuzzy import TrigramIndex, trigrams
+from books.query import parse, normalize_isbn, plan_search, Clause
+from books.search import search
 from factories import BookFactory, UserFactory
 
 
@@ -86,7 +93,7 @@ class TestLoanModel:
         # Overdue
         overdue_loan = Loan.objects.create(
             user=user,
-            book=book,
+            book=BookFactory(),
             due_date=timezone.now() - timedelta(days=1)
         )
         assert overdue_loan.is_overdue is True
@@ -103,3 +110,1245 @@ class TestLoanModel:
             status='returned'
         )
         assert loan.is_overdue is False
+    
+    def test_one_open_loan_per_user_and_book(self):
+        """Test the database refuses a second open loan of the same book."""
+        from django.db import IntegrityError, transaction
+        from django.utils import timezone
+        user = UserFactory()
+        book = BookFactory()
+        due = timezone.now() + timedelta(days=14)
+        Loan.objects.create(user=user, book=book, due_date=due, status='returned')
+        Loan.objects.create(user=user, book=book, due_date=due)
+        
+        with pytest.raises(IntegrityError), transaction.atomic():
+            Loan.objects.create(user=user, book=book, due_date=due, status='overdue')
+        assert Loan.objects.filter(user=user, book=book).count() == 2
+
+
+
+@pytest.mark.django_db
+class TestOverdueSweep:
+    """Test cases for the mark_overdue sweep."""
+    
+    def test_marks_only_past_due_active_loans(self):
+        """Test the sweep marks past-due active loans, in chunks."""
+        from django.utils import timezone
+        from books.circulation import mark_overdue
+        now = timezone.now()
+        past_due = [
+            Loan.objects.create(user=UserFactory(), book=BookFactory(), due_date=now - timedelta(days=days))
+            for days in range(1, 6)
+        ]
+        current = Loan.objects.create(user=UserFactory(), book=BookFactory(), due_date=now + timedelta(days=1))
+        returned = Loan.objects.create(
+            user=UserFactory(), book=BookFactory(), due_date=now - timedelta(days=3), status='returned'
+        )
+        
+        assert mark_overdue(chunk_size=2) == 5
+        assert set(Loan.objects.filter(status='overdue')) == set(past_due)
+        current.refresh_from_db()
+        returned.refresh_from_db()
+        assert current.status == 'active'
+        assert returned.status == 'returned'
+        assert mark_overdue() == 0
+    
+    def test_command(self):
+        """Test the mark_overdue management command."""
+        from django.core.management import call_command
+        from django.utils import timezone
+        Loan.objects.create(user=UserFactory(), book=BookFactory(), due_date=timezone.now() - timedelta(days=1))
+        out = StringIO()
+        
+        call_command('mark_overdue', stdout=out)
+        
+        assert 'Marked 1 loans overdue.' in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestNotices:
+    """Test cases for the due-soon and overdue notice digests."""
+    
+    def borrow(self, user, days, **kwargs):
+        from django.utils import timezone
+        return Loan.objects.create(
+            user=user, book=BookFactory(), due_date=timezone.now() + timedelta(days=days), **kwargs
+        )
+    
+    def test_one_digest_per_user_across_chunks(self):
+        """Test each user gets one email listing all their loans, whatever the chunk size."""
+        from django.core import mail
+        from books.notices import send_notices
+        alice, bob = UserFactory(), UserFactory()
+        alice_loans = [self.borrow(alice, -days) for days in (1, 2, 3)]
+        self.borrow(bob, -1)
+        self.borrow(bob, 1)  # not yet due
+        self.borrow(UserFactory(), -1, status='returned')
+        
+        report = send_notices('overdue', chunk_size=2)
+        
+        assert report == {'loans': 4, 'emails': 2}
+        assert sorted(message.to[0] for message in mail.outbox) == sorted([alice.email, bob.email])
+        digest = next(message for message in mail.outbox if message.to == [alice.email])
+        assert digest.subject == 'Overdue library books'
+        assert all(loan.book.title in digest.body for loan in alice_loans)
+    
+    def test_due_soon_window(self):
+        """Test due-soon notices cover loans due within NOTICE_DUE_SOON_DAYS."""
+        from django.core import mail
+        from books.notices import send_notices
+        user = UserFactory()
+        soon = self.borrow(user, 1)
+        self.borrow(user, 10)
+        self.borrow(user, -1)
+        
+        assert send_notices('due_soon') == {'loans': 1, 'emails': 1}
+        assert soon.book.title in mail.outbox[0].body
+        assert list(Notice.objects.values_list('loan', 'kind')) == [(soon.id, 'due_soon')]
+    
+    def test_rerun_sends_only_missing_notices(self):
+        """Test notices are sent once per loan and kind."""
+        from django.core import mail
+        from books.notices import send_notices
+        user = UserFactory()
+        self.borrow(user, -1)
+        send_notices('overdue')
+        self.borrow(user, -2)
+        
+        assert send_notices('overdue') == {'loans': 1, 'emails': 1}
+        assert send_notices('overdue') == {'loans': 0, 'emails': 0}
+        assert len(mail.outbox) == 2
+    
+    def test_dry_run(self):
+        """Test a dry run counts the notices without sending or recording them."""
+        from django.core import mail
+        from books.notices import send_notices
+        self.borrow(UserFactory(), -1)
+        
+        assert send_notices('overdue', dry_run=True) == {'loans': 1, 'emails': 1}
+        assert mail.outbox == []
+        assert not Notice.objects.exists()
+    
+    def test_command(self):
+        """Test the send_notices management command."""
+        from django.core.management import call_command
+        self.borrow(UserFactory(), -1)
+        self.borrow(UserFactory(), 1)
+        out = StringIO()
+        
+        call_command('send_notices', stdout=out)
+        
+        assert 'Sent 1 due_soon emails covering 1 loans.' in out.getvalue()
+        assert 'Sent 1 overdue emails covering 1 loans.' in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestFines:
+    """Test cases for the fines engine and aging report."""
+    
+    @pytest.fixture(autouse=True)
+    def fine_settings(self, settings):
+        settings.FINE_DAILY_RATE = Decimal('0.25')
+        settings.FINE_GRACE_DAYS = 0
+        settings.FINE_MAX = Decimal('10.00')
+    
+    def late_loan(self, user, days, **kwargs):
+        from django.utils import timezone
+        return Loan.objects.create(
+            user=user, book=BookFactory(), due_date=timezone.now() - timedelta(days=days, hours=1), **kwargs
+        )
+    
+    def test_fines_per_loan_and_user(self):
+        """Test fines accrue per whole day late, capped, and sum per user."""
+        from books.fines import balances, fined_loans
+        user = UserFactory()
+        one_day, capped = self.late_loan(user, 1), self.late_loan(user, 100)
+        self.late_loan(UserFactory(), -3)  # not yet due
+        
+        fines = dict(fined_loans().values_list('id', 'fine_cents'))
+        
+        assert fines == {one_day.id: 25, capped.id: 1000}
+        assert list(balances().values('user_id', 'loans', 'balance_cents')) == [
+            {'user_id': user.id, 'loans': 2, 'balance_cents': 1025}
+        ]
+    
+    def test_returned_loans_are_fined_to_their_return_date(self):
+        """Test a loan returned late keeps the fine accrued until it came back."""
+        from django.utils import timezone
+        from books.fines import fined_loans
+        loan = self.late_loan(UserFactory(), 10, status='returned',
+                              return_date=timezone.now() - timedelta(days=6))
+        self.late_loan(UserFactory(), 10, status='returned', return_date=timezone.now() - timedelta(days=11))
+        
+        assert list(fined_loans().values_list('id', 'fine_cents')) == [(loan.id, 100)]
+    
+    def test_grace_period(self, settings):
+        """Test days within the grace period are not fined."""
+        from books.fines import fined_loans
+        settings.FINE_GRACE_DAYS = 3
+        self.late_loan(UserFactory(), 2)
+        loan = self.late_loan(UserFactory(), 5)
+        
+        assert list(fined_loans().values_list('id', 'fine_cents')) == [(loan.id, 50)]
+    
+    def test_aging_report(self):
+        """Test open overdue loans are bucketed by days overdue in one query."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from books.fines import aging_report
+        user = UserFactory()
+        for days in (0, 7, 8, 30, 31):
+            self.late_loan(user, days)
+        self.late_loan(UserFactory(), 90, status='returned')
+        
+        with CaptureQueriesContext(connection) as queries:
+            report = aging_report()
+        
+        assert len(queries) == 1
+        assert report == [
+            {'bucket': '0-7', 'loans': 2, 'patrons': 1, 'fines': Decimal('1.75')},
+            {'bucket': '8-30', 'loans': 2, 'patrons': 1, 'fines': Decimal('9.50')},
+            {'bucket': '31+', 'loans': 1, 'patrons': 1, 'fines': Decimal('7.75')},
+        ]
+
+
+@pytest.mark.django_db
+class TestLibraryStats:
+    """Test cases for the admin dashboard statistics."""
+    
+    def test_refresh_stats(self):
+        """Test the summary row counts books, loans and users, and is computed on first read."""
+        from django.utils import timezone
+        from books.stats import current_stats, refresh_stats
+        user = UserFactory()
+        BookFactory(total_copies=3, available_copies=2)
+        BookFactory(total_copies=1, available_copies=0)
+        Loan.objects.create(user=user, book=BookFactory(), due_date=timezone.now() - timedelta(days=1))
+        
+        stats = current_stats()
+        
+        assert (stats.total_books, stats.available_books, stats.overdue_loans, stats.total_users) == (3, 2, 1, 1)
+        assert (stats.total_copies, stats.available_copies) == (3 + 1 + 5, 2 + 0 + 5)
+        BookFactory()
+        assert current_stats().total_books == 3
+        assert refresh_stats().total_books == 4
+
+
+@pytest.mark.django_db
+class TestCirculationRollups:
+    """Test cases for the daily circulation rollups."""
+    
+    def rollup(self, dimension='all', key=''):
+        from books.models import CirculationDay
+        return {
+            row.day: (row.borrows, row.returns, row.overdues, row.unique_borrowers)
+            for row in CirculationDay.objects.filter(dimension=dimension, key=key)
+        }
+    
+    def test_borrow_return_and_sweep_update_rollups(self, django_capture_on_commit_callbacks):
+        """Test borrows, returns and overdues are counted as they happen, per slice."""
+        from django.utils import timezone
+        from books.circulation import borrow_books, mark_overdue, return_loans
+        from books.rollups import cohort
+        user, other = UserFactory(), UserFactory()
+        fiction = [BookFactory(category='Fiction') for _ in range(3)]
+        today = timezone.localdate()
+        
+        # Each borrow and return records its rollups once it commits
+        with django_capture_on_commit_callbacks(execute=True):
+            results = borrow_books(user, [book.id for book in fiction[:2]])
+        with django_capture_on_commit_callbacks(execute=True):
+            borrow_books(user, [fiction[2].id])
+        with django_capture_on_commit_callbacks(execute=True):
+            borrow_books(other, [fiction[0].id])
+        with django_capture_on_commit_callbacks(execute=True):
+            return_loans([results[0]['loan_id']])
+        Loan.objects.filter(id=results[1]['loan_id']).update(due_date=timezone.now() - timedelta(days=2))
+        mark_overdue()
+        
+        overdue_day = today - timedelta(days=2)
+        assert self.rollup() == {today: (4, 1, 0, 2), overdue_day: (0, 0, 1, 0)}
+        assert self.rollup('category', 'Fiction')[today] == (4, 1, 0, 2)
+        assert self.rollup('book', str(fiction[0].id)) == {today: (2, 1, 0, 2)}
+        assert self.rollup('cohort', cohort(user.date_joined))[today][0] == 4
+    
+    def test_next_midnight_is_another_day(self):
+        """Test a loan at the next local midnight is not one of the day's earlier loans."""
+        from django.utils import timezone
+        from books.rollups import day_range, record_borrows
+        user, book = UserFactory(), BookFactory(category='Fiction')
+        today = timezone.localdate()
+        loan = Loan.objects.create(user=user, book=BookFactory(category='Fiction'), due_date=timezone.now())
+        Loan.objects.filter(pk=loan.pk).update(borrowed_date=day_range(today)[1])
+        
+        record_borrows(user, [(book.id, book.category)], timezone.now())
+        
+        assert self.rollup('category', 'Fiction') == {today: (1, 0, 0, 1)}
+    
+    def test_backfill_matches_incremental_rollups(self, django_capture_on_commit_callbacks):
+        """Test the backfill rebuilds the same rows from the loan history."""
+        from books.circulation import borrow_books, return_loans
+        from books.models import CirculationDay
+        from books.rollups import backfill_rollups
+        users = [UserFactory() for _ in range(3)]
+        books = [BookFactory(category=category) for category in ('Fiction', 'History', 'Fiction')]
+        for user in users:
+            with django_capture_on_commit_callbacks(execute=True):
+                results = borrow_books(user, [book.id for book in books])
+        with django_capture_on_commit_callbacks(execute=True):
+            return_loans([result['loan_id'] for result in results])
+        fields = ('day', 'dimension', 'key', 'borrows', 'returns', 'overdues', 'unique_borrowers')
+        incremental = set(CirculationDay.objects.values_list(*fields))
+        CirculationDay.objects.all().delete()
+        
+        windows = list(backfill_rollups(window_days=1))
+        
+        assert set(CirculationDay.objects.values_list(*fields)) == incremental
+        assert sum(rows for _, _, rows in windows) == len(incremental)
+    
+    def test_trend_series_resolutions(self):
+        """Test daily rows are summed per week and month."""
+        import datetime as dt
+        from books.models import CirculationDay
+        from books.rollups import trend_series
+        CirculationDay.objects.bulk_create([
+            CirculationDay(day=dt.date(2024, 1, day), dimension='all', borrows=day, unique_borrowers=1)
+            for day in (1, 2, 8, 31)
+        ] + [CirculationDay(day=dt.date(2024, 2, 1), dimension='all', borrows=5, returns=2)])
+        
+        weeks = trend_series('week', start=dt.date(2024, 1, 1), end=dt.date(2024, 1, 31))
+        months = trend_series('month')
+        
+        assert [(row['period'], row['borrows']) for row in weeks] == [
+            (dt.date(2024, 1, 1), 3), (dt.date(2024, 1, 8), 8), (dt.date(2024, 1, 29), 31),
+        ]
+        assert [(row['period'], row['borrows'], row['returns'], row['unique_borrowers']) for row in months] == [
+            (dt.date(2024, 1, 1), 42, 0, 4), (dt.date(2024, 2, 1), 5, 2, 0),
+        ]
+    
+    def test_backfill_command(self):
+        """Test the backfill_circulation management command."""
+        from django.core.management import call_command
+        from books.circulation import borrow_books
+        borrow_books(UserFactory(), [BookFactory().id])
+        out = StringIO()
+        
+        call_command('backfill_circulation', stdout=out)
+        
+        assert 'Wrote 4 rollup rows.' in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestRelatedBooks:
+    """Test cases for the co-borrowing related books."""
+    
+    def borrow(self, user, *books):
+        from django.utils import timezone
+        for book in books:
+            Loan.objects.create(user=user, book=book, due_date=timezone.now(), status='returned')
+    
+    def related(self, book):
+        from books.models import RelatedBook
+        return [
+            (row.related_id, round(row.score, 3))
+            for row in RelatedBook.objects.filter(book=book).order_by('rank')
+        ]
+    
+    def test_cosine_similarity_of_borrowers(self, settings):
+        """Test related books are ranked by the cosine of their borrower sets."""
+        from books.related import update_related_books
+        settings.RELATED_MIN_COBORROWERS = 1
+        a, b, c, d = (BookFactory() for _ in range(4))
+        u1, u2, u3 = UserFactory(), UserFactory(), UserFactory()
+        self.borrow(u1, a, b, c)
+        self.borrow(u2, a, b)
+        self.borrow(u3, c, d)
+        
+        run = update_related_books(k=2)
+        
+        assert run.full and run.books_updated == 4
+        # a: b shares 2 of 2 borrowers each, c 1 of 2 and 1 of 2
+        assert self.related(a) == [(b.id, 1.0), (c.id, 0.5)]
+        assert self.related(d) == [(c.id, 0.707)]
+    
+    def test_minimum_coborrowers(self, settings):
+        """Test pairs with fewer patrons in common than the minimum are left out."""
+        from books.related import update_related_books
+        settings.RELATED_MIN_COBORROWERS = 2
+        a, b, c = (BookFactory() for _ in range(3))
+        self.borrow(UserFactory(), a, b, c)
+        self.borrow(UserFactory(), a, b)
+        
+        update_related_books()
+        
+        assert [related for related, _ in self.related(a)] == [b.id]
+        assert self.related(c) == []
+    
+    def test_incremental_run_matches_full_rebuild(self, settings, monkeypatch):
+        """Test an incremental run recomputes the changed books like a full rebuild."""
+        from books import related
+        from books.models import RelatedBook, RelatedBooksRun
+        from books.related import update_related_books
+        settings.RELATED_MIN_COBORROWERS = 1
+        monkeypatch.setattr(related, 'RESCAN_LOANS', 0)
+        books = [BookFactory() for _ in range(5)]
+        users = [UserFactory() for _ in range(4)]
+        self.borrow(users[0], *books[:3])
+        self.borrow(users[1], *books[2:])
+        update_related_books()
+        self.borrow(users[2], books[0], books[4])
+        self.borrow(users[3], books[1], books[4])
+        
+        run = update_related_books()
+        # Only the books of users[2] and users[3] changed
+        changed = [books[0], books[1], books[4]]
+        incremental = {book.id: self.related(book) for book in changed}
+        update_related_books(full=True)
+        
+        assert not run.full and run.books_updated == 3
+        assert incremental == {book.id: self.related(book) for book in changed}
+        assert update_related_books() == RelatedBooksRun.objects.first()
+        assert RelatedBooksRun.objects.count() == 3
+        assert RelatedBook.objects.count() > 0
+    
+    def test_incremental_run_rescans_late_loans(self, settings):
+        """Test loans committed after a run that counted higher ids are picked up."""
+        from django.db.models import F
+        from books.models import RelatedBooksRun
+        from books.related import update_related_books
+        settings.RELATED_MIN_COBORROWERS = 1
+        a, b, c, d = (BookFactory() for _ in range(4))
+        self.borrow(UserFactory(), a, b)
+        update_related_books()
+        self.borrow(UserFactory(), c, d)
+        # As if the run had seen a higher id while these loans were uncommitted
+        RelatedBooksRun.objects.update(last_loan_id=F('last_loan_id') + 2)
+        self.borrow(UserFactory(), a, d)
+        
+        run = update_related_books()
+        
+        assert not run.full
+        assert [related for related, _ in self.related(c)] == [d.id]
+    
+    def test_periodic_full_rebuild(self, settings):
+        """Test an incremental run turns full once the last full run is old enough."""
+        from books.related import update_related_books
+        a, b = BookFactory(), BookFactory()
+        self.borrow(UserFactory(), a, b)
+        update_related_books()
+        self.borrow(UserFactory(), a, b)
+        settings.RELATED_BOOKS_FULL_INTERVAL = 0
+        
+        assert update_related_books().full
+
+
+@pytest.mark.django_db
+class TestSimilarBooks:
+    """Test cases for the content-based similar books index."""
+    
+    def similar(self, book):
+        from books.similar import similar_book_ids
+        return [book_id for book_id, _ in similar_book_ids(book.id)]
+    
+    def age(self):
+        """Move every book's last save back past the build overlap."""
+        from django.db.models import F
+        Book.objects.update(updated_at=F('updated_at') - timedelta(hours=1))
+    
+    def test_neighbours_share_terms(self):
+        """Test books are ranked by the cosine of their TF-IDF vectors."""
+        from books.similar import build_similar_books, similar_book_ids
+        dragons = BookFactory(title='Dragon Riders', author='Ann Lee', category='Fantasy',
+                              description='A dragon tale of riders and castles')
+        sequel = BookFactory(title='Dragon Riders Return', author='Ann Lee', category='Fantasy',
+                             description='The dragon riders fly again')
+        castles = BookFactory(title='Castles of Europe', author='Bo Chen', category='History',
+                              description='A history of castles')
+        cooking = BookFactory(title='Quick Soups', author='Cy Diaz', category='Cooking',
+                              description='Soups in minutes')
+        
+        result = build_similar_books(k=2)
+        
+        assert result == {'full': True, 'books_updated': 4, 'books': 4}
+        assert self.similar(dragons) == [sequel.id, castles.id]
+        assert self.similar(cooking) == []
+        assert 0 < similar_book_ids(dragons.id)[0][1] <= 1
+        assert similar_book_ids(999999) == []
+    
+    def test_incremental_build_matches_full_for_changed_books(self):
+        """Test an incremental build recomputes edited, new and deleted books."""
+        from books.similar import build_similar_books
+        books = [
+            BookFactory(title=title, author='Ann Lee', category='Fiction', description=description)
+            for title, description in (
+                ('Winter Garden', 'snow garden roses'),
+                ('Summer Garden', 'sun garden roses'),
+                ('Ocean Storm', 'waves storm ships'),
+                ('River Storm', 'rain storm river'),
+            )
+        ]
+        build_similar_books()
+        self.age()
+        books[0].description = 'waves ships ocean'
+        books[0].save()
+        books[3].delete()
+        added = BookFactory(title='Rose Garden', author='Ann Lee', category='Fiction',
+                            description='roses garden sun')
+        
+        result = build_similar_books()
+        incremental = {book.id: set(self.similar(book)) for book in (books[0], added)}
+        
+        # The deleted book left the lists through the cascade
+        assert not result['full'] and result['books_updated'] == 2
+        assert books[3].id not in self.similar(books[1]) + self.similar(books[2])
+        assert added.id in self.similar(books[1])
+        self.age()
+        assert build_similar_books()['books_updated'] == 0
+        build_similar_books(full=True)
+        # The full build refits the IDF, which may reorder close scores
+        assert incremental == {book.id: set(self.similar(book)) for book in (books[0], added)}
+    
+    def test_sparse_ids(self):
+        """Test a far-apart book id costs nothing extra: lists are kept by position, not id."""
+        from books.models import SimilarBooksIndex
+        from books.similar import build_similar_books
+        near = BookFactory(title='Dragon Riders', description='dragons and riders')
+        far = BookFactory(id=2 ** 40, title='Dragon Riders Return', description='dragons and riders again')
+        
+        build_similar_books()
+        
+        assert self.similar(near) == [far.id]
+        assert self.similar(far) == [near.id]
+        assert len(SimilarBooksIndex.objects.get().data) < 10000
+    
+    def test_periodic_full_build(self, settings):
+        """Test a build turns full, refitting the vocabulary, once the last full build is old enough."""
+        from books.similar import build_similar_books
+        BookFactory(title='Winter Garden', author='Ann Lee', category='Fiction', description='snow roses')
+        build_similar_books()
+        first = BookFactory(title='Quilting Basics', author='Bo Chen', category='Crafts', description='patchwork')
+        second = BookFactory(title='Quilting Patterns', author='Cy Diaz', category='Hobbies', description='stitches')
+        
+        assert not build_similar_books()['full']
+        assert self.similar(first) == []
+        settings.SIMILAR_BOOKS_FULL_INTERVAL = 0
+        assert build_similar_books()['full']
+        # "quilting" was not in the vocabulary until the full build
+        assert self.similar(first) == [second.id]
+
+    def test_incremental_build_rewrites_only_changed_lists(self):
+        """Test the stored lists of books untouched by a change are left in place."""
+        from books.models import SimilarBook
+        from books.similar import build_similar_books
+        dragons = BookFactory(title='Dragon Riders', author='Ann Lee', category='Fantasy',
+                              description='dragons riders castles')
+        BookFactory(title='Dragon Riders Return', author='Ann Lee', category='Fantasy',
+                    description='dragons riders again')
+        castles = BookFactory(title='Castles of Europe', author='Bo Chen', category='History',
+                              description='history of castles')
+        forts = BookFactory(title='Forts of Europe', author='Bo Chen', category='History',
+                            description='history of forts')
+        build_similar_books()
+        kept = list(SimilarBook.objects.filter(book=forts).values_list('id', 'similar_id'))
+        dragons.description = 'dragons riders skies'
+        dragons.save()
+    
+        build_similar_books()
+    
+        assert list(SimilarBook.objects.filter(book=forts).values_list('id', 'similar_id')) == kept
+        assert castles.id not in self.similar(dragons)
+    
+    def test_incremental_build_rereads_the_overlap(self):
+        """Test a book committed after a build started, with an earlier updated_at, is picked up."""
+        from books.models import SimilarBooksIndex
+        from books.similar import build_similar_books
+        dragons = BookFactory(title='Dragon Riders', description='dragons riders castles')
+        build_similar_books()
+        self.age()
+        late = BookFactory(title='Dragon Riders Return', description='dragons riders again')
+        built_at = SimilarBooksIndex.objects.get().built_at
+        Book.objects.filter(pk=late.pk).update(updated_at=built_at - timedelta(seconds=30))
+        
+        assert build_similar_books()['books_updated'] == 1
+        assert self.similar(dragons) == [late.id]
+
+
+@pytest.mark.django_db
+class TestPopularity:
+    """Test cases for the time-decayed popularity."""
+    
+    def test_borrow_weight_halves_per_half_life(self, settings):
+        """Test a borrow counts half as much after each half-life."""
+        from django.utils import timezone
+        from books.popularity import borrow_weight, decayed
+        settings.POPULARITY_HALF_LIFE_DAYS = 7
+        now = timezone.now()
+        
+        assert decayed(borrow_weight(now), now) == pytest.approx(1)
+        assert decayed(borrow_weight(now - timedelta(days=7)), now) == pytest.approx(0.5)
+        assert decayed(borrow_weight(now - timedelta(days=14)), now) == pytest.approx(0.25)
+    
+    def test_borrows_update_popularity(self):
+        """Test single and batch borrows add to the popularity in their UPDATE."""
+        from books.circulation import borrow_books
+        from books.popularity import decayed
+        book, other = BookFactory(available_copies=3), BookFactory(available_copies=3)
+        
+        borrow_books(UserFactory(), [book.id, other.id])
+        borrow_books(UserFactory(), [book.id])
+        
+        book.refresh_from_db()
+        other.refresh_from_db()
+        assert decayed(book.popularity) == pytest.approx(2, rel=1e-3)
+        assert decayed(other.popularity) == pytest.approx(1, rel=1e-3)
+    
+    def test_rebuild_matches_history(self):
+        """Test rebuilding from the loans gives each borrow its decayed weight."""
+        from django.utils import timezone
+        from books.popularity import decayed, rebuild_popularity
+        book, idle = BookFactory(), BookFactory()
+        Book.objects.filter(pk=idle.pk).update(popularity=5)
+        now = timezone.now()
+        for days in (0, 7):
+            loan = Loan.objects.create(user=UserFactory(), book=book, due_date=now, status='returned')
+            Loan.objects.filter(pk=loan.pk).update(borrowed_date=now - timedelta(days=days))
+        
+        assert rebuild_popularity() == 1
+        
+        book.refresh_from_db()
+        idle.refresh_from_db()
+        assert decayed(book.popularity, now) == pytest.approx(1.5)
+        assert idle.popularity == 0
+
+
+    def test_rebase_keeps_decayed_scores(self, settings):
+        """Test moving the epoch forward rescales scores without changing their decayed value."""
+        from django.utils import timezone
+        from books.models import PopularityEpoch
+        from books.popularity import REBASE_AFTER, borrow_weight, current_epoch, decayed, rebase_popularity
+        settings.POPULARITY_HALF_LIFE_DAYS = 1
+        now = timezone.now()
+        PopularityEpoch.objects.filter(pk=1).update(value=(now - timedelta(days=REBASE_AFTER - 1)).timestamp())
+        book = BookFactory()
+        Book.objects.filter(pk=book.pk).update(popularity=3 * borrow_weight(now - timedelta(days=2)))
+        assert not rebase_popularity(now)
+        
+        PopularityEpoch.objects.filter(pk=1).update(value=(now - timedelta(days=REBASE_AFTER + 1)).timestamp())
+        Book.objects.filter(pk=book.pk).update(popularity=3 * borrow_weight(now - timedelta(days=2)))
+        assert rebase_popularity(now)
+        
+        assert current_epoch() == pytest.approx(now.timestamp())
+        book.refresh_from_db()
+        assert book.popularity == pytest.approx(0.75)
+        assert decayed(book.popularity, now) == pytest.approx(0.75)
+    
+    def test_borrows_survive_a_short_half_life(self, settings):
+        """Test a half-life far shorter than the epoch's age only needs a rebase, not a crash."""
+        from books.circulation import borrow_books
+        from books.models import PopularityEpoch
+        from books.popularity import EPOCH, decayed, rebase_popularity
+        settings.POPULARITY_HALF_LIFE_DAYS = 0.25
+        PopularityEpoch.objects.filter(pk=1).update(value=EPOCH.timestamp())
+        book = BookFactory(available_copies=2)
+        Book.objects.filter(pk=book.pk).update(popularity=1e300)
+        
+        assert rebase_popularity()
+        borrow_books(UserFactory(), [book.id])
+        
+        book.refresh_from_db()
+        assert decayed(book.popularity) == pytest.approx(1, rel=1e-3)
+    
+    def test_half_life_checked_against_rebase_interval(self, settings):
+        """Test a half-life too short for the rebase interval is refused."""
+        from django.core.exceptions import ImproperlyConfigured
+        from books.popularity import check_half_life
+        settings.POPULARITY_REBASE_INTERVAL = 86400
+        settings.POPULARITY_HALF_LIFE_DAYS = 0.5
+        check_half_life()
+        
+        settings.POPULARITY_HALF_LIFE_DAYS = 0.001
+        with pytest.raises(ImproperlyConfigured):
+            check_half_life()
+        settings.POPULARITY_HALF_LIFE_DAYS = 0
+        with pytest.raises(ImproperlyConfigured):
+            check_half_life()
+
+
+@pytest.mark.django_db
+class TestLoanArchive:
+    """Test cases for archiving old returned loans."""
+    
+    def loan(self, days_ago, status='returned'):
+        from django.utils import timezone
+        when = timezone.now() - timedelta(days=days_ago)
+        return Loan.objects.create(
+            user=UserFactory(), book=BookFactory(), due_date=when, status=status,
+            return_date=when if status == 'returned' else None,
+        )
+    
+    def test_moves_old_returned_loans_in_chunks(self):
+        """Test only loans returned before the cutoff move, with their ids, a chunk at a time."""
+        from books.archive import archive_loans
+        from books.models import ArchivedLoan, LoanHistory
+        old = [self.loan(400) for _ in range(3)]
+        recent, open_loan = self.loan(10), self.loan(400, status='overdue')
+        Notice.objects.create(loan=old[0], kind='overdue')
+        before = list(LoanHistory.objects.order_by('id').values_list('id', 'user_id', 'book_id', 'status', 'return_date'))
+        
+        assert list(archive_loans(days=365, chunk_size=2)) == [2, 1]
+        
+        assert set(Loan.objects.values_list('id', flat=True)) == {recent.id, open_loan.id}
+        assert set(ArchivedLoan.objects.values_list('id', flat=True)) == {loan.id for loan in old}
+        assert not Notice.objects.exists()
+        assert list(LoanHistory.objects.order_by('id').values_list('id', 'user_id', 'book_id', 'status', 'return_date')) == before
+        assert list(archive_loans(days=365)) == []
+    
+    def test_history_readers_include_archive(self):
+        """Test statistics and fines still count archived loans."""
+        from books.archive import archive_loans
+        from books.fines import fined_loans
+        from books.stats import compute_stats
+        late = self.loan(400)
+        Loan.objects.filter(pk=late.pk).update(due_date=late.return_date - timedelta(days=2))
+        
+        list(archive_loans(days=365))
+        
+        assert not Loan.objects.exists()
+        assert compute_stats()['returned_loans'] == 1
+        assert list(fined_loans().values_list('id', flat=True)) == [late.id]
+
+
+@pytest.mark.django_db
+class TestFullTextSearch:
+    """Test cases for the full-text search index."""
+    
+    def test_index_follows_save_and_delete(self):
+        """Test the index is kept in sync on save and delete."""
+        book = BookFactory(title='Gardening Handbook')
+        assert [b.id for b in search('gardening')[0:10]] == [book.id]
+        
+        book.title = 'Beekeeping Handbook'
+        book.save()
+        assert search('gardening').count() == 0
+        assert search('beekeeping').count() == 1
+        
+        book.delete()
+        assert search('beekeeping').count() == 0
+    
+    def test_index_follows_bulk_writes(self):
+        """Test bulk_create and queryset updates are indexed."""
+        Book.objects.bulk_create([
+            Book(title=f'Astronomy {i}', author='Sagan', isbn=f'97800000000{i:02d}',
+                 page_count=100, category='Science')
+            for i in range(3)
+        ])
+        assert search('astronomy').count() == 3
+        
+        Book.objects.filter(author='Sagan').update(category='Cosmology')
+        assert search('cosmology').count() == 3
+        assert search('science').count() == 0
+    
+    def test_prefix_and_isbn_matches(self):
+        """Test word prefixes and ISBNs match."""
+        book = BookFactory(title='Programming Pearls', isbn='9780201657883')
+        assert [b.id for b in search('program')[0:10]] == [book.id]
+        assert [b.id for b in search('9780201657883')[0:10]] == [book.id]
+    
+    def test_punctuation_only_query(self):
+        """Test queries without any words return no results."""
+        BookFactory()
+        assert search('"*:').count() == 0
+    
+    def test_match_queries_agree_across_backends(self, monkeypatch):
+        """Test every backend prefix-matches words and requires only the words it indexes."""
+        from types import SimpleNamespace
+        from books import search as search_module
+        from books.search import FullTextResults
+        monkeypatch.setattr(search_module, 'mysql_fulltext_rules', lambda conn: (3, frozenset({'the'})))
+        query = 'the go "silent ocean" program'
+        
+        def params(vendor):
+            return FullTextResults(query, conn=SimpleNamespace(vendor=vendor))._match_sql()[1]
+        
+        assert params('sqlite') == ['"the"* "go"* "silent ocean" "program"*']
+        assert params('postgresql') == ['the:* & go:* & (silent <-> ocean) & program:*']
+        assert params('mysql') == ['the* go* +"silent ocean" +program*']
+
+
+class TestSearchQueryParser:
+    """Test cases for the search query parser."""
+    
+    def test_parse_qualifiers_and_phrases(self):
+        """Test qualifiers, phrases and free text are split into clauses."""
+        assert parse('author:tolkien "the hobbit" dragons') == [
+            Clause('author', 'tolkien', False),
+            Clause(None, 'the hobbit', True),
+            Clause(None, 'dragons', False),
+        ]
+        assert parse('category:"Science Fiction"') == [Clause('category', 'Science Fiction', True)]
+    
+    def test_unknown_qualifier_is_free_text(self):
+        """Test unknown qualifiers are kept as free text."""
+        assert parse('foo:bar') == [Clause(None, 'foo:bar', False)]
+    
+    def test_normalize_isbn(self):
+        """Test ISBN-10/13 normalization and conversion."""
+        assert normalize_isbn('0-201-65788-0') == ['0201657880', '9780201657883']
+        assert normalize_isbn('978-0-201-65788-3') == ['9780201657883', '0201657880']
+        assert normalize_isbn('9780000000001') == ['9780000000001']
+        assert normalize_isbn('python') is None
+
+
+@pytest.mark.django_db
+class TestSearchQueryPlanner:
+    """Test cases for the search query planner."""
+    
+    def test_isbn_fast_path(self):
+        """Test a bare ISBN uses the exact ISBN lookup."""
+        book = BookFactory(isbn='9780201657883')
+        plan = plan_search('0-201-65788-0')
+        assert plan.explain() == 'isbn'
+        assert list(plan.results()) == [book]
+    
+    def test_prefix_and_exact_paths(self):
+        """Test qualified words use prefix matches and quoted values exact matches."""
+        book = BookFactory(author='Tolkien', category='Science Fiction')
+        BookFactory(author='Pratchett', category='Science Fiction')
+        
+        plan = plan_search('author:tolk category:"science fiction"')
+        assert plan.explain() == 'prefix+exact'
+        assert list(plan.results()) == [book]
+    
+    def test_prefix_and_exact_paths_use_indexes(self):
+        """Test case-insensitive prefix and exact matches search an index instead of scanning."""
+        from django.db import connection
+        if connection.vendor != 'sqlite':
+            pytest.skip('Checks the SQLite query plan.')
+        for query, index in (('author:tolk', 'books_book_author_ci_idx'),
+                             ('category:"science fiction"', 'books_book_category_ci_idx')):
+            sql, params = plan_search(query).results().query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = ' '.join(row[-1] for row in cursor.fetchall())
+            assert f'SEARCH books_book USING INDEX {index}' in plan
+    
+    def test_qualifiers_combine_with_fulltext(self):
+        """Test qualified clauses restrict the full-text matches."""
+        book = BookFactory(title='Dragon Tales', author='Smith')
+        BookFactory(title='Dragon Lore', author='Jones')
+        
+        plan = plan_search('author:smith dragon')
+        assert plan.explain() == 'prefix+fulltext'
+        assert [b.id for b in plan.results()[0:10]] == [book.id]
+    
+    def test_phrase_search(self):
+        """Test quoted phrases match words in order."""
+        book = BookFactory(title='The Silent Ocean', description='')
+        BookFactory(title='Ocean Silent', description='')
+        
+        plan = plan_search('"silent ocean"')
+        assert [b.id for b in plan.results()[0:10]] == [book.id]
+
+
+class TestTrigramIndex:
+    """Test cases for the in-process trigram index."""
+    
+    def test_trigrams_are_padded_per_word(self):
+        """Test trigram extraction matches pg_trgm padding."""
+        assert trigrams('Cat') == {'  c', ' ca', 'cat', 'at '}
+        assert trigrams('') == set()
+    
+    def test_search_tolerates_typos(self):
+        """Test misspelled names still match, best first."""
+        index = TrigramIndex()
+        index.add(1, 'The Hobbit', 'J. R. R. Tolkien')
+        index.add(2, 'Mort', 'Terry Pratchett')
+        
+        assert [pk for pk, _ in index.search('tolkein', threshold=0.4)] == [1]
+        assert [pk for pk, _ in index.search('pratchet', fields=('author',))] == [2]
+        assert index.search('pratchet', fields=('title',)) == []
+    
+    def test_discard_and_replace(self):
+        """Test re-adding replaces and discarding removes a document."""
+        index = TrigramIndex()
+        index.add(1, 'Dune', 'Frank Herbert')
+        index.add(1, 'Emma', 'Jane Austen')
+        assert index.search('herbert') == []
+        assert [pk for pk, _ in index.search('austen')] == [1]
+        
+        index.discard(1)
+        assert index.search('austen') == []
+        assert index.postings == {}
+
+
+@pytest.mark.django_db
+class TestTrigramIndexSync:
+    """Test cases for refreshing the trigram index from the database."""
+    
+    def test_incremental_sync(self):
+        """Test only books updated since the last sync are pulled."""
+        index = TrigramIndex()
+        book = BookFactory(title='Neuromancer', author='William Gibson')
+        index.sync(force=True)
+        assert [pk for pk, _ in index.search('neuromanser')] == [book.id]
+        
+        book.title = 'Count Zero'
+        book.save()
+        other = BookFactory(title='Snow Crash', author='Neal Stephenson')
+        index.sync(force=True)
+        assert index.search('neuromanser') == []
+        assert [pk for pk, _ in index.search('snow crsh')] == [other.id]
+
+    def test_sync_rereads_the_overlap(self):
+        """Test a book committed late with an older updated_at is still pulled."""
+        index = TrigramIndex()
+        BookFactory(title='Neuromancer', author='William Gibson')
+        index.sync(force=True)
+        late = BookFactory(title='Snow Crash', author='Neal Stephenson')
+        Book.objects.filter(pk=late.pk).update(updated_at=index.synced_until - timedelta(seconds=30))
+
+        index.sync(force=True)
+        assert [pk for pk, _ in index.search('snow crsh')] == [late.id]
+
+    def test_periodic_rebuild(self, settings):
+        """Test edits that skip updated_at and deletions are reconciled by a rebuild."""
+        index = TrigramIndex()
+        book = BookFactory(title='Neuromancer', author='William Gibson')
+        gone = BookFactory(title='Snow Crash', author='Neal Stephenson')
+        Book.objects.filter(pk=book.pk).update(updated_at=book.updated_at - timedelta(hours=1))
+        index.sync(force=True)
+        Book.objects.filter(pk=book.pk).update(title='Count Zero')
+        Book.objects.filter(pk=gone.pk).delete()
+
+        index.sync(force=True)
+        assert [pk for pk, _ in index.search('neuromanser')] == [book.id]
+
+        settings.FUZZY_INDEX_REBUILD_SECONDS = 0
+        index.sync()
+        assert index.search('neuromanser') == []
+        assert [pk for pk, _ in index.search('count zer')] == [book.id]
+        assert index.search('snow crsh') == []
+    
+    def test_rebuild_does_not_block_searches(self, settings, monkeypatch):
+        """Test searches are served from the old index while a rebuild runs."""
+        import threading
+        from books import fuzzy
+        index = TrigramIndex()
+        book = BookFactory(title='Neuromancer', author='William Gibson')
+        index.sync(force=True)
+        calls, results = [], []
+        
+        def search_meanwhile(text):
+            if not calls:
+                calls.append(text)
+                thread = threading.Thread(target=lambda: results.append(index.search('neuromanser')))
+                thread.start()
+                thread.join(timeout=5)
+            return trigrams(text)
+        monkeypatch.setattr(fuzzy, 'trigrams', search_meanwhile)
+        settings.FUZZY_INDEX_REBUILD_SECONDS = 0
+        index.sync()
+        
+        assert [[pk for pk, _ in result] for result in results] == [[book.id]]
+
+
+class TestPrefixIndex:
+    """Test cases for the autocomplete prefix index."""
+    
+    def test_suggest_ranks_by_count(self):
+        """Test suggestions match prefixes and rank by number of books."""
+        index = PrefixIndex()
+        index.add(1, 'Dune', 'Frank Herbert')
+        index.add(2, 'Dune Messiah', 'Frank Herbert')
+        index.add(3, 'Dubliners', 'James Joyce')
+        
+        assert [s['text'] for s in index.suggest('du')] == ['Dubliners', 'Dune', 'Dune Messiah']
+        assert index.suggest('fra') == [{'text': 'Frank Herbert', 'type': 'author', 'count': 2}]
+        assert index.suggest('herb') == [{'text': 'Frank Herbert', 'type': 'author', 'count': 2}]
+        assert [s['text'] for s in index.suggest('du', limit=1)] == ['Dubliners']
+    
+    def test_suggest_is_case_and_accent_insensitive(self):
+        """Test prefixes are normalized."""
+        index = PrefixIndex()
+        index.add(1, 'Les Misérables', 'Victor Hugo')
+        assert [s['text'] for s in index.suggest('LES MISE')] == ['Les Misérables']
+    
+    def test_update_and_discard(self):
+        """Test changed and deleted books leave the index."""
+        index = PrefixIndex()
+        index.add(1, 'Emma', 'Jane Austen')
+        index.add(1, 'Persuasion', 'Jane Austen')
+        assert index.suggest('emm') == []
+        assert [s['text'] for s in index.suggest('pers')] == ['Persuasion']
+        
+        index.discard(1)
+        assert index.suggest('jane') == []
+        assert index.entries == []
+
+
+@pytest.mark.django_db
+class TestPrefixIndexSync:
+    """Test cases for refreshing the autocomplete index from the database."""
+    
+    def test_incremental_sync(self):
+        """Test the index picks up new and updated books."""
+        index = PrefixIndex()
+        book = BookFactory(title='Solaris', author='Stanislaw Lem')
+        index.sync()
+        assert [s['text'] for s in index.suggest('sol')] == ['Solaris']
+        
+        book.title = 'The Cyberiad'
+        book.save()
+        BookFactory(title='Solaris Rising', author='Ian Whates')
+        index.sync(force=True)
+        assert [s['text'] for s in index.suggest('sol')] == ['Solaris Rising']
+        assert [s['text'] for s in index.suggest('the cy')] == ['The Cyberiad']
+    
+    def test_rebuild_does_not_block_suggestions(self, settings, monkeypatch):
+        """Test suggestions are served from the old arrays while a rebuild runs."""
+        import threading
+        from books import autocomplete
+        index = PrefixIndex()
+        BookFactory(title='Solaris', author='Stanislaw Lem')
+        index.sync()
+        book_terms = autocomplete.book_terms
+        calls, results = [], []
+        
+        def suggest_meanwhile(title, author):
+            if not calls:
+                calls.append(title)
+                thread = threading.Thread(target=lambda: results.append(index.suggest('sol')))
+                thread.start()
+                thread.join(timeout=5)
+            return book_terms(title, author)
+        monkeypatch.setattr(autocomplete, 'book_terms', suggest_meanwhile)
+        settings.AUTOCOMPLETE_REBUILD_SECONDS = 0
+        index.sync()
+        
+        assert [[s['text'] for s in result] for result in results] == [['Solaris']]
+
+
+@pytest.mark.django_db
+class TestFacetCounts:
+    """Test cases for the maintained facet buckets."""
+    
+    def buckets(self):
+        return {
+            (b.category, b.language, b.available): b.count
+            for b in BookFacetCount.objects.filter(count__gt=0)
+        }
+    
+    def assert_in_sync(self):
+        assert self.buckets() == dict(facet_counts(Book.objects.all()))
+    
+    def test_save_and_delete(self):
+        """Test saves move books between buckets and deletes remove them."""
+        book = BookFactory(category='Fiction', language='English', available_copies=1)
+        assert self.buckets() == {('Fiction', 'English', True): 1}
+        
+        book.available_copies = 0
+        book.save()
+        assert self.buckets() == {('Fiction', 'English', False): 1}
+        
+        book = Book.objects.only('id', 'title').get(pk=book.pk)
+        book.category = 'Poetry'
+        book.save()
+        assert self.buckets() == {('Poetry', 'English', False): 1}
+        
+        Book.objects.get(pk=book.pk).delete()
+        assert self.buckets() == {}
+    
+    def test_bulk_create_and_update(self):
+        """Test bulk paths keep the buckets in sync."""
+        Book.objects.bulk_create([
+            Book(title=f'Book {i}', author='A', isbn=f'97811111111{i:02d}', page_count=10,
+                 category='Science', language='French', available_copies=1)
+            for i in range(4)
+        ])
+        self.assert_in_sync()
+        
+        Book.objects.filter(isbn__in=['9781111111100', '9781111111101']).update(available_copies=0)
+        self.assert_in_sync()
+        
+        Book.objects.filter(category='Science').update(language='German')
+        self.assert_in_sync()
+        
+        Book.objects.all().delete()
+        assert self.buckets() == {}
+    
+    def test_large_update_queues_rebuild(self, monkeypatch):
+        """Test updates of many books leave the recount to a worker."""
+        from books import facets
+        from taskqueue.models import Task
+        from taskqueue.worker import claim, run_task
+        monkeypatch.setattr(facets, 'MAX_DELTA_ROWS', 2)
+        BookFactory.create_batch(3, category='History')
+        
+        Book.objects.filter(category='History').update(category='Travel')
+        
+        task = Task.objects.get(name='books.tasks.rebuild_facets', status='queued')
+        assert ('History', 'English', True) in self.buckets()
+        assert task.id in claim('test-worker', 10)
+        assert run_task(task.id) == 'done'
+        self.assert_in_sync()
+    
+    def test_rebuild(self):
+        """Test the buckets can be recomputed from scratch."""
+        BookFactory.create_batch(3, category='History')
+        BookFacetCount.objects.all().delete()
+        rebuild_facets()
+        self.assert_in_sync()
+
+
+@pytest.mark.django_db
+class TestRowSerialization:
+    """Test the values_list() serialization path and JSON renderer."""
+    
+    def render_both(self, serializer_class, queryset):
+        from rest_framework.renderers import JSONRenderer
+        from library_project.renderers import FastJSONRenderer
+        from library_project.rows import compile_rows, serialize_rows
+        assert compile_rows(serializer_class(many=True)) is not None
+        slow = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        fast = FastJSONRenderer().render(serialize_rows(serializer_class(many=True), queryset))
+        return slow, fast
+    
+    def test_book_rows_match_serializer(self):
+        """Test book rows render to the same bytes as BookListSerializer."""
+        from books.serializers import BookListSerializer
+        BookFactory(title='Café Ünïcode', available_copies=0)
+        BookFactory.create_batch(3)
+        
+        slow, fast = self.render_both(BookListSerializer, Book.objects.order_by('id'))
+        assert fast == slow
+    
+    def test_loan_rows_match_serializer(self):
+        """Test loan rows render to the same bytes as LoanListSerializer."""
+        from books.serializers import LoanListSerializer
+        from factories import LoanFactory
+        from django.utils import timezone
+        LoanFactory(due_date=timezone.now() - timedelta(days=3))
+        LoanFactory(status='returned', return_date=timezone.now())
+        
+        slow, fast = self.render_both(LoanListSerializer, Loan.objects.order_by('id'))
+        assert fast == slow
+    
+    def test_column_override(self):
+        """Test an overridden column is serialized from its SQL expression."""
+        from django.db.models import CharField, Value
+        from books.serializers import LoanListSerializer
+        from factories import LoanFactory
+        from library_project.rows import compile_rows
+        LoanFactory(status='active')
+        plan = compile_rows(LoanListSerializer(many=True))
+    
+        rows = plan.queryset(Loan.objects.all(), overrides={'status': Value('overdue', output_field=CharField())})
+    
+        [data] = plan.serialize(rows)
+        assert data['status'] == 'overdue'
+        assert data['is_overdue'] is False
+
+    def test_nested_serializer_not_compiled(self):
+        """Test serializers with nested objects fall back to DRF."""
+        from books.serializers import LoanSerializer
+        from library_project.rows import compile_rows
+        assert compile_rows(LoanSerializer()) is None
+    
+    def test_renderer_matches_json_renderer(self):
+        """Test FastJSONRenderer output matches JSONRenderer."""
+        import decimal
+        import uuid
+        from django.utils import timezone
+        from rest_framework.renderers import JSONRenderer
+        from library_project.renderers import FastJSONRenderer
+        data = {
+            'when': timezone.now(), 'day': timezone.now().date(),
+            'amount': decimal.Decimal('1.50'), 'id': uuid.uuid4(),
+            'text': 'naïve\u2028line\u2029', 1: [None, True, 2.5],
+        }
+        assert FastJSONRenderer().render(data) == JSONRenderer().render(data)
+        indented = 'application/json; indent=2'
+        assert FastJSONRenderer().render(data, indented) == JSONRenderer().render(data, indented)
+
+
+@pytest.mark.django_db
+class TestBookImport:
+    """Test the bulk catalog import."""
+    
+    CSV = (
+        'isbn,title,author,page_count,category,total_copies\n'
+        '978-0-00-000001-1,Dune,Frank Herbert,412,Fiction,3\n'
+        '9780000000028,Emma,Jane Austen,0,Fiction,2\n'
+        '9780000000035,Solaris,Stanislaw Lem,204,Fiction,1\n'
+    )
+    
+    def test_import_csv(self):
+        """Test CSV rows are created and invalid rows reported."""
+        import io
+        from books.importer import import_books
+        report = import_books(io.BytesIO(self.CSV.encode()), 'csv', batch_size=2)
+        
+        assert (report.rows, report.created, report.updated, report.failed) == (3, 2, 0, 1)
+        assert report.errors[0]['line'] == 3
+        assert 'page_count' in report.errors[0]['errors']
+        dune = Book.objects.get(isbn='9780000000011')
+        assert dune.available_copies == 3
+        assert dune.language == 'English'
+    
+    def test_import_upserts_by_isbn(self):
+        """Test existing books are updated, keeping columns not in the file."""
+        import io
+        from books.importer import import_books
+        book = BookFactory(isbn='9780000000011', total_copies=5, available_copies=4, category='Old')
+        rows = '{"isbn": "9780000000011", "title": "Dune", "author": "Frank Herbert", "page_count": 412, "category": "Fiction"}\n'
+        rows += 'not json\n'
+        
+        report = import_books(io.BytesIO(rows.encode()), 'jsonl')
+        
+        assert (report.created, report.updated, report.failed) == (0, 1, 1)
+        book.refresh_from_db()
+        assert (book.title, book.category, book.available_copies) == ('Dune', 'Fiction', 4)
+        assert facet_counts(Book.objects.all()) == {
+            (bucket.category, bucket.language, bucket.available): bucket.count
+            for bucket in BookFacetCount.objects.filter(count__gt=0)
+        }
+    
+    def test_import_dry_run(self):
+        """Test dry runs validate without writing."""
+        import io
+        from books.importer import import_books
+        report = import_books(io.BytesIO(self.CSV.encode()), 'csv', dry_run=True)
+        assert (report.rows, report.failed) == (3, 1)
+        assert not Book.objects.exists()
+    
+    def test_import_command(self, tmp_path):
+        """Test the import_books management command."""
+        from io import StringIO
+        from django.core.management import call_command
+        path = tmp_path / 'books.csv'
+        path.write_text(self.CSV)
+        out, err = StringIO(), StringIO()
+        
+        call_command('import_books', str(path), stdout=out, stderr=err)
+        
+        assert 'Imported 3 rows: 2 created, 0 updated, 1 failed.' in out.getvalue()
+        assert 'line 3' in err.getvalue()
+        assert Book.objects.count() == 2
+
+
+@pytest.mark.django_db
+class TestExport:
+    """Test the streaming table export."""
+    
+    def test_export_command(self, tmp_path):
+        """Test the export management command writes filtered rows."""
+        import csv
+        from django.core.management import call_command
+        BookFactory(category='Fiction')
+        BookFactory(category='Poetry')
+        path = tmp_path / 'books.csv'
+        
+        call_command('export', 'books', '--filter', 'category=Poetry', '-o', str(path), stderr=StringIO())
+        
+        rows = list(csv.DictReader(path.read_text().splitlines()))
+        assert [row['category'] for row in rows] == ['Poetry']
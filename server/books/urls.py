@@ -1,22 +1,39 @@
 from django.urls import path
 from .views import (
     BookListCreateView, BookDetailView, LoanViewSet,
-    search_books, overdue_loans, book_categories
+    search_books, autocomplete_books, overdue_loans, loan_aging, fine_balances, admin_stats,
+    circulation_trends, related_books, similar_books, trending_books,
+    book_categories, book_facets,
+    book_import, export_table
 )
 
 urlpatterns = [
     # Books
     path('books/', BookListCreateView.as_view(), name='book-list-create'),
     path('books/<int:pk>/', BookDetailView.as_view(), name='book-detail'),
+    path('books/trending/', trending_books, name='book-trending'),
+    path('books/<int:pk>/related/', related_books, name='book-related'),
+    path('books/<int:pk>/similar/', similar_books, name='book-similar'),
     path('books/search/', search_books, name='book-search'),
+    path('books/autocomplete/', autocomplete_books, name='book-autocomplete'),
     path('books/categories/', book_categories, name='book-categories'),
+    path('books/facets/', book_facets, name='book-facets'),
     
     # Loans
     path('loans/', LoanViewSet.as_view({'get': 'list', 'post': 'create'}), name='loan-list-create'),
     path('loans/<int:pk>/', LoanViewSet.as_view({'get': 'retrieve'}), name='loan-detail'),
     path('loans/<int:pk>/return/', LoanViewSet.as_view({'post': 'return_book'}), name='loan-return'),
     path('loans/my-loans/', LoanViewSet.as_view({'get': 'my_loans'}), name='my-loans'),
+    path('loans/my-fines/', LoanViewSet.as_view({'get': 'my_fines'}), name='my-fines'),
+    path('loans/batch/borrow/', LoanViewSet.as_view({'post': 'batch_borrow'}), name='loan-batch-borrow'),
+    path('loans/batch/return/', LoanViewSet.as_view({'post': 'batch_return'}), name='loan-batch-return'),
     
     # Admin
     path('admin/loans/overdue/', overdue_loans, name='overdue-loans'),
+    path('admin/loans/aging/', loan_aging, name='loan-aging'),
+    path('admin/fines/', fine_balances, name='fine-balances'),
+    path('admin/stats/', admin_stats, name='admin-stats'),
+    path('admin/circulation/trends/', circulation_trends, name='circulation-trends'),
+    path('admin/books/import/', book_import, name='book-import'),
+    path('admin/export/<str:name>/', export_table, name='export-table'),
 ]
@@ -1,22 +1,46 @@
 from rest_framework import generics, status, permissions, viewsets
-from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.decorators import api_view, permission_classes, authentication_classes, action, parser_classes
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.settings import api_settings
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, CharField, F, Value, When
 from datetime import datetime, timedelta
 
-from .models import Book, Loan
+from .models import Book, BookFacetCount, Loan, LoanHistory
 from .serializers import (
     BookSerializer, BookListSerializer, LoanSerializer, 
-    LoanListSerializer, BorrowBookSerializer, ReturnBookSerializer
+    LoanListSerializer, BorrowBookSerializer, ReturnBookSerializer,
+    BatchBorrowSerializer, BatchReturnSerializer, CirculationTrendsSerializer
 )
 from .filters import BookFilter, LoanFilter
+from .query import plan_search
+from .fuzzy import fuzzy_search, uses_pg_trgm
+from .autocomplete import autocomplete_index
+from .facets import catalog_facets
+from .cache import cached_response
+from .circulation import borrow_books, return_loans
+from .fines import aging_report, amount, balances, fined_loans
+from .stats import current_stats
+from .popularity import current_epoch, decayed, popularity_increment, trending
+from .similar import similar_book_ids
+from .rollups import record_borrows, record_on_commit, record_returns, trend_series
+from .importer import FORMATS, detect_format, import_books
+from .exporter import EXPORTS, FORMATS as EXPORT_FORMATS, export_filename, export_queryset, export_stream
 from .permissions import IsAdminOrReadOnly
+from accounts.models import User
 from accounts.permissions import IsAdmin
+from library_project.counts import invalidate_counts
+from library_project.fieldsets import SparseQuerysetMixin, sparse_queryset
+from library_project.pagination import PageOrCursorPagination
+from library_project.rows import RowListMixin, compile_rows
 
 
-class BookListCreateView(generics.ListCreateAPIView):
+class BookListCreateView(SparseQuerysetMixin, RowListMixin, generics.ListCreateAPIView):
     """
     API endpoint for listing and creating books.
     GET: Anonymous users can view (read-only)
@@ -26,14 +50,32 @@ class BookListCreateView(generics.ListCreateAPIView):
     permission_classes = (IsAdminOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = BookFilter
+    pagination_class = PageOrCursorPagination
+    # ?ordering= choices, each backed by a (key, id) index
+    orderings = {
+        '-created_at': ('-created_at', '-id'),
+        '-popularity': ('-popularity', '-id'),
+    }
+    
+    @property
+    def keyset_ordering(self):
+        request = getattr(self, 'request', None)
+        ordering = request.query_params.get('ordering') if request else None
+        return self.orderings.get(ordering, self.orderings['-created_at'])
+    
+    def get_queryset(self):
+        return super().get_queryset().order_by(*self.keyset_ordering)
     
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return BookListSerializer
         return BookSerializer
+    
+    def list(self, request, *args, **kwargs):
+        return cached_response(request, 'book-list', lambda: super(BookListCreateView, self).list(request, *args, **kwargs))
 
 
-class BookDetailView(generics.RetrieveUpdateDestroyAPIView):
+class BookDetailView(SparseQuerysetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     API endpoint for retrieving, updating, and deleting books.
     GET: All users
@@ -42,9 +84,12 @@ class BookDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = (IsAdminOrReadOnly,)
+    
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(request, 'book-detail', lambda: super(BookDetailView, self).retrieve(request, *args, **kwargs))
 
 
-class LoanViewSet(viewsets.ModelViewSet):
+class LoanViewSet(SparseQuerysetMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing loans.
     """
@@ -53,6 +98,8 @@ class LoanViewSet(viewsets.ModelViewSet):
     permission_classes = (permissions.IsAuthenticated,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = LoanFilter
+    pagination_class = PageOrCursorPagination
+    keyset_ordering = ('-borrowed_date', '-id')
     
     def get_queryset(self):
         """
@@ -75,50 +122,65 @@ class LoanViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            book = Book.objects.get(id=book_id)
-            
-            # Check if book is available
-            if book.available_copies <= 0:
-                return Response(
-                    {'error': 'This book is currently not available.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Check if user already has an active loan for this book
-            active_loan = Loan.objects.filter(
-                user=request.user,
-                book=book,
-                status__in=['active', 'borrowed', 'overdue']
-            ).first()
-            
-            if active_loan:
-                return Response(
-                    {'error': 'You already have an active loan for this book.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Create loan
-            from django.utils import timezone
-            loan = Loan.objects.create(
-                user=request.user,
-                book=book,
-                due_date=timezone.now() + timedelta(days=14)
+            book_id = int(book_id)
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'book_id must be an integer.'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            
-            # Update book availability
-            book.available_copies -= 1
-            book.save()
-            
+        
+        # The quota is checked and counted by one conditional UPDATE, the
+        # copy taken by another, and a second open loan of the same book is
+        # refused by the open loan constraint: no SELECT before the INSERT
+        from django.utils import timezone
+        if not connection.features.supports_partial_indexes and Loan.objects.filter(
+            user=request.user, book_id=book_id
+        ).exclude(status='returned').exists():
+            # MySQL cannot enforce the constraint, so check as before
             return Response(
-                LoanSerializer(loan).data,
-                status=status.HTTP_201_CREATED
+                {'error': 'You already have an active loan for this book.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            with transaction.atomic():
+                if not User.objects.reserve_loan(request.user.pk, settings.LOAN_QUOTA):
+                    return Response(
+                        {'error': f'You have reached the limit of {settings.LOAN_QUOTA} active loans.'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                book = Book.objects.take_copy(book_id, popularity=popularity_increment())
+                if book is None:
+                    # Give back the quota slot counted above
+                    transaction.set_rollback(True)
+                else:
+                    loan = Loan.objects.create(
+                        user=request.user,
+                        book=book,
+                        due_date=timezone.now() + timedelta(days=14)
+                    )
+                    record_on_commit(record_borrows, request.user, [(book.id, book.category)],
+                                     loan.borrowed_date, [loan.id])
+        except IntegrityError:
+            return Response(
+                {'error': 'You already have an active loan for this book.'},
+                status=status.HTTP_400_BAD_REQUEST
             )
         
-        except Book.DoesNotExist:
+        if book is None:
+            if not Book.objects.filter(id=book_id).exists():
+                return Response(
+                    {'error': 'Book not found.'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
             return Response(
-                {'error': 'Book not found.'},
-                status=status.HTTP_404_NOT_FOUND
+                {'error': 'This book is currently not available.'},
+                status=status.HTTP_400_BAD_REQUEST
             )
+        
+        return Response(
+            LoanSerializer(loan).data,
+            status=status.HTTP_201_CREATED
+        )
     
     @action(detail=True, methods=['post'])
     def return_book(self, request, pk=None):
@@ -135,23 +197,27 @@ class LoanViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_403_FORBIDDEN
                 )
             
-            # Check if already returned
-            if loan.status == 'returned':
+            # Close the loan only if it is still open, so a repeated or
+            # concurrent return cannot put the copy back twice
+            from django.utils import timezone
+            loan.return_date = timezone.now()
+            closed = Loan.objects.filter(id=loan.id).exclude(status='returned').update(
+                status='returned', return_date=loan.return_date
+            )
+            if not closed:
                 return Response(
                     {'error': 'This book has already been returned.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            
-            # Update loan
-            from django.utils import timezone
-            loan.return_date = timezone.now()
+            # A queryset update sends no post_save
+            invalidate_counts(Loan, scopes=[loan.user_id])
+            record_on_commit(record_returns, [loan.id], loan.return_date,
+                             {loan.id} if loan.status == 'active' else ())
             loan.status = 'returned'
-            loan.save()
+            User.objects.release_loans(loan.user_id)
             
             # Update book availability
-            book = loan.book
-            book.available_copies += 1
-            book.save()
+            loan.book = Book.objects.return_copy(loan.book_id) or loan.book
             
             return Response(
                 LoanSerializer(loan).data,
@@ -164,39 +230,123 @@ class LoanViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
     
+    @action(detail=False, methods=['post'])
+    def batch_borrow(self, request):
+        """
+        Borrow several books at once (POST /api/loans/batch/borrow/)
+        
+        Admins at a circulation desk pass the patron's ``user_id``.
+        """
+        serializer = BatchBorrowSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        user = request.user
+        user_id = serializer.validated_data.get('user_id')
+        if user_id is not None and user_id != user.pk:
+            if user.role != 'admin':
+                return Response(
+                    {'error': 'Only admins can borrow for another user.'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+            user = User.objects.filter(pk=user_id).first()
+            if user is None:
+                return Response(
+                    {'error': 'User not found.'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+        
+        results = borrow_books(user, serializer.validated_data['book_ids'])
+        return Response(self._batch_summary(results), status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['post'])
+    def batch_return(self, request):
+        """
+        Return several loans at once (POST /api/loans/batch/return/)
+        
+        Admins can return any loan, other users only their own.
+        """
+        serializer = BatchReturnSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        owner = None if request.user.role == 'admin' else request.user
+        results = return_loans(serializer.validated_data['loan_ids'], user=owner)
+        return Response(self._batch_summary(results), status=status.HTTP_200_OK)
+    
+    @staticmethod
+    def _batch_summary(results):
+        failed = sum('error' in result for result in results)
+        return {'succeeded': len(results) - failed, 'failed': failed, 'results': results}
+    
     @action(detail=False, methods=['get'])
     def my_loans(self, request):
         """
         Get current user's loans (GET /api/loans/my-loans/)
         """
         status_filter = request.query_params.get('status')
-        queryset = Loan.objects.filter(user=request.user)
+        # Open loans are never archived; past ones may be
+        model = Loan if status_filter in ('active', 'overdue') else LoanHistory
+        queryset = model.objects.filter(user=request.user)
         
         if status_filter:
             queryset = queryset.filter(status=status_filter)
         
         queryset = queryset.order_by('-borrowed_date')
+        queryset = sparse_queryset(queryset, self.get_serializer(), extra=('borrowed_date',))
         
         # Paginate
         page = self.paginate_queryset(queryset)
         if page is not None:
-            serializer = LoanSerializer(page, many=True)
+            serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
         
-        serializer = LoanSerializer(queryset, many=True)
+        serializer = self.get_serializer(queryset, many=True)
         return Response({
             'count': queryset.count(),
             'next': None,
             'previous': None,
             'results': serializer.data
         })
+    
+    @action(detail=False, methods=['get'])
+    def my_fines(self, request):
+        """
+        Get current user's late loans and fine balance (GET /api/loans/my-fines/)
+        """
+        loans = list(
+            fined_loans().filter(user=request.user).order_by('due_date', 'id')
+            .values('id', 'book__title', 'due_date', 'return_date', 'status', 'fine_cents')
+        )
+        return Response({
+            'balance': str(amount(sum(loan['fine_cents'] for loan in loans))),
+            'loans': [
+                {
+                    'loan_id': loan['id'],
+                    'book_title': loan['book__title'],
+                    'due_date': loan['due_date'],
+                    'return_date': loan['return_date'],
+                    'status': loan['status'],
+                    'fine': str(amount(loan['fine_cents'])),
+                }
+                for loan in loans
+            ],
+        })
 
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def search_books(request):
     """
-    API endpoint for searching books by title, author, ISBN, or category.
+    API endpoint for searching books by title, author, ISBN, category or description.
+    Results are ranked by relevance and paginated.
+    
+    Supports field qualifiers (``author:``, ``title:``, ``isbn:``, ``category:``)
+    and quoted phrases. The access paths chosen by the query planner are
+    reported in the ``X-Search-Plan`` response header.
+    
+    With ``?fuzzy=1`` titles and authors are matched by trigram similarity
+    instead, best match first, to tolerate typos.
     """
     query = request.query_params.get('q', '')
     
@@ -206,42 +356,320 @@ def search_books(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    books = Book.objects.filter(
-        Q(title__icontains=query) |
-        Q(author__icontains=query) |
-        Q(isbn__icontains=query) |
-        Q(category__icontains=query) |
-        Q(description__icontains=query)
-    )
+    if request.query_params.get('fuzzy') in ('1', 'true', 'True'):
+        results = fuzzy_search(query)
+        explain = 'trigram' if uses_pg_trgm() else 'ngram-index'
+    else:
+        plan = plan_search(query)
+        results = plan.results()
+        explain = plan.explain()
+    
+    paginator = api_settings.DEFAULT_PAGINATION_CLASS()
+    page = paginator.paginate_queryset(results, request)
+    serializer = BookListSerializer(page, many=True)
+    response = paginator.get_paginated_response(serializer.data)
+    response['X-Search-Plan'] = explain
+    return response
+
+
+@transaction.non_atomic_requests
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def autocomplete_books(request):
+    """
+    API endpoint for search-box suggestions (GET /api/books/autocomplete/?prefix=).
+    Served from the worker's in-memory prefix index, without authentication
+    or a request transaction, so each keystroke stays cheap.
+    """
+    prefix = request.query_params.get('prefix', '')
+    
+    try:
+        limit = int(request.query_params.get('limit', 10))
+    except ValueError:
+        return Response(
+            {'error': 'limit must be an integer.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    limit = max(1, min(limit, settings.AUTOCOMPLETE_MAX_RESULTS))
     
-    serializer = BookListSerializer(books, many=True)
-    return Response(serializer.data)
+    autocomplete_index.sync()
+    return Response(autocomplete_index.suggest(prefix, limit))
 
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated, IsAdmin])
 def overdue_loans(request):
     """
-    API endpoint for viewing overdue loans (admin only).
+    API endpoint for viewing overdue loans (admin only), most overdue first.
+    
+    Read-only: a loan is overdue here once its due date has passed, whether
+    or not the ``mark_overdue`` sweep has updated its status yet; the status
+    is derived from the due date in the query.
     """
+    from django.utils import timezone
+    now = timezone.now()
     loans = Loan.objects.filter(
-        status='active',
-        due_date__lt=datetime.now()
+        status__in=('active', 'overdue'),
+        due_date__lt=now
+    ).order_by('due_date', 'id')
+    status_now = Case(
+        When(due_date__lt=now, then=Value('overdue')),
+        default=F('status'),
+        output_field=CharField(),
     )
     
-    # Update status to overdue
-    for loan in loans:
-        loan.status = 'overdue'
-        loan.save()
+    serializer = LoanListSerializer(many=True)
+    plan = compile_rows(serializer)
+    paginator = api_settings.DEFAULT_PAGINATION_CLASS()
+    page = paginator.paginate_queryset(plan.queryset(loans, overrides={'status': status_now}), request)
+    return paginator.get_paginated_response(plan.serialize(page))
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated, IsAdmin])
+def admin_stats(request):
+    """
+    API endpoint for the admin dashboard statistics (admin only).
+    
+    Served from the periodically refreshed ``LibraryStats`` row, so the
+    counts are as of ``computed_at`` (at most ``STATS_REFRESH_INTERVAL``
+    seconds old while a worker runs).
+    """
+    stats = current_stats()
+    return Response({
+        'books': {
+            'total': stats.total_books,
+            'available': stats.available_books,
+            'total_copies': stats.total_copies,
+            'available_copies': stats.available_copies,
+        },
+        'loans': {
+            'active': stats.active_loans,
+            'overdue': stats.overdue_loans,
+            'returned': stats.returned_loans,
+        },
+        'users': {
+            'total': stats.total_users,
+            'borrowing': stats.borrowing_users,
+        },
+        'computed_at': stats.computed_at,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated, IsAdmin])
+def circulation_trends(request):
+    """
+    API endpoint for borrowing trends (admin only): borrows, returns,
+    overdues and distinct borrowers per ``resolution`` (day, week or month)
+    for all loans or one ``dimension`` (book, category, cohort) ``key``,
+    optionally from ``start`` to ``end``. Read from the daily rollups.
+    """
+    serializer = CirculationTrendsSerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    params = serializer.validated_data
+    return Response({**params, 'results': trend_series(**params)})
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated, IsAdmin])
+def loan_aging(request):
+    """
+    API endpoint for the aging report of overdue loans (admin only): loans,
+    patrons and accrued fines by days overdue.
+    """
+    from django.utils import timezone
+    now = timezone.now()
+    buckets = aging_report(now)
+    for bucket in buckets:
+        bucket['fines'] = str(bucket['fines'])
+    return Response({'as_of': now, 'buckets': buckets})
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated, IsAdmin])
+def fine_balances(request):
+    """
+    API endpoint for users' fine balances, largest first (admin only).
+    """
+    paginator = api_settings.DEFAULT_PAGINATION_CLASS()
+    page = paginator.paginate_queryset(balances(), request)
+    return paginator.get_paginated_response([
+        {
+            'user_id': row['user_id'],
+            'username': row['user__username'],
+            'loans': row['loans'],
+            'balance': str(amount(row['balance_cents'])),
+        }
+        for row in page
+    ])
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminOrReadOnly])
+def related_books(request, pk):
+    """
+    API endpoint for the books most often borrowed by the patrons who
+    borrowed book ``pk``, best first: one indexed lookup of its
+    ``RelatedBook`` rows, joined to the books.
+    """
+    def compute():
+        plan = compile_rows(BookListSerializer(many=True))
+        books = Book.objects.filter(related_to__book_id=pk).order_by('related_to__rank')
+        results = plan.serialize(plan.queryset(books))
+        if not results and not Book.objects.filter(pk=pk).exists():
+            return Response({'error': 'Book not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'results': results})
+    
+    return cached_response(request, 'book-related', compute)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminOrReadOnly])
+def similar_books(request, pk):
+    """
+    API endpoint for the books whose title, author, category and description
+    are closest to book ``pk``, best first, read from the similarity index.
+    """
+    def compute():
+        scores = dict(similar_book_ids(pk))
+        plan = compile_rows(BookListSerializer(many=True))
+        rows = plan.serialize(plan.queryset(Book.objects.filter(pk__in=scores)))
+        if not rows and not Book.objects.filter(pk=pk).exists():
+            return Response({'error': 'Book not found.'}, status=status.HTTP_404_NOT_FOUND)
+        rank = {book_id: n for n, book_id in enumerate(scores)}
+        results = sorted(rows, key=lambda row: rank[row['id']])
+        for row in results:
+            row['score'] = round(scores[row['id']], 4)
+        return Response({'results': results})
     
-    serializer = LoanListSerializer(loans, many=True)
-    return Response(serializer.data)
+    return cached_response(request, 'book-similar', compute)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminOrReadOnly])
+def trending_books(request):
+    """
+    API endpoint for the most borrowed books of late (``?limit=``, default
+    20, at most 100), with their decayed borrow counts, from the popularity
+    index.
+    """
+    try:
+        limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+    except ValueError:
+        return Response({'error': 'limit must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    def compute():
+        plan = compile_rows(BookListSerializer(many=True))
+        epoch = current_epoch()
+        rows = list(plan.queryset(trending(limit, epoch), extra=['popularity']))
+        results = plan.serialize(rows)
+        for result, row in zip(results, rows):
+            result['popularity'] = round(decayed(row.popularity, epoch=epoch), 3)
+        return Response({'results': results})
+    
+    return cached_response(request, 'book-trending', compute)
 
 
 @api_view(['GET'])
 def book_categories(request):
     """
     API endpoint for getting all unique book categories.
+    Read from the maintained facet buckets rather than the Book table.
+    """
+    def compute():
+        categories = (
+            BookFacetCount.objects.filter(count__gt=0)
+            .values_list('category', flat=True).distinct().order_by('category')
+        )
+        return Response(list(categories))
+    
+    return cached_response(request, 'book-categories', compute)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def book_facets(request):
+    """
+    API endpoint for catalog facet counts (GET /api/books/facets/).
+    Returns counts per category, language and availability, honoring the
+    same query parameters as the book list.
+    """
+    filterset = BookFilter(request.query_params, queryset=Book.objects.all(), request=request)
+    if not filterset.is_valid():
+        return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    facets, source = catalog_facets(filterset)
+    response = Response(facets)
+    response['X-Facet-Source'] = source
+    return response
+
+
+@transaction.non_atomic_requests
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated, IsAdmin])
+@parser_classes([MultiPartParser])
+def book_import(request):
+    """
+    API endpoint for bulk catalog imports (admin only).
+    Upload a CSV or JSON Lines ``file``; rows are upserted by ISBN in
+    batches and the response reports per-row errors.
+    Set ``dry_run=1`` to validate without writing.
     """
-    categories = Book.objects.values_list('category', flat=True).distinct().order_by('category')
-    return Response(list(categories))
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response(
+            {'error': 'A CSV or JSON Lines "file" upload is required.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    format = request.data.get('format') or detect_format(upload.name)
+    if format not in FORMATS:
+        return Response(
+            {'error': f'format must be one of: {", ".join(FORMATS)}.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    dry_run = request.data.get('dry_run') in ('1', 'true', 'True')
+    report = import_books(upload, format, dry_run=dry_run)
+    return Response(report.as_dict())
+
+
+@transaction.non_atomic_requests
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated, IsAdmin])
+def export_table(request, name):
+    """
+    API endpoint streaming every book or loan (admin only).
+    GET /api/admin/export/books/ or /api/admin/export/loans/
+    
+    ``?output=csv|ndjson`` picks the format (CSV by default) and ``?gzip=1``
+    compresses on the fly. Accepts the same filters as the list endpoints.
+    """
+    if name not in EXPORTS:
+        return Response(
+            {'error': f'Unknown export {name!r}.'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    output = request.query_params.get('output', 'csv')
+    if output not in EXPORT_FORMATS:
+        return Response(
+            {'error': f'output must be one of: {", ".join(EXPORT_FORMATS)}.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        queryset = export_queryset(name, request.query_params)
+    except ValueError as exc:
+        return Response(exc.args[0], status=status.HTTP_400_BAD_REQUEST)
+    
+    compress = request.query_params.get('gzip') in ('1', 'true', 'True')
+    response = StreamingHttpResponse(
+        export_stream(name, queryset, output, compress=compress),
+        content_type='application/gzip' if compress else EXPORT_FORMATS[output][0],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(name, output, compress)}"'
+    return response
@@ -9,3 +9,10 @@ def django_db_setup():
         'NAME': ':memory:',
         'ATOMIC_REQUESTS': True,
     }
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Start every test with an empty cache."""
+    from django.core.cache import cache
+    cache.clear()
@@ -0,0 +1,228 @@
+"""
+Cached and estimated row counts for paginated list endpoints.
+
+``cached_count(queryset)`` returns ``(count, exact)``:
+
+1. A cached value for the same query, if the model has not changed since.
+   Entries are keyed by the query's SQL and parameters (i.e. the
+   normalized filters, including per-user scoping) plus a per-model
+   generation number that ``post_save``/``post_delete`` bump, so
+   invalidation is a single cache increment. A model can share another
+   model's generation (``share_generation``), e.g. a view over its table.
+   Counts filtered on one value of a model's scope field
+   (``scope_counts``, e.g. one user's loans) are keyed on a generation of
+   that value instead, so changes for other users keep them cached.
+2. On large tables (PostgreSQL/MySQL statistics above
+   ``COUNT_ESTIMATE_THRESHOLD`` rows) the planner's estimate: table
+   statistics for unfiltered queries, ``EXPLAIN`` otherwise. A view is
+   sized by the tables it reads (``estimate_from``).
+3. Otherwise an exact ``COUNT(*)``.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save
+
+GENERATION_KEY = 'count-generation:{label}'
+SCOPE_GENERATION_KEY = 'count-generation:{label}:{scope}'
+# Scope of the generation bumped by changes to rows of any scope value
+ALL_SCOPES = '*'
+COUNT_KEY = 'count:{label}:{generation}:{digest}'
+TABLE_ESTIMATE_KEY = 'count-table-estimate:{table}'
+
+# Label of a model -> label of the model whose generation it shares
+_shared_generations = {}
+# Generation label -> name of the field its counts are scoped by
+_scope_fields = {}
+# Label of a view -> the models whose tables it reads
+_estimate_sources = {}
+
+
+def count_settings():
+    return (
+        getattr(settings, 'COUNT_CACHE_TIMEOUT', 300),
+        getattr(settings, 'COUNT_ESTIMATE_THRESHOLD', 1000000),
+    )
+
+
+def share_generation(model, source):
+    """Key cached counts of ``model`` on the generation of ``source``: a change to either invalidates both."""
+    _shared_generations[model._meta.label_lower] = source._meta.label_lower
+
+
+def scope_counts(model, field):
+    """Key cached counts of ``model`` filtered on one value of ``field`` on a generation of that value."""
+    _scope_fields[_generation_label(model)] = field
+
+
+def estimate_from(model, *sources):
+    """Estimate the rows of ``model``, a view, as the sum of the rows of the ``sources`` tables."""
+    _estimate_sources[model._meta.label_lower] = sources
+
+
+def _generation_label(model):
+    label = model._meta.label_lower
+    return _shared_generations.get(label, label)
+
+
+def generation_key(model, scope=None):
+    label = _generation_label(model)
+    if scope is None:
+        return GENERATION_KEY.format(label=label)
+    return SCOPE_GENERATION_KEY.format(label=label, scope=scope)
+
+
+def generation(model, scope=None):
+    return cache.get_or_set(generation_key(model, scope), 0, None)
+
+
+def query_scope(queryset):
+    """
+    The scope ``queryset`` is filtered on, e.g. ``user=5``, or ``None``
+    if it does not filter its model's scope field on a single value.
+    """
+    field = _scope_fields.get(_generation_label(queryset.model))
+    where = queryset.query.where
+    if field is None or where.connector != 'AND' or where.negated:
+        return None
+    for child in where.children:
+        lhs = getattr(child, 'lhs', None)
+        if (getattr(child, 'lookup_name', None) == 'exact'
+                and getattr(lhs, 'alias', None) == queryset.query.base_table
+                and getattr(lhs.target, 'name', None) == field
+                and not hasattr(child.rhs, 'resolve_expression')):
+            return f'{field}={child.rhs}'
+    return None
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def invalidate_counts(model, scopes=None):
+    """
+    Invalidate the cached counts for ``model`` (O(1) per scope).
+
+    With ``scopes``, the values of its scope field whose rows changed, the
+    counts of other values are kept; without, all of them are invalidated.
+    Bumped again on commit, so counts computed by other requests before
+    this transaction commits are not kept under the new generation.
+    """
+    keys = [generation_key(model)]
+    field = _scope_fields.get(_generation_label(model))
+    if field is not None:
+        if scopes is None:
+            keys.append(generation_key(model, ALL_SCOPES))
+        else:
+            keys.extend(generation_key(model, f'{field}={value}') for value in set(scopes))
+
+    def bump():
+        for key in keys:
+            _bump(key)
+    bump()
+    transaction.on_commit(bump)
+
+
+def _invalidate_on_change(sender, instance, **kwargs):
+    field = _scope_fields.get(_generation_label(sender))
+    if field is None:
+        invalidate_counts(sender)
+    else:
+        invalidate_counts(sender, scopes=[getattr(instance, sender._meta.get_field(field).attname)])
+
+
+def watch(model):
+    """Invalidate cached counts of ``model`` whenever one of its rows changes."""
+    uid = f'invalidate-counts-{model._meta.label_lower}'
+    post_save.connect(_invalidate_on_change, sender=model, dispatch_uid=uid)
+    post_delete.connect(_invalidate_on_change, sender=model, dispatch_uid=uid)
+
+
+def count_key(queryset):
+    # Keyed on the filters only, not on the selected columns or joins
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    digest = hashlib.sha1(
+        json.dumps([queryset.db, sql, [str(p) for p in params]]).encode('utf-8')
+    ).hexdigest()
+    model = queryset.model
+    scope = query_scope(queryset)
+    if scope is None:
+        current = generation(model)
+    else:
+        current = f'{generation(model, ALL_SCOPES)}.{generation(model, scope)}'
+    return COUNT_KEY.format(label=model._meta.label_lower, generation=current, digest=digest)
+
+
+def table_estimate(model, using='default'):
+    """Row count from the planner statistics, or ``None`` if unavailable."""
+    sources = _estimate_sources.get(model._meta.label_lower)
+    if sources is not None:
+        estimates = [table_estimate(source, using) for source in sources]
+        return None if None in estimates else sum(estimates)
+    table = model._meta.db_table
+    key = TABLE_ESTIMATE_KEY.format(table=table)
+    estimate = cache.get(key)
+    if estimate is not None:
+        return estimate if estimate >= 0 else None
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [table],
+            )
+        else:
+            cache.set(key, -1, 300)
+            return None
+        row = cursor.fetchone()
+    estimate = int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+    cache.set(key, estimate if estimate is not None else -1, 300)
+    return estimate
+
+
+def query_estimate(queryset):
+    """Row estimate for ``queryset`` from ``EXPLAIN``, or ``None``."""
+    connection = connections[queryset.db]
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+        if connection.vendor == 'mysql':
+            cursor.execute(f"EXPLAIN {sql}", params)
+            columns = [column[0] for column in cursor.description]
+            row = dict(zip(columns, cursor.fetchone()))
+            return int((row.get('rows') or 0) * float(row.get('filtered') or 100) / 100)
+    return None
+
+
+def cached_count(queryset):
+    """Return ``(count, exact)`` for ``queryset``; see the module docstring."""
+    timeout, threshold = count_settings()
+    key = count_key(queryset)
+    cached = cache.get(key)
+    if cached is not None:
+        return tuple(cached)
+
+    result = None
+    total = table_estimate(queryset.model, using=queryset.db)
+    if total is not None and total >= threshold:
+        estimate = total if not queryset.query.where else query_estimate(queryset)
+        if estimate is not None:
+            result = (estimate, False)
+    if result is None:
+        result = (queryset.count(), True)
+    cache.set(key, result, timeout)
+    return result
@@ -0,0 +1,192 @@
+"""
+Sparse fieldsets for read endpoints.
+
+Serializers using ``SparseFieldsMixin`` honor three query parameters on
+``GET`` requests:
+
+* ``?fields=id,title,book.title`` keeps only the listed fields; dotted
+  paths select fields of nested serializers (``book`` alone keeps the
+  whole nested object);
+* ``?exclude=description,book.description`` drops the listed fields;
+* ``?expand=book`` embeds only the listed nested objects; the others are
+  rendered as primary keys. Without ``expand`` every nested object is
+  embedded, as before.
+
+``sparse_queryset(queryset, serializer)`` then narrows the SQL to what the
+selected fields read: ``only()`` the needed columns, ``select_related()``
+only the embedded relations. Views get this through
+``SparseQuerysetMixin``.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+FIELDS_PARAM = 'fields'
+EXCLUDE_PARAM = 'exclude'
+EXPAND_PARAM = 'expand'
+
+
+def parse_field_paths(value):
+    """Parse ``'a,b.c,b.d'`` into the tree ``{'a': {}, 'b': {'c': {}, 'd': {}}}``."""
+    tree = {}
+    for path in (value or '').split(','):
+        node = tree
+        for name in filter(None, (part.strip() for part in path.split('.'))):
+            node = node.setdefault(name, {})
+    return tree
+
+
+class SparseSpec:
+    """Requested ``fields`` / ``exclude`` / ``expand`` trees for one serializer."""
+
+    def __init__(self, include=None, exclude=None, expand=None):
+        self.include = include
+        self.exclude = exclude or {}
+        self.expand = expand
+
+    @classmethod
+    def from_request(cls, request):
+        params = request.query_params
+        return cls(
+            parse_field_paths(params[FIELDS_PARAM]) if params.get(FIELDS_PARAM) else None,
+            parse_field_paths(params.get(EXCLUDE_PARAM)),
+            parse_field_paths(params[EXPAND_PARAM]) if EXPAND_PARAM in params else None,
+        )
+
+    def child(self, name):
+        include = (self.include.get(name) or None) if self.include is not None else None
+        expand = (self.expand.get(name) or None) if self.expand is not None else None
+        return SparseSpec(include, self.exclude.get(name), expand)
+
+    def keeps(self, name):
+        if self.include is not None and name not in self.include:
+            return False
+        # A non-empty exclude subtree only prunes inside the nested object
+        return not (name in self.exclude and not self.exclude[name])
+
+    def expands(self, name):
+        return self.expand is None or name in self.expand
+
+
+def _nested(field):
+    if isinstance(field, serializers.ListSerializer):
+        return field.child
+    if isinstance(field, serializers.BaseSerializer):
+        return field
+    return None
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin applying the request's sparse fieldset (see module
+    docstring). ``Meta.field_dependencies`` maps computed fields (properties,
+    ``SerializerMethodField``) to the model fields they read, so
+    ``sparse_queryset`` can still defer the rest.
+    """
+    sparse_spec = None
+
+    def get_sparse_spec(self):
+        if self.sparse_spec is not None:
+            return self.sparse_spec
+        root = self.parent.parent if isinstance(self.parent, serializers.ListSerializer) else self.parent
+        request = self.context.get('request')
+        if root is None and request is not None and request.method in ('GET', 'HEAD'):
+            return SparseSpec.from_request(request)
+        return None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        spec = self.get_sparse_spec()
+        if spec is None:
+            return fields
+        for name in list(fields):
+            if not spec.keeps(name):
+                del fields[name]
+                continue
+            nested = _nested(fields[name])
+            if nested is None:
+                continue
+            if not spec.expands(name):
+                fields[name] = serializers.PrimaryKeyRelatedField(
+                    read_only=True, source=fields[name].source,
+                    many=isinstance(fields[name], serializers.ListSerializer),
+                )
+            elif isinstance(nested, SparseFieldsMixin):
+                nested.sparse_spec = spec.child(name)
+        return fields
+
+
+def _columns(serializer, model, prefix, only, related):
+    """
+    Collect the ``only()`` paths and ``select_related()`` relations read by
+    ``serializer`` into ``only`` / ``related``. Returns ``False`` if some
+    field's reads are unknown, in which case ``model`` is loaded in full.
+    """
+    dependencies = getattr(getattr(serializer, 'Meta', None), 'field_dependencies', {})
+    known = True
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if name in dependencies:
+            only.update(prefix + dependency for dependency in dependencies[name])
+            continue
+        if field.source == '*':
+            known = False
+            continue
+        path = field.source.split('.')
+        current, parts = model, []
+        for position, attr in enumerate(path):
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                known = False
+                break
+            if model_field.many_to_many or model_field.one_to_many:
+                # Reverse and many-to-many relations are fetched separately
+                break
+            parts.append(attr)
+            last = position == len(path) - 1
+            nested = _nested(field)
+            if model_field.is_relation and (not last or nested is not None):
+                relation = prefix + '__'.join(parts)
+                related.add(relation)
+                only.add(relation)
+                if last:
+                    if not _columns(nested, model_field.related_model, relation + '__', only, related):
+                        only.update(f'{relation}__{f.name}' for f in model_field.related_model._meta.concrete_fields)
+                    break
+                current = model_field.related_model
+            else:
+                only.add(prefix + '__'.join(parts))
+                break
+    only.add(prefix + model._meta.pk.name)
+    return known
+
+
+def sparse_queryset(queryset, serializer, extra=()):
+    """
+    Restrict ``queryset`` to the columns and joins ``serializer`` needs,
+    plus the ``extra`` fields (e.g. pagination keys).
+
+    ``serializer`` is an unbound instance of the view's serializer (e.g.
+    ``self.get_serializer()``), so its fields reflect the request.
+    """
+    serializer = _nested(serializer) or serializer
+    if not isinstance(serializer, serializers.ModelSerializer):
+        return queryset
+    only, related = set(extra), set()
+    if not _columns(serializer, queryset.model, '', only, related):
+        only.update(f.name for f in queryset.model._meta.concrete_fields)
+    if related:
+        queryset = queryset.select_related(*sorted(related))
+    return queryset.only(*sorted(only))
+
+
+class SparseQuerysetMixin:
+    """View mixin applying ``sparse_queryset`` to reads."""
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method in ('GET', 'HEAD'):
+            keys = [field.lstrip('-') for field in getattr(self, 'keyset_ordering', ())]
+            queryset = sparse_queryset(queryset, self.get_serializer(), extra=keys)
+        return queryset
@@ -0,0 +1,260 @@
+"""
+Pagination classes shared by the API.
+
+``StandardPagination`` is the project default: page numbers plus a bounded,
+client-controlled ``page_size``.
+
+``KeysetPagination`` pages on an indexed sort key such as
+``(created_at, id)``: the cursor carries the key of the last row seen, so
+every page is a ``WHERE key < cursor ORDER BY key LIMIT n`` range scan and
+no ``COUNT(*)`` is run. Page 5,000 costs the same as page 1.
+
+``CachedCountPagination`` is page-number pagination whose total comes from
+``library_project.counts`` (cached, or a planner estimate on large tables)
+instead of a ``COUNT(*)`` per request; ``count_exact`` tells the two apart.
+
+``PageOrCursorPagination`` lets clients choose: ``?pagination=cursor`` (or
+any ``?cursor=``) selects keyset mode, anything else page numbers.
+"""
+import base64
+import datetime
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Paginator as DjangoPaginator
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .counts import cached_count
+
+
+class CursorEncoder(json.JSONEncoder):
+    """JSON encoder keeping full microsecond precision for sort keys."""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.date)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class StandardPagination(PageNumberPagination):
+    """Page-number pagination honoring ``?page_size=`` up to ``max_page_size``."""
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class CachedCountPaginator(DjangoPaginator):
+    """Django paginator taking its total from ``cached_count``."""
+    count_exact = True
+
+    @cached_property
+    def count(self):
+        if isinstance(self.object_list, QuerySet):
+            count, self.count_exact = cached_count(self.object_list)
+            return count
+        return super().count
+
+    def validate_number(self, number):
+        if self.count_exact:
+            return super().validate_number(number)
+        # An estimate cannot rule out later pages
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise InvalidPage('That page number is not an integer')
+        if number < 1:
+            raise InvalidPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if self.count_exact:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(self.object_list[bottom:bottom + self.per_page], number, self)
+
+
+class CachedCountPagination(StandardPagination):
+    """Page-number pagination with cached or estimated totals."""
+    django_paginator_class = CachedCountPaginator
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_exact', self.page.paginator.count_exact),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_exact'] = {'type': 'boolean'}
+        return response_schema
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on a unique, indexed sort key.
+
+    The key is taken from the view's ``keyset_ordering`` (e.g.
+    ``('-created_at', '-id')``); all fields must sort in the same direction
+    and the last one must be unique.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    ordering = ('-id',)
+    invalid_cursor_message = 'Invalid cursor.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = tuple(getattr(view, 'keyset_ordering', self.ordering))
+        self.page_size = self.get_page_size(request)
+        reverse, position = self.decode_cursor(request)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(self._flip(field) for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self._after(ordering, position))
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound(self.invalid_cursor_message)
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _after(ordering, position):
+        """
+        Rows strictly after ``position`` in ``ordering``:
+        ``(a, b) < (x, y)`` becomes ``a < x OR (a = x AND b < y)``.
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def _position(self, obj):
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return False, None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            reverse, position = bool(data['r']), data['p']
+            if len(position) != len(self.ordering):
+                raise ValueError
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, position
+
+    def encode_cursor(self, reverse, position):
+        data = json.dumps({'r': int(reverse), 'p': position}, cls=CursorEncoder)
+        encoded = base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(False, self._position(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(True, self._position(self.page[0]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class PageOrCursorPagination(BasePagination):
+    """Page numbers by default; keyset pagination with ``?pagination=cursor``."""
+    mode_query_param = 'pagination'
+    page_number_class = CachedCountPagination
+    keyset_class = KeysetPagination
+
+    def use_cursor(self, request):
+        params = request.query_params
+        return (params.get(self.mode_query_param) == 'cursor'
+                or self.keyset_class.cursor_query_param in params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.mode = self.keyset_class()
+        else:
+            self.mode = self.page_number_class()
+        return self.mode.paginate_queryset(queryset, request, view)
+
+    @property
+    def display_page_controls(self):
+        return getattr(self, 'mode', None) is not None and self.mode.display_page_controls
+
+    def get_paginated_response(self, data):
+        return self.mode.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number_class().get_paginated_response_schema(schema)
+
+    def to_html(self):
+        return self.mode.to_html()
+
+    def get_results(self, data):
+        return data['results']
+
+    def get_schema_fields(self, view):
+        return self.page_number_class().get_schema_fields(view)
@@ -0,0 +1,45 @@
+"""
+JSON renderer backed by ``orjson``.
+
+``FastJSONRenderer`` produces the same bytes as DRF's ``JSONRenderer`` with
+the project settings (compact, UTF-8, ``\\u2028``/``\\u2029`` escaped) for the
+types the API emits: values orjson would format differently (dates and
+times, dataclasses) are handed to DRF's encoder. Indented output, other
+``JSONRenderer`` settings, and anything orjson cannot encode fall back to
+``JSONRenderer`` itself, as does a missing ``orjson`` install.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+LINE_SEPARATOR = '\u2028'.encode('utf-8')
+PARAGRAPH_SEPARATOR = '\u2029'.encode('utf-8')
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Drop-in ``JSONRenderer`` using orjson for compact output."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if orjson is None or indent is not None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        encoder = self.encoder_class()
+        try:
+            ret = orjson.dumps(
+                data,
+                default=encoder.default,
+                option=(orjson.OPT_NON_STR_KEYS
+                        | orjson.OPT_PASSTHROUGH_DATETIME
+                        | orjson.OPT_PASSTHROUGH_DATACLASS),
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if LINE_SEPARATOR in ret or PARAGRAPH_SEPARATOR in ret:
+            ret = ret.replace(LINE_SEPARATOR, b'\\u2028').replace(PARAGRAPH_SEPARATOR, b'\\u2029')
+        return ret
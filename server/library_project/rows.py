@@ -0,0 +1,170 @@
+"""
+Fast read path for flat list serializers.
+
+``ModelSerializer`` builds a model instance per row and then walks its
+fields through ``get_attribute``/``to_representation``. For flat
+serializers (one column per field, or a model property over declared
+columns) ``compile_rows`` turns the serializer's fields once into a
+``RowPlan``: the ``values_list()`` columns to select and one extractor per
+field. Serializing a page is then a loop over tuples, producing the same
+data as the serializer.
+
+Serializers opt computed fields in through ``Meta.field_dependencies``
+(see ``library_project.fieldsets``); anything the plan cannot reproduce
+(nested serializers, method fields, files) makes ``compile_rows`` return
+``None`` and callers fall back to the serializer.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.relations import PKOnlyObject
+
+_plans = {}
+
+
+class RowPlan:
+    """Precompiled ``values_list()`` columns and per-field extractors."""
+
+    def __init__(self, columns, extractors):
+        self.columns = columns
+        self.extractors = extractors
+
+    def queryset(self, queryset, extra=(), overrides=None):
+        """
+        Return ``queryset`` as named rows holding the plan's columns (and
+        ``extra``). ``overrides`` maps a column to an expression serialized
+        in its place, e.g. a value derived in SQL; the stored column is
+        still selected, after the others, for properties reading it.
+        """
+        columns = list(self.columns)
+        columns += [column for column in extra if column not in columns]
+        if overrides:
+            columns = [overrides.get(column, column) for column in columns] + [
+                column for column in columns if column in overrides
+            ]
+        return queryset.values_list(*columns, named=True)
+
+    def serialize(self, rows):
+        extractors = self.extractors
+        return [{name: extract(row) for name, extract in extractors} for row in rows]
+
+
+def _column_extractor(index, field):
+    to_representation = field.to_representation
+
+    def extract(row):
+        value = row[index]
+        return None if value is None else to_representation(value)
+    return extract
+
+
+def _pk_extractor(index, field):
+    to_representation = field.to_representation
+
+    def extract(row):
+        value = row[index]
+        return None if value is None else to_representation(PKOnlyObject(pk=value))
+    return extract
+
+
+def _property_extractor(getter, field):
+    to_representation = field.to_representation
+
+    def extract(row):
+        value = getter(row)
+        return None if value is None else to_representation(value)
+    return extract
+
+
+def _compile(serializer):
+    model = serializer.Meta.model
+    dependencies = getattr(serializer.Meta, 'field_dependencies', {})
+    columns, extractors = [], []
+
+    def column(path):
+        if path not in columns:
+            columns.append(path)
+        return columns.index(path)
+
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField,
+                              serializers.ManyRelatedField)):
+            return None
+        if name in dependencies:
+            prop = getattr(model, field.source, None)
+            if not isinstance(prop, property):
+                return None
+            for dependency in dependencies[name]:
+                column(dependency)
+            extractors.append((name, _property_extractor(prop.fget, field)))
+            continue
+        path, current = field.source.split('.'), model
+        for position, attr in enumerate(path):
+            if current is None:
+                return None
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                return None
+            if (model_field.many_to_many or model_field.one_to_many or model_field.null and position < len(path) - 1
+                    or isinstance(model_field, models.FileField)):
+                # Not a single column, or DRF would skip the field on a missing relation
+                return None
+            current = model_field.related_model if model_field.is_relation else None
+        index = column('__'.join(path))
+        if not model_field.is_relation:
+            extractors.append((name, _column_extractor(index, field)))
+        elif isinstance(field, serializers.PrimaryKeyRelatedField):
+            extractors.append((name, _pk_extractor(index, field)))
+        else:
+            return None
+    return RowPlan(tuple(columns), tuple(extractors))
+
+
+def compile_rows(serializer):
+    """
+    Return the ``RowPlan`` for an (unbound) serializer instance, or ``None``
+    if its fields cannot be read from plain columns. Plans are cached per
+    serializer class and field set.
+    """
+    serializer = getattr(serializer, 'child', serializer)
+    if not isinstance(serializer, serializers.ModelSerializer):
+        return None
+    key = (type(serializer), tuple(serializer.fields))
+    if key not in _plans:
+        # Compiled from a request-free copy so cached plans hold no request
+        unbound = type(serializer)()
+        for name in set(unbound.fields) - set(key[1]):
+            del unbound.fields[name]
+        _plans[key] = _compile(unbound)
+    return _plans[key]
+
+
+def serialize_rows(serializer, queryset):
+    """Serialize ``queryset`` through the fast path when possible."""
+    plan = compile_rows(serializer)
+    if plan is None:
+        serializer.instance = queryset
+        return serializer.data
+    return plan.serialize(plan.queryset(queryset))
+
+
+class RowListMixin:
+    """
+    View mixin serving ``list()`` from ``values_list()`` rows when the
+    serializer compiles to a ``RowPlan``.
+    """
+
+    def list(self, request, *args, **kwargs):
+        plan = compile_rows(self.get_serializer())
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+        keys = [field.lstrip('-') for field in getattr(self, 'keyset_ordering', ())]
+        rows = plan.queryset(self.filter_queryset(self.get_queryset()), extra=keys)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(plan.serialize(page))
+        return Response(plan.serialize(rows))
@@ -4,6 +4,7 @@ Django settings for library_project project.
 
 from pathlib import Path
 from datetime import timedelta
+from decimal import Decimal
 from decouple import config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -36,6 +37,7 @@ INSTALLED_APPS = [
     # Local apps
     'accounts',
     'books',
+    'taskqueue',
 ]
 
 MIDDLEWARE = [
@@ -89,6 +91,100 @@ DATABASES = {
     }
 }
 
+# Cache (local memory by default; use the database or file-based backends to
+# share entries between workers, e.g. CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache
+# with CACHE_LOCATION=library_cache after running `manage.py createcachetable`)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='library-cache'),
+    }
+}
+
+# Paginated list counts: cache lifetime, and table size above which
+# planner estimates replace exact COUNT(*) queries
+COUNT_CACHE_TIMEOUT = config('COUNT_CACHE_TIMEOUT', default=300, cast=int)
+COUNT_ESTIMATE_THRESHOLD = config('COUNT_ESTIMATE_THRESHOLD', default=1000000, cast=int)
+
+# Catalog response cache: soft expiry of entries, recompute lock lifetime,
+# how long other workers wait for a cold entry being computed, and seconds
+# the catalog generation is cached before being read from the database again
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=300, cast=int)
+CATALOG_CACHE_LOCK_TIMEOUT = config('CATALOG_CACHE_LOCK_TIMEOUT', default=10, cast=int)
+CATALOG_CACHE_WAIT = config('CATALOG_CACHE_WAIT', default=2.0, cast=float)
+CATALOG_GENERATION_TTL = config('CATALOG_GENERATION_TTL', default=1.0, cast=float)
+
+# Borrowing quota: most loans a user may have open at once; most items
+# in one batch borrow or return request
+LOAN_QUOTA = config('LOAN_QUOTA', default=5, cast=int)
+LOAN_BATCH_MAX_ITEMS = config('LOAN_BATCH_MAX_ITEMS', default=5000, cast=int)
+
+# Late fines: amount per whole day late beyond the grace days, capped per
+# loan (FINE_MAX=0: no cap)
+FINE_DAILY_RATE = config('FINE_DAILY_RATE', default='0.25', cast=Decimal)
+FINE_GRACE_DAYS = config('FINE_GRACE_DAYS', default=0, cast=int)
+FINE_MAX = config('FINE_MAX', default='10.00', cast=Decimal)
+
+# Background tasks (manage.py run_worker): worker processes, idle poll
+# interval, lease of a claimed task (renewed while it runs), retries with
+# exponential backoff
+# (seconds), days finished tasks are kept, and the overdue sweep interval
+TASK_WORKER_PROCESSES = config('TASK_WORKER_PROCESSES', default=2, cast=int)
+TASK_POLL_INTERVAL = config('TASK_POLL_INTERVAL', default=1.0, cast=float)
+TASK_LEASE_SECONDS = config('TASK_LEASE_SECONDS', default=600, cast=int)
+TASK_MAX_ATTEMPTS = config('TASK_MAX_ATTEMPTS', default=5, cast=int)
+TASK_RETRY_BACKOFF = config('TASK_RETRY_BACKOFF', default=10, cast=int)
+TASK_RETRY_BACKOFF_MAX = config('TASK_RETRY_BACKOFF_MAX', default=3600, cast=int)
+TASK_RETENTION_DAYS = config('TASK_RETENTION_DAYS', default=7, cast=int)
+OVERDUE_SWEEP_INTERVAL = config('OVERDUE_SWEEP_INTERVAL', default=3600, cast=int)
+
+# Email (console by default; e.g. EMAIL_BACKEND=django.core.mail.backends.smtp.EmailBackend)
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = config('EMAIL_HOST', default='localhost')
+EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
+EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
+EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=False, cast=bool)
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='library@localhost')
+
+# Loan notices: days before the due date for due-soon notices, loans per
+# chunk, digest rendering threads, and how often the worker sends them
+NOTICE_DUE_SOON_DAYS = config('NOTICE_DUE_SOON_DAYS', default=2, cast=int)
+NOTICE_CHUNK_SIZE = config('NOTICE_CHUNK_SIZE', default=2000, cast=int)
+NOTICE_RENDER_THREADS = config('NOTICE_RENDER_THREADS', default=4, cast=int)
+NOTICE_INTERVAL = config('NOTICE_INTERVAL', default=86400, cast=int)
+
+# Seconds between refreshes of the admin dashboard statistics
+STATS_REFRESH_INTERVAL = config('STATS_REFRESH_INTERVAL', default=300, cast=int)
+
+# Related books ("also borrowed"): neighbours kept per book, patrons two
+# books need in common, seconds between incremental runs and between full
+# rebuilds
+RELATED_BOOKS_K = config('RELATED_BOOKS_K', default=10, cast=int)
+RELATED_MIN_COBORROWERS = config('RELATED_MIN_COBORROWERS', default=2, cast=int)
+RELATED_BOOKS_INTERVAL = config('RELATED_BOOKS_INTERVAL', default=3600, cast=int)
+RELATED_BOOKS_FULL_INTERVAL = config('RELATED_BOOKS_FULL_INTERVAL', default=86400, cast=int)
+
+# Similar books (content-based): neighbours kept per book, books a term may
+# appear in before it is dropped, build threads and seconds between
+# incremental builds and between full builds (which refit the vocabulary)
+SIMILAR_BOOKS_K = config('SIMILAR_BOOKS_K', default=10, cast=int)
+SIMILAR_MAX_DF = config('SIMILAR_MAX_DF', default=2000, cast=int)
+SIMILAR_BOOKS_THREADS = config('SIMILAR_BOOKS_THREADS', default=4, cast=int)
+SIMILAR_BOOKS_INTERVAL = config('SIMILAR_BOOKS_INTERVAL', default=3600, cast=int)
+SIMILAR_BOOKS_FULL_INTERVAL = config('SIMILAR_BOOKS_FULL_INTERVAL', default=86400, cast=int)
+
+# Popularity: days after which a borrow counts half as much towards the
+# trending order, and seconds between checks that rebase the scores
+POPULARITY_HALF_LIFE_DAYS = config('POPULARITY_HALF_LIFE_DAYS', default=7, cast=float)
+POPULARITY_REBASE_INTERVAL = config('POPULARITY_REBASE_INTERVAL', default=86400, cast=int)
+
+# Loan archive: days after their return that loans move to the archive
+# table, loans moved per transaction and seconds between archive runs
+LOAN_ARCHIVE_AFTER_DAYS = config('LOAN_ARCHIVE_AFTER_DAYS', default=365, cast=int)
+LOAN_ARCHIVE_CHUNK_SIZE = config('LOAN_ARCHIVE_CHUNK_SIZE', default=5000, cast=int)
+LOAN_ARCHIVE_INTERVAL = config('LOAN_ARCHIVE_INTERVAL', default=86400, cast=int)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -135,14 +231,27 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'library_project.pagination.StandardPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
+        'library_project.renderers.FastJSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ),
 }
 
+# Fuzzy search: minimum trigram word similarity, in-process index refresh
+# and full rebuild intervals (SQLite/MySQL only) and maximum number of
+# matches considered
+FUZZY_SEARCH_THRESHOLD = config('FUZZY_SEARCH_THRESHOLD', default=0.5, cast=float)
+FUZZY_INDEX_REFRESH_SECONDS = config('FUZZY_INDEX_REFRESH_SECONDS', default=5, cast=int)
+FUZZY_INDEX_REBUILD_SECONDS = config('FUZZY_INDEX_REBUILD_SECONDS', default=3600, cast=int)
+FUZZY_SEARCH_LIMIT = config('FUZZY_SEARCH_LIMIT', default=1000, cast=int)
+
+# Autocomplete: per-worker prefix index refresh and full rebuild intervals
+AUTOCOMPLETE_REFRESH_SECONDS = config('AUTOCOMPLETE_REFRESH_SECONDS', default=5, cast=int)
+AUTOCOMPLETE_REBUILD_SECONDS = config('AUTOCOMPLETE_REBUILD_SECONDS', default=3600, cast=int)
+AUTOCOMPLETE_MAX_RESULTS = config('AUTOCOMPLETE_MAX_RESULTS', default=25, cast=int)
+
 # JWT Configuration
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=config('JWT_ACCESS_TOKEN_LIFETIME', default=60, cast=int)),
@@ -9,3 +9,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library_project.settings')
 
 application = get_wsgi_application()
+
+# Build per-worker in-memory indexes before the first request
+from books import autocomplete, fuzzy  # noqa: E402
+autocomplete.warm_up()
+fuzzy.warm_up()
@@ -0,0 +1,12 @@
+from django.contrib import admin
+
+from .models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'run_at', 'attempts', 'max_attempts', 'locked_by', 'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'key')
+    readonly_fields = ('created_at', 'finished_at', 'locked_by', 'locked_until', 'last_error')
+    ordering = ('-run_at',)
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class TaskQueueConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'taskqueue'
+    verbose_name = 'Task queue'
+
+    def ready(self):
+        # Register the tasks defined in every app's tasks.py
+        from django.utils.module_loading import autodiscover_modules
+        autodiscover_modules('tasks')
@@ -0,0 +1,25 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from taskqueue.worker import Worker
+
+
+class Command(BaseCommand):
+    help = 'Run queued and periodic background tasks until stopped (SIGTERM/SIGINT finish running tasks first).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int,
+            help='Task processes (default TASK_WORKER_PROCESSES); 0 runs tasks in this process.',
+        )
+        parser.add_argument('--poll-interval', type=float, help='Seconds between polls when idle.')
+        parser.add_argument('--drain', action='store_true', help='Exit once no task is due.')
+
+    def handle(self, *args, **options):
+        worker = Worker(processes=options['processes'], poll_interval=options['poll_interval'])
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        self.stdout.write(f'Worker {worker.worker_id} started with {worker.processes} processes.')
+        count = worker.run(drain=options['drain'])
+        self.stdout.write(self.style.SUCCESS(f'Worker {worker.worker_id} stopped after {count} tasks.'))
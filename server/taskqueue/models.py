@@ -0,0 +1,48 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """
+    A queued call of a registered task function (see ``taskqueue.registry``).
+
+    Workers claim due rows, run them and record the outcome. Failed runs
+    are queued again with a backoff until ``max_attempts`` is reached.
+    Periodic tasks keep a single row, identified by ``key``, that is queued
+    again for its next run once it finishes.
+    """
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    # Optional unique key: at most one row per key (periodic tasks, deduplication)
+    key = models.CharField(max_length=200, unique=True, blank=True, null=True)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    # Lease of a running task: another worker may claim it once it expires
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_until = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['run_at', 'id']
+        verbose_name = 'Task'
+        verbose_name_plural = 'Tasks'
+        indexes = [
+            # Claiming: due queued tasks, and running tasks by lease expiry
+            models.Index(fields=['status', 'run_at'], name='taskqueue_status_run_at_idx'),
+            models.Index(fields=['status', 'locked_until'], name='taskqueue_status_lease_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.status})"
@@ -0,0 +1,19 @@
+"""
+Entry points of the worker's task processes.
+
+Kept free of model imports: spawned processes import this module before
+Django is set up.
+"""
+import signal
+
+
+def setup():
+    """Process initializer: set Django up, and leave Ctrl+C to the parent."""
+    import django
+    django.setup()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def run(task_id):
+    from .worker import run_task
+    return run_task(task_id)
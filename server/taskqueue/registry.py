@@ -0,0 +1,87 @@
+"""
+Task registration and enqueueing.
+
+Tasks are plain functions taking JSON-serializable arguments, registered
+with ``@task`` (usually in an app's ``tasks.py``, imported at startup)::
+
+    @task(max_attempts=3)
+    def send_notice(loan_id):
+        ...
+
+    send_notice.enqueue(loan.id)             # as soon as a worker is free
+    send_notice.enqueue(loan.id, delay=60)   # not before a minute from now
+
+    @task(every=3600)
+    def sweep():
+        ...
+
+``enqueue`` inserts a ``Task`` row in the current transaction: a task queued
+by a request is only seen by workers once the request commits, and is
+dropped if it rolls back.
+"""
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+registry = {}
+
+
+class TaskFunction:
+    """A registered task: callable like the function, plus ``enqueue()``."""
+
+    def __init__(self, func, name, max_attempts=None, every=None):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        if isinstance(every, datetime.timedelta):
+            every = every.total_seconds()
+        self.every = every
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def __repr__(self):
+        return f'<task {self.name}>'
+
+    @property
+    def periodic_key(self):
+        return f'periodic:{self.name}' if self.every else None
+
+    def enqueue(self, *args, delay=None, run_at=None, **kwargs):
+        return enqueue(self.name, args, kwargs, delay=delay, run_at=run_at)
+
+
+def task(func=None, *, name=None, max_attempts=None, every=None):
+    """
+    Register ``func`` as a task, under ``name`` (default: its dotted path).
+
+    ``max_attempts`` overrides ``TASK_MAX_ATTEMPTS``; ``every`` (seconds or
+    a ``timedelta``) runs the task periodically, without arguments.
+    """
+    def register(func):
+        task_function = TaskFunction(
+            func, name or f'{func.__module__}.{func.__qualname__}', max_attempts, every
+        )
+        registry[task_function.name] = task_function
+        return task_function
+    return register(func) if func is not None else register
+
+
+def enqueue(name, args=(), kwargs=None, delay=None, run_at=None):
+    """Queue a call of task ``name`` and return its ``Task`` row."""
+    from .models import Task
+    if name not in registry:
+        raise LookupError(f'Unknown task {name!r}.')
+    if run_at is None:
+        run_at = timezone.now()
+        if delay:
+            run_at += datetime.timedelta(seconds=delay)
+    return Task.objects.create(
+        name=name,
+        args=list(args),
+        kwargs=kwargs or {},
+        run_at=run_at,
+        max_attempts=registry[name].max_attempts or settings.TASK_MAX_ATTEMPTS,
+    )
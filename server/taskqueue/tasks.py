@@ -0,0 +1,14 @@
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from .registry import task
+
+
+@task(every=datetime.timedelta(days=1))
+def purge_finished_tasks():
+    """Delete tasks finished more than ``TASK_RETENTION_DAYS`` ago."""
+    from .models import Task
+    cutoff = timezone.now() - datetime.timedelta(days=settings.TASK_RETENTION_DAYS)
+    Task.objects.filter(status__in=('done', 'failed'), finished_at__lt=cutoff).delete()
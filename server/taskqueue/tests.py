@@ -0,0 +1,179 @@
+import datetime
+
+import pytest
+from django.conf import settings
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+
+from taskqueue.models import Task
+from taskqueue.registry import enqueue, registry, task
+from taskqueue.worker import Worker, claim, ensure_schedule, next_run, renew_leases, retry_delay, run_task
+
+calls = []
+
+
+@task
+def record(value, repeat=1):
+    calls.extend([value] * repeat)
+
+
+@task(max_attempts=2)
+def fail():
+    raise RuntimeError('boom')
+
+
+@task(every=60)
+def tick():
+    calls.append('tick')
+
+
+@pytest.fixture(autouse=True)
+def clear_calls():
+    calls.clear()
+
+
+@pytest.mark.django_db
+class TestEnqueue:
+    """Test cases for registering and enqueueing tasks."""
+    
+    def test_enqueue_stores_call(self):
+        """Test enqueue() stores the task name, arguments and run time."""
+        row = record.enqueue('a', repeat=2, delay=30)
+        
+        assert row.name == 'taskqueue.tests.record'
+        assert row.args == ['a']
+        assert row.kwargs == {'repeat': 2}
+        assert row.status == 'queued'
+        assert row.run_at > timezone.now() + datetime.timedelta(seconds=25)
+        assert record('b') is None and calls == ['b']
+    
+    def test_unknown_task_rejected(self):
+        """Test enqueueing an unregistered task fails."""
+        with pytest.raises(LookupError):
+            enqueue('no.such.task')
+    
+    def test_enqueue_follows_transaction(self):
+        """Test a task queued in a rolled back transaction is dropped."""
+        with transaction.atomic():
+            record.enqueue('a')
+            transaction.set_rollback(True)
+        
+        assert not Task.objects.exists()
+    
+    def test_tasks_discovered_from_apps(self):
+        """Test the tasks.py modules of installed apps are registered."""
+        assert 'books.tasks.mark_overdue' in registry
+        assert 'taskqueue.tasks.purge_finished_tasks' in registry
+
+
+@pytest.mark.django_db
+class TestWorker:
+    """Test cases for claiming and running tasks."""
+    
+    def test_claim_leases_due_tasks_once(self):
+        """Test due tasks are claimed by one worker only."""
+        due = record.enqueue('a')
+        record.enqueue('b', delay=3600)
+        
+        assert claim('w1', 10) == [due.pk]
+        assert claim('w2', 10) == []
+        due.refresh_from_db()
+        assert due.status == 'running'
+        assert due.locked_by == 'w1'
+    
+    def test_expired_lease_is_reclaimed(self):
+        """Test a running task whose lease expired is claimed again."""
+        row = record.enqueue('a')
+        claim('w1', 1)
+        Task.objects.filter(pk=row.pk).update(locked_until=timezone.now() - datetime.timedelta(seconds=1))
+        
+        assert claim('w2', 1) == [row.pk]
+    
+    def test_renewed_lease_is_kept(self):
+        """Test renewing a lease keeps a long task from being claimed again."""
+        row = record.enqueue('a')
+        claim('w1', 1)
+        later = timezone.now() + datetime.timedelta(seconds=settings.TASK_LEASE_SECONDS - 1)
+        
+        assert renew_leases('w2', [row.pk], now=later) == 0
+        assert renew_leases('w1', [row.pk], now=later) == 1
+        assert claim('w2', 1, now=later + datetime.timedelta(seconds=2)) == []
+        assert run_task(row.pk) == 'done'
+        row.refresh_from_db()
+        assert row.status == 'done'
+    
+    def test_run_task(self):
+        """Test a successful run calls the task and marks it done."""
+        row = record.enqueue('a', repeat=2)
+        claim('w1', 1)
+        
+        assert run_task(row.pk) == 'done'
+        assert calls == ['a', 'a']
+        row.refresh_from_db()
+        assert row.attempts == 1
+        assert row.finished_at is not None
+        assert row.locked_by == ''
+    
+    def test_failed_task_retried_with_backoff(self, settings):
+        """Test a failing task is retried after a backoff, then marked failed."""
+        settings.TASK_RETRY_BACKOFF = 10
+        row = fail.enqueue()
+        claim('w1', 1)
+        
+        assert run_task(row.pk) == 'queued'
+        row.refresh_from_db()
+        assert 'boom' in row.last_error
+        assert row.run_at > timezone.now() + datetime.timedelta(seconds=5)
+        
+        claim('w1', 1, now=row.run_at)
+        assert run_task(row.pk) == 'failed'
+        row.refresh_from_db()
+        assert row.attempts == 2
+    
+    def test_retry_delay(self, settings):
+        """Test the backoff doubles up to its cap."""
+        settings.TASK_RETRY_BACKOFF = 10
+        settings.TASK_RETRY_BACKOFF_MAX = 60
+        assert [retry_delay(n) for n in range(1, 6)] == [10, 20, 40, 60, 60]
+    
+    def test_periodic_task_rescheduled(self):
+        """Test a periodic task keeps one row, queued again for its next run."""
+        ensure_schedule()
+        ensure_schedule()
+        row = Task.objects.get(key='periodic:taskqueue.tests.tick')
+        claim('w1', 10)
+        
+        assert run_task(row.pk) == 'queued'
+        assert calls == ['tick']
+        row.refresh_from_db()
+        assert row.run_at == next_run(row.run_at - datetime.timedelta(seconds=60), 60, timezone.now())
+        assert Task.objects.filter(name='taskqueue.tests.tick').count() == 1
+    
+    def test_next_run_skips_missed_runs(self):
+        """Test a periodic task that fell behind runs once, on its cadence."""
+        start = timezone.now()
+        assert next_run(start, 60, start + datetime.timedelta(seconds=10)) == start + datetime.timedelta(seconds=60)
+        assert next_run(start, 60, start + datetime.timedelta(seconds=150)) == start + datetime.timedelta(seconds=180)
+    
+    def test_worker_drains_inline(self):
+        """Test the worker runs every due task, periodic ones included, and stops when drained."""
+        for value in 'abc':
+            record.enqueue(value)
+        record.enqueue('later', delay=3600)
+        
+        Worker(processes=0).run(drain=True)
+        
+        assert sorted(calls) == ['a', 'b', 'c', 'tick']
+        assert Task.objects.filter(name='taskqueue.tests.record', status='done').count() == 3
+    
+    def test_run_worker_command(self):
+        """Test the run_worker management command."""
+        from io import StringIO
+        record.enqueue('a')
+        out = StringIO()
+        
+        call_command('run_worker', processes=0, drain=True, stdout=out)
+        
+        assert 'a' in calls
+        assert 'stopped after' in out.getvalue()
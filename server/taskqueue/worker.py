@@ -0,0 +1,226 @@
+"""
+Claiming and running tasks: the loop behind ``manage.py run_worker``.
+
+Claims: on databases supporting ``SELECT ... FOR UPDATE SKIP LOCKED``
+(PostgreSQL, MySQL 8) due rows are locked and leased in one short
+transaction, concurrent workers skipping each other's rows. Elsewhere
+(SQLite) candidates are read and then leased with a conditional
+``UPDATE``; a worker runs only the rows its lease landed on.
+
+A claimed task is leased for ``TASK_LEASE_SECONDS``, and its worker renews
+the lease every third of that while the task runs, however long it takes.
+If the worker dies the lease runs out and another worker claims the task
+again, so tasks run at least once and should be idempotent.
+
+The worker runs claimed tasks in a pool of ``processes`` spawned
+processes, or in its own process with ``processes=0``.
+"""
+import datetime
+import logging
+import math
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import process
+from .models import Task
+from .registry import registry
+
+logger = logging.getLogger(__name__)
+
+
+def retry_delay(attempts):
+    """Seconds to wait before attempt ``attempts + 1``: exponential, capped."""
+    return min(settings.TASK_RETRY_BACKOFF * 2 ** (attempts - 1), settings.TASK_RETRY_BACKOFF_MAX)
+
+
+def next_run(run_at, every, now):
+    """The first ``run_at + k * every`` (k >= 1) after ``now``: missed runs are skipped."""
+    periods = max(1, math.floor((now - run_at).total_seconds() / every) + 1)
+    return run_at + datetime.timedelta(seconds=every * periods)
+
+
+def ensure_schedule(now=None):
+    """Create the row of every registered periodic task that has none yet."""
+    now = now or timezone.now()
+    Task.objects.bulk_create([
+        Task(name=name, key=func.periodic_key, run_at=now,
+             max_attempts=func.max_attempts or settings.TASK_MAX_ATTEMPTS)
+        for name, func in registry.items() if func.every
+    ], ignore_conflicts=True)
+
+
+def claim(worker_id, limit, now=None):
+    """Lease up to ``limit`` due tasks to ``worker_id`` and return their ids."""
+    now = now or timezone.now()
+    lease = now + datetime.timedelta(seconds=settings.TASK_LEASE_SECONDS)
+    due = Task.objects.filter(
+        Q(status='queued', run_at__lte=now) | Q(status='running', locked_until__lt=now)
+    ).order_by('run_at', 'id')
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(due.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+            Task.objects.filter(id__in=ids).update(status='running', locked_by=worker_id, locked_until=lease)
+        return ids
+    ids = list(due.values_list('id', flat=True)[:limit])
+    # Rows another worker leased since they were read no longer match ``due``
+    due.filter(id__in=ids).update(status='running', locked_by=worker_id, locked_until=lease)
+    return list(
+        Task.objects.filter(id__in=ids, status='running', locked_by=worker_id, locked_until=lease)
+        .values_list('id', flat=True)
+    )
+
+
+def renew_interval():
+    """Seconds between lease renewals of running tasks."""
+    return settings.TASK_LEASE_SECONDS / 3
+
+
+def renew_leases(worker_id, ids, now=None):
+    """Extend the leases ``worker_id`` still holds on tasks ``ids``; returns how many it holds."""
+    now = now or timezone.now()
+    lease = now + datetime.timedelta(seconds=settings.TASK_LEASE_SECONDS)
+    return Task.objects.filter(id__in=ids, status='running', locked_by=worker_id).update(locked_until=lease)
+
+
+class Heartbeat(threading.Thread):
+    """Renews the leases of tasks run inline, from a thread of the worker."""
+
+    def __init__(self, worker_id, ids):
+        super().__init__(daemon=True)
+        self.worker_id = worker_id
+        self.ids = ids
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(renew_interval()):
+                renew_leases(self.worker_id, self.ids)
+        except Exception:
+            logger.exception('Renewing the leases of tasks %s failed', self.ids)
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_task(task_id):
+    """Run claimed task ``task_id``, record the outcome and return its new status."""
+    task = Task.objects.filter(pk=task_id, status='running').first()
+    if task is None:
+        return None
+    func = registry.get(task.name)
+    attempts = task.attempts + 1
+    try:
+        if func is None:
+            raise LookupError(f'Unknown task {task.name!r}.')
+        func(*task.args, **task.kwargs)
+    except Exception:
+        logger.exception('Task %s (%s) failed', task.pk, task.name)
+        error = traceback.format_exc()
+    else:
+        error = ''
+
+    now = timezone.now()
+    fields = {'attempts': attempts, 'last_error': error, 'locked_by': '', 'locked_until': None}
+    if error and attempts < task.max_attempts:
+        fields.update(status='queued', run_at=now + datetime.timedelta(seconds=retry_delay(attempts)))
+    elif func is not None and func.every:
+        # Periodic tasks stay scheduled, whatever the outcome of this run
+        fields.update(status='queued', attempts=0, finished_at=now,
+                      run_at=next_run(task.run_at, func.every, now))
+    else:
+        fields.update(status='failed' if error else 'done', finished_at=now)
+    # Only while still holding the lease: it may have expired and been
+    # reclaimed (renewals move ``locked_until``, so only the owner is compared)
+    Task.objects.filter(pk=task.pk, status='running', locked_by=task.locked_by).update(**fields)
+    return fields['status']
+
+
+class Worker:
+    """Claims due tasks and runs them until stopped."""
+
+    def __init__(self, processes=None, poll_interval=None, worker_id=None):
+        self.processes = settings.TASK_WORKER_PROCESSES if processes is None else processes
+        self.poll_interval = settings.TASK_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = False
+
+    def stop(self, *args):
+        """Finish the running tasks, then return from ``run()``."""
+        self.stopping = True
+
+    def run(self, drain=False):
+        """
+        Run tasks until ``stop()``, or with ``drain`` until no task is due.
+        Returns the number of tasks run.
+        """
+        ensure_schedule()
+        if not self.processes:
+            return self._run_inline(drain)
+        pool = self._pool()
+        running, count = {}, 0
+        renew_at = time.monotonic() + renew_interval()
+        try:
+            while not self.stopping:
+                if running and time.monotonic() >= renew_at:
+                    renew_leases(self.worker_id, list(running.values()))
+                    renew_at = time.monotonic() + renew_interval()
+                free = self.processes - len(running)
+                ids = claim(self.worker_id, free) if free else []
+                for task_id in ids:
+                    running[pool.submit(process.run, task_id)] = task_id
+                if not running:
+                    if drain:
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+                done, _ = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task_id = running.pop(future)
+                    count += 1
+                    if future.exception() is not None:
+                        # The task process itself died; the lease expiry retries it
+                        logger.error('Task %s crashed its process: %s', task_id, future.exception())
+                    if isinstance(future.exception(), BrokenProcessPool):
+                        pool.shutdown(wait=False)
+                        pool, running = self._pool(), {}
+                        break
+        finally:
+            pool.shutdown(wait=True)
+        return count
+
+    def _pool(self):
+        return ProcessPoolExecutor(
+            self.processes, mp_context=multiprocessing.get_context('spawn'), initializer=process.setup
+        )
+
+    def _run_inline(self, drain):
+        count = 0
+        while not self.stopping:
+            ids = claim(self.worker_id, 1)
+            if not ids:
+                if drain:
+                    break
+                time.sleep(self.poll_interval)
+                continue
+            heartbeat = Heartbeat(self.worker_id, ids)
+            heartbeat.start()
+            try:
+                run_task(ids[0])
+            finally:
+                heartbeat.stop()
+            count += 1
+        return count